@@ -0,0 +1,192 @@
+"""
+Almacén de datos con recarga en caliente.
+
+Los callbacks ya no leen variables globales del módulo: piden al almacén la
+instantánea vigente al comenzar y trabajan sobre esa referencia hasta
+terminar. Un hilo en segundo plano vigila el mtime del libro Excel; cuando
+cambia, carga la nueva versión en paralelo (doble buffer) y la publica con
+una sola asignación. Las peticiones en curso siguen usando la instantánea
+anterior, que se libera cuando nadie la referencia.
+"""
+import os
+import threading
+import time
+
+
+class InstantaneaDatos:
+    """Una versión inmutable de los datos de precios cargados."""
+
+    def __init__(self, pesos_df, dolares_df, fondos, series, tac, version, ruta_archivo=None):
+        self.pesos_df = pesos_df
+        self.dolares_df = dolares_df
+        self.fondos = fondos
+        self.series = series
+        self.tac = tac
+        self.version = version
+        self.ruta_archivo = ruta_archivo
+        self.cargada_en = time.time()
+        # Segundos entre el inicio de la lectura y la publicación, y su desglose por fase
+        self.duracion_carga = None
+        self.fases = {}
+        # Mientras se prepara: versión anterior de la que esta solo agrega fechas
+        # nuevas, y cuántas filas comparten (ver preparar en AlmacenDatos)
+        self.base = None
+        self.filas_base = 0
+        self._derivados = {}
+        # Reentrante: un derivado puede depender de otro (p. ej. la matriz de precios)
+        self._bloqueo = threading.RLock()
+
+    def precios(self, moneda):
+        return self.pesos_df if moneda == 'CLP' else self.dolares_df
+
+    def derivado(self, clave, calcular):
+        """Resultado derivado de esta versión de datos, calculado una sola vez."""
+        try:
+            return self._derivados[clave]
+        except KeyError:
+            pass
+        with self._bloqueo:
+            if clave not in self._derivados:
+                self._derivados[clave] = calcular()
+            return self._derivados[clave]
+
+
+class AlmacenDatos:
+    """
+    Mantiene la instantánea de datos vigente y la recarga cuando cambia el libro.
+
+    `localizador()` devuelve la ruta del libro (o None) y `cargador(ruta)`
+    devuelve (pesos_df, dolares_df, fondos, series, tac, version). Si se indica,
+    `preparar(instantanea, anterior)` precalcula sus derivados antes de
+    publicarla; `anterior` es la instantánea vigente (o None) por si sus
+    resultados se pueden extender en lugar de recalcularse.
+    """
+
+    def __init__(self, cargador, localizador, intervalo=60, espera_estabilidad=2, preparar=None):
+        self._cargador = cargador
+        self._localizador = localizador
+        self._preparar = preparar
+        self._intervalo = intervalo
+        self._espera_estabilidad = espera_estabilidad
+        self._instantanea = None
+        self._firma = None
+        # Arranque de hilos; la carga usa su propio bloqueo para que actual() no la espere
+        self._bloqueo = threading.Lock()
+        self._bloqueo_carga = threading.Lock()
+        self._hilo = None
+        self._pid = None
+        self._hilo_carga = None
+        self._pid_carga = None
+        self._al_terminar_carga = None
+        self.cargas_fallidas = 0
+
+    def actual(self):
+        # Con gunicorn --preload el hilo del proceso maestro no sobrevive al fork
+        if self._intervalo and self._pid != os.getpid():
+            self.iniciar_vigilancia()
+        if self._instantanea is None and self._pid_carga is not None and self._pid_carga != os.getpid():
+            self.cargar_en_segundo_plano(self._al_terminar_carga)
+        return self._instantanea
+
+    @property
+    def cargando(self):
+        """True mientras la carga inicial en segundo plano no termina."""
+        return self._hilo_carga is not None and self._hilo_carga.is_alive()
+
+    def cargar_en_segundo_plano(self, al_terminar=None):
+        """
+        Hace la primera carga en un hilo, para que el proceso atienda solicitudes de inmediato.
+
+        `al_terminar()` se llama en ese hilo una vez publicada (o fallida) la carga.
+        """
+        with self._bloqueo:
+            if self._pid_carga == os.getpid() and self._hilo_carga is not None:
+                return
+            self._pid_carga = os.getpid()
+            self._al_terminar_carga = al_terminar
+            self._hilo_carga = threading.Thread(target=self._carga_inicial, name='carga-datos', daemon=True)
+            self._hilo_carga.start()
+
+    def _carga_inicial(self):
+        try:
+            self.recargar()
+        except Exception as e:
+            self.cargas_fallidas += 1
+            print(f"Error cargando datos: {e}")
+        if self._al_terminar_carga is not None:
+            self._al_terminar_carga()
+
+    def recargar(self):
+        """Carga el libro y publica la nueva instantánea. Devuelve True si cambió."""
+        ruta = self._localizador()
+        if ruta is None:
+            return False
+
+        firma = _firma_archivo(ruta)
+        with self._bloqueo_carga:
+            if firma is not None and firma == self._firma:
+                return False
+
+            inicio = time.perf_counter()
+            pesos_df, dolares_df, fondos, series, tac, version = self._cargador(ruta)
+            if pesos_df is None:
+                self.cargas_fallidas += 1
+                return False
+
+            nueva = InstantaneaDatos(pesos_df, dolares_df, fondos, series, tac, version, ruta)
+            nueva.fases['lectura'] = time.perf_counter() - inicio
+            anterior = self._instantanea
+            if self._preparar is not None:
+                try:
+                    self._preparar(nueva, anterior)
+                except Exception as e:
+                    print(f"Error precalculando resultados: {e}")
+                finally:
+                    # No se retiene la versión anterior más allá del precálculo
+                    nueva.base = None
+            nueva.duracion_carga = time.perf_counter() - inicio
+            # Intercambio atómico: una sola asignación de referencia
+            self._instantanea = nueva
+            self._firma = firma
+
+        if anterior is not None and anterior.version != version:
+            print(f"Datos recargados: versión {anterior.version} -> {version}")
+        return True
+
+    def iniciar_vigilancia(self):
+        with self._bloqueo:
+            if self._pid == os.getpid() and self._hilo is not None and self._hilo.is_alive():
+                return
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._vigilar, name='vigilancia-datos', daemon=True)
+            self._hilo.start()
+
+    def _vigilar(self):
+        while True:
+            time.sleep(self._intervalo)
+            try:
+                ruta = self._localizador()
+                if ruta is None:
+                    continue
+                firma = _firma_archivo(ruta)
+                if firma is None or firma == self._firma:
+                    continue
+
+                # Se espera a que el archivo deje de cambiar antes de leerlo
+                time.sleep(self._espera_estabilidad)
+                if _firma_archivo(ruta) != firma:
+                    continue
+
+                self.recargar()
+            except Exception as e:
+                # Si la carga falla se mantiene la instantánea anterior
+                self.cargas_fallidas += 1
+                print(f"Error recargando datos: {e}")
+
+
+def _firma_archivo(ruta):
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return None
+    return estado.st_mtime_ns, estado.st_size
@@ -0,0 +1,228 @@
+"""
+API REST de solo lectura con las mismas rentabilidades que muestra el portal.
+
+Rutas (prefijo /api/v1):
+- /fondos                       fondos, versión de datos y rango de fechas
+- /rentabilidades/periodos      1M/3M/YTD/12M/3A/5A/ITD (tabla "Acumulada")
+- /rentabilidades/anualizadas   1A/3A/5A/ITD anualizadas
+- /rentabilidades/por-ano       rentabilidad por año calendario
+- /retornos-acumulados          serie diaria de retornos acumulados
+
+Parámetros: moneda (CLP o USD), fondos (repetible; por defecto todos),
+desde/hasta (AAAA-MM-DD) y formato (json o csv). Con desde/hasta las
+tablas se calculan solo con los precios de ese rango, es decir, al cierre de
+`hasta`. Con solo `hasta` se usa la fecha de corte sobre la matriz vigente,
+sin reconstruirla.
+
+Cada respuesta lleva un ETag débil derivado de la versión de datos y la
+consulta, de modo que un If-None-Match vigente se responde con 304 sin
+calcular nada. Los cuerpos no se memoizan (las tablas sin `desde` ya
+vienen precalculadas por versión) y se comprimen con gzip si el cliente lo
+acepta.
+"""
+import gzip
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+from flask import Blueprint, Response, request
+
+import motor_rentabilidades
+
+MONEDAS = ('CLP', 'USD')
+FORMATOS = {'json': 'application/json', 'csv': 'text/csv; charset=utf-8'}
+# Bajo este tamaño gzip no compensa
+MIN_BYTES_GZIP = 1024
+
+COLUMNAS_PERIODOS = (['Fondo', 'Serie', 'Moneda', 'TAC'] + [nombre for nombre, _ in motor_rentabilidades.PERIODOS]
+                     + ['ITD'])
+COLUMNAS_ANUALIZADAS = (['Fondo', 'Serie', 'Moneda'] + [nombre for nombre, _ in motor_rentabilidades.PERIODOS_ANUALIZADOS]
+                        + ['ITD', 'Años Historial'])
+
+
+class ErrorConsulta(Exception):
+    def __init__(self, mensaje, estado=400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def _fecha(nombre):
+    valor = request.args.get(nombre)
+    if not valor:
+        return None
+    try:
+        return pd.Timestamp(valor).normalize()
+    except ValueError:
+        raise ErrorConsulta(f"Fecha inválida en '{nombre}': {valor}")
+
+
+def leer_consulta(datos):
+    """Parámetros validados de la consulta; lanza ErrorConsulta si alguno no sirve."""
+    moneda = request.args.get('moneda', 'CLP').upper()
+    if moneda not in MONEDAS:
+        raise ErrorConsulta(f"Moneda inválida: {moneda} (use CLP o USD)")
+
+    formato = request.args.get('formato', 'json').lower()
+    if formato not in FORMATOS:
+        raise ErrorConsulta(f"Formato inválido: {formato} (use json o csv)")
+
+    fondos = request.args.getlist('fondos') or list(datos.fondos)
+    conocidos = set(datos.fondos)
+    desconocidos = [fondo for fondo in fondos if fondo not in conocidos]
+    if desconocidos:
+        raise ErrorConsulta(f"Fondos desconocidos: {', '.join(desconocidos)}")
+
+    desde, hasta = _fecha('desde'), _fecha('hasta')
+    if desde is not None and hasta is not None and desde > hasta:
+        raise ErrorConsulta("'desde' es posterior a 'hasta'")
+
+    return {
+        'moneda': moneda,
+        'fondos': fondos,
+        'desde': desde.date().isoformat() if desde is not None else None,
+        'hasta': hasta.date().isoformat() if hasta is not None else None,
+        'formato': formato,
+    }
+
+
+def etag_consulta(datos, consulta):
+    contenido = json.dumps([datos.version, request.path, consulta], ensure_ascii=False)
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+
+def _filas_en_rango(matriz, desde, hasta):
+    fila_desde, fila_hasta = 0, len(matriz.fechas)
+    if desde is not None:
+        fila_desde = int(np.searchsorted(matriz.fechas, np.datetime64(pd.Timestamp(desde), 'ns'), side='left'))
+    if hasta is not None:
+        fila_hasta = int(np.searchsorted(matriz.fechas, np.datetime64(pd.Timestamp(hasta), 'ns'), side='right'))
+    return fila_desde, max(fila_hasta, fila_desde)
+
+
+def serializar(tabla, consulta, datos):
+    """Cuerpo JSON o CSV de una tabla (NaN como null o celda vacía)."""
+    if consulta['formato'] == 'csv':
+        return tabla.to_csv(index=False)
+
+    registros = tabla.astype(object).where(tabla.notna(), None).to_dict('records')
+    return json.dumps({
+        'version': datos.version,
+        'moneda': consulta['moneda'],
+        'desde': consulta['desde'],
+        'hasta': consulta['hasta'],
+        'columnas': list(tabla.columns),
+        'registros': registros,
+    }, ensure_ascii=False, default=str)
+
+
+def responder(cuerpo, formato, etag):
+    datos = cuerpo.encode('utf-8')
+    respuesta = Response(datos, content_type=FORMATOS[formato])
+    if len(datos) >= MIN_BYTES_GZIP and 'gzip' in request.accept_encodings:
+        respuesta.set_data(gzip.compress(datos, compresslevel=6))
+        respuesta.headers['Content-Encoding'] = 'gzip'
+    respuesta.headers['Vary'] = 'Accept-Encoding'
+    # Débil: la versión gzip y la sin comprimir son equivalentes
+    respuesta.set_etag(etag, weak=True)
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+
+def crear_api(almacen, tablas, matriz_precios, calcular_retornos):
+    """
+    Blueprint de la API.
+
+    `tablas` asocia 'periodos', 'anualizadas' y 'por-ano' a los accesores
+    (datos, moneda, fecha_corte) -> tabla completa de app.py, que se
+    reutilizan cuando la consulta no trae `desde`. `calcular_retornos`
+    es (datos, moneda, fondos, desde, hasta) -> DataFrame de retornos.
+    """
+    api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+    calculos_rango = {
+        'periodos': lambda matriz, datos: motor_rentabilidades.calcular_tabla_periodos(matriz, datos.series, datos.tac),
+        'anualizadas': lambda matriz, datos: motor_rentabilidades.calcular_tabla_anualizada(matriz, datos.series),
+        'por-ano': lambda matriz, datos: motor_rentabilidades.calcular_tabla_por_año(matriz, datos.series),
+    }
+
+    def tabla_rentabilidades(nombre, datos, consulta):
+        moneda, desde, hasta = consulta['moneda'], consulta['desde'], consulta['hasta']
+        if desde is None:
+            fecha_corte = pd.Timestamp(hasta) if hasta is not None else None
+            tabla, matriz = tablas[nombre](datos, moneda, fecha_corte), matriz_precios(datos, moneda)
+        else:
+            # Submatriz de las filas del rango, recortada desde el índice vigente
+            vigente = matriz_precios(datos, moneda)
+            matriz = vigente.recortar(*_filas_en_rango(vigente, desde, hasta))
+            tabla = calculos_rango[nombre](matriz, datos)
+
+        tabla = motor_rentabilidades.seleccionar_fondos(tabla, matriz, consulta['fondos'])
+        tabla['Moneda'] = moneda
+        if nombre == 'periodos':
+            return tabla[COLUMNAS_PERIODOS]
+        if nombre == 'anualizadas':
+            return tabla[COLUMNAS_ANUALIZADAS]
+        años = sorted((col for col in tabla.columns if col not in ('Fondo', 'Serie', 'Moneda')), reverse=True)
+        return tabla[['Fondo', 'Serie', 'Moneda'] + años]
+
+    def tabla_retornos(datos, consulta):
+        fechas = matriz_precios(datos, consulta['moneda']).fechas
+        desde = pd.Timestamp(consulta['desde']) if consulta['desde'] else pd.Timestamp(fechas[0])
+        hasta = pd.Timestamp(consulta['hasta']) if consulta['hasta'] else pd.Timestamp(fechas[-1])
+        retornos = calcular_retornos(datos, consulta['moneda'], consulta['fondos'], desde, hasta)
+        if retornos.empty:
+            return pd.DataFrame(columns=['Fecha'])
+        retornos = retornos.rename(columns={'Dates': 'Fecha'}).round(4)
+        retornos['Fecha'] = retornos['Fecha'].dt.strftime('%Y-%m-%d')
+        return retornos
+
+    def servir(construir_tabla):
+        datos = almacen.actual()
+        if datos is None:
+            return {'error': 'Datos cargando, intente nuevamente en unos segundos'}, 503
+        try:
+            consulta = leer_consulta(datos)
+        except ErrorConsulta as e:
+            return {'error': str(e)}, e.estado
+
+        etag = etag_consulta(datos, consulta)
+        if request.if_none_match.contains_weak(etag):
+            respuesta = Response(status=304)
+            respuesta.set_etag(etag, weak=True)
+            respuesta.headers['Cache-Control'] = 'no-cache'
+            return respuesta
+
+        # Sin memoizar el cuerpo: las claves las eligen los clientes y un cuerpo puede pesar
+        # decenas de MB; las consultas repetidas se resuelven con el 304 de arriba
+        cuerpo = serializar(construir_tabla(datos, consulta), consulta, datos)
+        return responder(cuerpo, consulta['formato'], etag)
+
+    @api.route('/fondos')
+    def fondos():
+        datos = almacen.actual()
+        if datos is None:
+            return {'error': 'Datos cargando, intente nuevamente en unos segundos'}, 503
+        fechas = datos.pesos_df['Dates']
+        return {
+            'version': datos.version,
+            'desde': fechas.min().date().isoformat(),
+            'hasta': fechas.max().date().isoformat(),
+            'fondos': [{'fondo': fondo, 'serie': datos.series[i] if i < len(datos.series) else None}
+                       for i, fondo in enumerate(datos.fondos)],
+        }
+
+    @api.route('/rentabilidades/<any(periodos, anualizadas, "por-ano"):nombre>')
+    def rentabilidades(nombre):
+        return servir(lambda datos, consulta: tabla_rentabilidades(nombre, datos, consulta))
+
+    @api.route('/retornos-acumulados')
+    def retornos_acumulados():
+        return servir(tabla_retornos)
+
+    # Sin esto Dash respondería con la página del portal a cualquier ruta
+    @api.route('/<path:ruta>')
+    def no_encontrada(ruta):
+        return {'error': f'Ruta desconocida: /api/v1/{ruta}'}, 404
+
+    return api
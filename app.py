@@ -1,17 +1,33 @@
+import time
+INICIO_ARRANQUE = time.perf_counter()
+
+import copy
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import dash
-from dash import html, dcc, dash_table, callback, Input, Output, State
+from dash import html, dcc, dash_table, callback, clientside_callback, ClientsideFunction, Input, Output, State
 import dash_bootstrap_components as dbc
-from openpyxl import load_workbook
 import os
 import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
 
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+from almacen_datos import AlmacenDatos
+import api
+import assets_estaticos
+from carga_datos import buscar_archivo_datos, cargar_datos_optimizado
+import motor_rentabilidades
+from motor_rentabilidades import MatrizPrecios
+from memoizacion import Memoizador, crear_memoizador_desde_entorno
+import memoria_compartida
+import metricas
+import perfilado
+import submuestreo
+
+# Assets compilados (assets_dist/, ver assets_estaticos.py) si están al día con assets/
+assets = assets_estaticos.Assets()
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], assets_folder=assets.carpeta)
 server = app.server
+assets.servir(app)
 
 # Modal de información
 modal = dbc.Modal([
@@ -28,6 +44,8 @@ modal = dbc.Modal([
             html.Li("Rentabilidad Anualizada: Consulta el rendimiento anual promedio", 
                     style={'fontFamily': 'SuraSans-Regular'}),
             html.Li("Rentabilidad por Año: Compara el desempeño año a año", 
+                    style={'fontFamily': 'SuraSans-Regular'}),
+            html.Li("Riesgo: Volatilidad, Sharpe y Sortino (sin tasa libre de riesgo) y máximo drawdown por ventana", 
                     style={'fontFamily': 'SuraSans-Regular'})
         ]),
         html.Hr(),
@@ -74,7 +92,7 @@ modal_grafico = dbc.Modal([
 top_navbar = dbc.Navbar(
     dbc.Container([
         html.Img(
-            src="/assets/sura_logo.png", 
+            src=assets.url('sura_logo.png'), 
             height="50px", 
             style={'marginRight': '20px'}
         ),
@@ -127,8 +145,18 @@ tabs = dbc.Tabs([
            label_style={'fontFamily': 'SuraSans-Regular', 'fontWeight': 'bold'}),
    dbc.Tab(label="Rentabilidad por Año", tab_id="por_ano", 
            label_style={'fontFamily': 'SuraSans-Regular', 'fontWeight': 'bold'}),
+   dbc.Tab(label="Riesgo", tab_id="riesgo", 
+           label_style={'fontFamily': 'SuraSans-Regular', 'fontWeight': 'bold'}),
 ], id="tabs", active_tab="acumulada", style={'marginTop': '20px'})
 
+# Modos del gráfico: (opción, título, eje y); los móviles van con su ventana en días
+MODOS_GRAFICO = {
+    'acumulado': ("Retorno acumulado", 'Retornos Acumulados', 'Retorno Acumulado (%)'),
+    'movil-12m': ("Rentabilidad móvil 12 meses", 'Rentabilidad Móvil 12 Meses', 'Rentabilidad 12 Meses (%)'),
+    'movil-36m': ("Rentabilidad móvil 36 meses", 'Rentabilidad Móvil 36 Meses', 'Rentabilidad 36 Meses (%)'),
+}
+DIAS_MODO_MOVIL = {'movil-12m': 365, 'movil-36m': 1095}
+
 # CONTROLES CON SINCRONIZACIÓN
 controles_acumulada = html.Div([
     html.H2("Rentabilidad Acumulada", 
@@ -163,7 +191,8 @@ controles_acumulada = html.Div([
     html.H5("Tabla de Rentabilidades:", style={'fontFamily': 'SuraSans-SemiBold', 'marginBottom': '15px'}),
     html.Div(id='tabla-rentabilidades-acumulada'),
     
-    html.H5("Gráfico de Retornos Acumulados:", style={'fontFamily': 'SuraSans-SemiBold', 'marginTop': '40px', 'marginBottom': '15px'}),
+    html.H5("Gráfico de Retornos Acumulados:", id='titulo-grafico',
+            style={'fontFamily': 'SuraSans-SemiBold', 'marginTop': '40px', 'marginBottom': '15px'}),
     
     dbc.Row([
         dbc.Col([
@@ -212,7 +241,15 @@ controles_acumulada = html.Div([
                     'padding': '10px',
                     'borderRadius': '5px',
                     'border': '1px solid #dee2e6'
-                })
+                }),
+                html.Label("Ver:", style={'fontFamily': 'SuraSans-SemiBold', 'fontSize': '14px',
+                                          'marginTop': '15px', 'marginBottom': '5px'}),
+                dbc.RadioItems(
+                    id='modo-grafico',
+                    options=[{'label': etiqueta, 'value': modo} for modo, (etiqueta, _, _) in MODOS_GRAFICO.items()],
+                    value='acumulado',
+                    style={'fontFamily': 'SuraSans-Regular', 'fontSize': '14px'}
+                )
             ])
         ], width=3),
         
@@ -231,9 +268,17 @@ controles_acumulada = html.Div([
                         'scale': 2
                     }
                 }
-            )
+            ),
+            dcc.Store(id='ancho-grafico'),
+            dcc.Store(id='zoom-grafico'),
+            dcc.Store(id='estado-grafico'),
+            # Título de cada modo, para el encabezado que se cambia en el navegador
+            dcc.Store(id='titulos-grafico', data={modo: titulo for modo, (_, titulo, _) in MODOS_GRAFICO.items()})
         ], width=9)
-    ], style={'marginBottom': '20px'})
+    ], style={'marginBottom': '20px'}),
+    
+    html.H5("Rentabilidad en el Rango del Gráfico:", style={'fontFamily': 'SuraSans-SemiBold', 'marginBottom': '15px'}),
+    html.Div(id='tabla-rango-grafico')
 ], id="content-acumulada", style={'display': 'block'})
 
 controles_anualizada = html.Div([
@@ -311,213 +356,134 @@ controles_por_año = html.Div([
         ], width=9)
     ], style={'marginBottom': '20px'}),
     
+    # Ventana de columnas de años: se envían AÑOS_POR_VENTANA a la vez
+    html.Div([
+        dbc.Button("« Años anteriores", id='años-anteriores', size='sm', outline=True, color='secondary',
+                   style={'marginRight': '10px'}),
+        dbc.Button("Años recientes »", id='años-recientes', size='sm', outline=True, color='secondary')
+    ], style={'marginBottom': '10px'}),
+    dcc.Store(id='ventana-años', data=0),
+    
     html.Div(id='tabla-rentabilidades-por-año')
 ], id="content-por-año", style={'display': 'none'})
 
-# Layout principal con TODOS los componentes definidos
-app.layout = html.Div([
+# Ventanas de la tabla de riesgo: las mismas de la tabla acumulada
+VENTANAS_RIESGO = [nombre for nombre, _ in motor_rentabilidades.PERIODOS] + ['ITD']
+
+controles_riesgo = html.Div([
+    html.H2("Riesgo", 
+            style={'fontFamily': 'SuraSans-SemiBold', 'marginBottom': '20px'}),
+    
+    html.P("Volatilidad y razones de Sharpe y Sortino anualizadas (sin tasa libre de riesgo), máximo drawdown "
+           "y días desde su mínimo hasta recuperar el máximo previo (vacío si aún no se recupera).", 
+           style={'fontFamily': 'SuraSans-Regular', 'fontStyle': 'italic', 'marginBottom': '20px'}),
+    
+    dbc.Row([
+        dbc.Col([
+            html.Label("Moneda:", style={'fontFamily': 'SuraSans-SemiBold'}),
+            dcc.Dropdown(
+                id='moneda-selector-riesgo',
+                options=[
+                    {'label': 'Pesos Chilenos (CLP)', 'value': 'CLP'},
+                    {'label': 'Dólares (USD)', 'value': 'USD'}
+                ],
+                value='CLP',
+                style={'fontFamily': 'SuraSans-Regular'}
+            )
+        ], width=3),
+        dbc.Col([
+            html.Label("Ventana:", style={'fontFamily': 'SuraSans-SemiBold'}),
+            dcc.Dropdown(
+                id='ventana-selector-riesgo',
+                options=[{'label': ventana, 'value': ventana} for ventana in VENTANAS_RIESGO],
+                value='12 Meses',
+                clearable=False,
+                style={'fontFamily': 'SuraSans-Regular'}
+            )
+        ], width=2),
+        dbc.Col([
+            html.Label([
+                "Filtrar Fondos: ",
+                html.Span("(sincronizado con otras pestañas)", 
+                         style={'fontSize': '12px', 'color': '#0B2DCE', 'fontStyle': 'italic'})
+            ], style={'fontFamily': 'SuraSans-SemiBold'}),
+            dcc.Dropdown(
+                id='fondos-selector-riesgo',
+                options=[],
+                value=[],
+                multi=True,
+                style={'fontFamily': 'SuraSans-Regular'}
+            )
+        ], width=7)
+    ], style={'marginBottom': '20px'}),
+    
+    html.Div(id='tabla-rentabilidades-riesgo')
+], id="content-riesgo", style={'display': 'none'})
+
+# Layout principal con TODOS los componentes definidos (sin datos; ver servir_layout)
+layout_base = html.Div([
    top_navbar,
    modal,
    modal_grafico,
    bottom_navbar,
    dbc.Container([
+       # Visible solo mientras el worker carga los datos (ver layout_cargando)
+       html.Div([
+           dbc.Spinner(size='sm', color='secondary'),
+           html.Span(" Cargando datos, la página se actualizará sola en unos segundos...",
+                     style={'fontFamily': 'SuraSans-Regular'})
+       ], id='aviso-cargando-datos', style={'display': 'none'}),
+       dcc.Interval(id='espera-datos', interval=2000, disabled=True),
+       dcc.Store(id='datos-listos'),
        tabs,
+       dcc.Store(id='fondos-seleccionados', data=[]),
        html.Div([
+           # Fecha de corte común a las tablas de todas las pestañas (vacía = último precio)
+           html.Div([
+               html.Label("Fecha de corte:", style={'fontFamily': 'SuraSans-SemiBold', 'marginRight': '10px'}),
+               dcc.DatePickerSingle(
+                   id='fecha-corte',
+                   date=None,
+                   placeholder='Último precio',
+                   clearable=True,
+                   display_format='DD/MM/YYYY'
+               )
+           ] + [dcc.Store(id=f'fecha-corte-{sufijo}') for sufijo in ('acumulada', 'anualizada', 'por-año', 'riesgo')],
+               style={'marginBottom': '20px'}),
            controles_acumulada,
            controles_anualizada,
-           controles_por_año
+           controles_por_año,
+           controles_riesgo
        ], style={'padding': '30px'})
    ], fluid=True)
 ], style={'margin': '0', 'padding': '0'})
 
-# Función para cargar y procesar datos
-def cargar_datos_optimizado():
-    try:
-        posibles_rutas = [
-            'data/rentabilidades.xlsx',          # Para deployment
-            './data/rentabilidades.xlsx',       # Local relativa
-            '../data/rentabilidades.xlsx',      # Backup
-            'rentabilidades.xlsx'                # Si está en raíz
-        ]
-        
-        ruta_archivo = None
-        for ruta in posibles_rutas:
-            if os.path.exists(ruta):
-                ruta_archivo = ruta
-                break
-        
-        if ruta_archivo is None:
-            print("Error: No se encontró el archivo rentabilidades.xlsx")
-            return None, None, [], []
-        
-        print(f"Cargando archivo desde: {ruta_archivo}")
-        
-        nombres_df = pd.read_excel(ruta_archivo, sheet_name='nombres', 
-                                 header=None, engine='openpyxl')
-        pesos_df = pd.read_excel(ruta_archivo, sheet_name='Pesos', 
-                               skiprows=7, engine='openpyxl')
-        dolares_df = pd.read_excel(ruta_archivo, sheet_name='Dolares', 
-                                 skiprows=7, engine='openpyxl')
-        
-        fondos_raw = nombres_df.iloc[0, :].tolist()
-        series_raw = nombres_df.iloc[2, :].tolist()
-        
-        fondos = [f for f in fondos_raw if pd.notna(f)]
-        series = [s for s in series_raw if pd.notna(s)]
-        
-        nuevas_columnas = ['Dates'] + fondos
-        
-        if len(nuevas_columnas) == len(pesos_df.columns):
-            pesos_df.columns = nuevas_columnas
-            dolares_df.columns = nuevas_columnas
-        else:
-            print(f"Error: Longitud columnas no coincide")
-            return None, None, [], []
-        
-        pesos_df['Dates'] = pd.to_datetime(pesos_df['Dates'])
-        dolares_df['Dates'] = pd.to_datetime(dolares_df['Dates'])
-        
-        return pesos_df, dolares_df, fondos, series
-        
-    except Exception as e:
-        print(f"Error cargando datos: {e}")
-        return None, None, [], []
-
-# Cargar datos al iniciar
-pesos_df, dolares_df, fondos, series = cargar_datos_optimizado()
+# Funciones de cálculo (delegan en el motor vectorizado de motor_rentabilidades)
+def _matriz_desde_df(df, fondos, series):
+    presentes = [(f, series[i] if i < len(series) else 'N/A') 
+                 for i, f in enumerate(fondos) if f in df.columns]
+    fondos_presentes = [f for f, _ in presentes]
+    matriz = MatrizPrecios.desde_dataframe(df[['Dates'] + fondos_presentes])
+    return matriz, [s for _, s in presentes]
 
-# Funciones de cálculo (mantener las mismas)
-def calcular_rentabilidades(df, fondos, series):
-   resultados = []
-   fecha_actual = df['Dates'].max()
-   
-   for i, fondo in enumerate(fondos):
-       if fondo in df.columns:
-           serie = series[i] if i < len(series) else 'N/A'
-           precios = df[['Dates', fondo]].dropna()
-           
-           if len(precios) > 0:
-               precio_actual = precios[fondo].iloc[-1]
-               
-               rent_1m = calcular_rentabilidad_periodo(precios, 30, precio_actual)
-               rent_3m = calcular_rentabilidad_periodo(precios, 90, precio_actual) 
-               rent_ytd = calcular_rentabilidad_ytd(precios, precio_actual)
-               rent_12m = calcular_rentabilidad_periodo(precios, 365, precio_actual)
-               rent_3a = calcular_rentabilidad_periodo(precios, 1095, precio_actual)
-               rent_5a = calcular_rentabilidad_periodo(precios, 1825, precio_actual)
-               rent_itd = ((precio_actual / precios[fondo].iloc[0]) - 1) * 100
-               
-               resultados.append({
-                   'Fondo': fondo,
-                   'Serie': serie,
-                   'TAC': np.random.uniform(0.5, 2.5),
-                   '1 Mes': rent_1m,
-                   '3 Meses': rent_3m,
-                   'YTD': rent_ytd,
-                   '12 Meses': rent_12m,
-                   '3 Años': rent_3a,
-                   '5 Años': rent_5a,
-                   'ITD': rent_itd
-               })
-   
-   return pd.DataFrame(resultados).round(2)
+def calcular_rentabilidades(df, fondos, series, tac=None):
+   matriz, series_presentes = _matriz_desde_df(df, fondos, series)
+   tac_presentes = None
+   if tac is not None:
+       tac_presentes = [tac[i] if i < len(tac) else np.nan 
+                        for i, f in enumerate(fondos) if f in df.columns]
+   tabla = motor_rentabilidades.calcular_tabla_periodos(matriz, series_presentes, tac_presentes)
+   return tabla.reset_index(drop=True)
 
 def calcular_rentabilidades_anualizadas(df, fondos, series):
-    resultados = []
-    
-    for i, fondo in enumerate(fondos):
-        if fondo in df.columns:
-            serie = series[i] if i < len(series) else 'N/A'
-            precios = df[['Dates', fondo]].dropna()
-            
-            if len(precios) > 0:
-                precio_actual = precios[fondo].iloc[-1]
-                precio_inicial = precios[fondo].iloc[0]
-                fecha_inicial = precios['Dates'].iloc[0]
-                fecha_actual = precios['Dates'].iloc[-1]
-                
-                años_transcurridos = (fecha_actual - fecha_inicial).days / 365.25
-                
-                if años_transcurridos > 0:
-                    rent_anual_itd = (((precio_actual / precio_inicial) ** (1/años_transcurridos)) - 1) * 100
-                else:
-                    rent_anual_itd = 0
-                
-                rent_anual_1a = calcular_rentabilidad_anualizada_periodo(precios, 365)
-                rent_anual_3a = calcular_rentabilidad_anualizada_periodo(precios, 1095)
-                rent_anual_5a = calcular_rentabilidad_anualizada_periodo(precios, 1825)
-                
-                resultados.append({
-                    'Fondo': fondo,
-                    'Serie': serie,
-                    '1 Año': rent_anual_1a,
-                    '3 Años': rent_anual_3a,
-                    '5 Años': rent_anual_5a,
-                    'ITD': rent_anual_itd,
-                    'Años Historial': round(años_transcurridos, 1)
-                })
-    
-    return pd.DataFrame(resultados).round(2)
+    matriz, series_presentes = _matriz_desde_df(df, fondos, series)
+    tabla = motor_rentabilidades.calcular_tabla_anualizada(matriz, series_presentes)
+    return tabla.reset_index(drop=True)
 
 def calcular_rentabilidades_por_año(df, fondos, series):
-    resultados = []
-    años = sorted(df['Dates'].dt.year.unique())
-    
-    for i, fondo in enumerate(fondos):
-        if fondo in df.columns:
-            serie = series[i] if i < len(series) else 'N/A'
-            precios = df[['Dates', fondo]].dropna()
-            
-            if len(precios) > 0:
-                fila_resultado = {'Fondo': fondo, 'Serie': serie}
-                
-                for año in años:
-                    datos_año = precios[precios['Dates'].dt.year == año]
-                    
-                    if len(datos_año) > 1:
-                        precio_inicio = datos_año[fondo].iloc[0]
-                        precio_fin = datos_año[fondo].iloc[-1]
-                        rentabilidad = ((precio_fin / precio_inicio) - 1) * 100
-                        fila_resultado[str(año)] = round(rentabilidad, 2)
-                    else:
-                        fila_resultado[str(año)] = np.nan
-                
-                resultados.append(fila_resultado)
-    
-    return pd.DataFrame(resultados)
-
-def calcular_rentabilidad_periodo(precios, dias, precio_actual):
-   fecha_objetivo = precios['Dates'].max() - timedelta(days=dias)
-   precio_pasado = precios[precios['Dates'] >= fecha_objetivo]
-   
-   if len(precio_pasado) > 0:
-       precio_inicial = precio_pasado.iloc[0, 1]
-       return ((precio_actual / precio_inicial) - 1) * 100
-   return np.nan
-
-def calcular_rentabilidad_ytd(precios, precio_actual):
-   año_actual = precios['Dates'].max().year
-   inicio_año = precios[precios['Dates'].dt.year == año_actual]
-   
-   if len(inicio_año) > 0:
-       precio_inicio_año = inicio_año.iloc[0, 1]
-       return ((precio_actual / precio_inicio_año) - 1) * 100
-   return np.nan
-
-def calcular_rentabilidad_anualizada_periodo(precios, dias):
-    fecha_objetivo = precios['Dates'].max() - timedelta(days=dias)
-    datos_periodo = precios[precios['Dates'] >= fecha_objetivo]
-    
-    if len(datos_periodo) > 1:
-        precio_inicial = datos_periodo.iloc[0, 1]
-        precio_final = datos_periodo.iloc[-1, 1]
-        fecha_inicial = datos_periodo['Dates'].iloc[0]
-        fecha_final = datos_periodo['Dates'].iloc[-1]
-        
-        años = (fecha_final - fecha_inicial).days / 365.25
-        if años > 0:
-            return (((precio_final / precio_inicial) ** (1/años)) - 1) * 100
-    return np.nan
+    matriz, series_presentes = _matriz_desde_df(df, fondos, series)
+    tabla = motor_rentabilidades.calcular_tabla_por_año(matriz, series_presentes)
+    return tabla.reset_index(drop=True)
 
 def calcular_retornos_acumulados(df, fondos_seleccionados, fecha_inicio, fecha_fin):
     df_filtrado = df[(df['Dates'] >= fecha_inicio) & (df['Dates'] <= fecha_fin)].copy()
@@ -537,7 +503,89 @@ def calcular_retornos_acumulados(df, fondos_seleccionados, fecha_inicio, fecha_f
     
     return pd.DataFrame(retornos_data)
 
-def crear_grafico_retornos(df_retornos, fondos_seleccionados):
+# Submuestreo LTTB del gráfico: presupuesto de puntos por serie según el ancho en píxeles
+SUBMUESTREO_GRAFICO = os.environ.get('SUBMUESTREO_GRAFICO', '1') != '0'
+PRESUPUESTO_POR_DEFECTO = 1200
+PRESUPUESTO_MINIMO = 300
+PRESUPUESTO_MAXIMO = 4000
+
+def presupuesto_puntos(ancho_px):
+    if not SUBMUESTREO_GRAFICO:
+        return None
+    if not ancho_px:
+        return PRESUPUESTO_POR_DEFECTO
+    return int(min(max(ancho_px, PRESUPUESTO_MINIMO), PRESUPUESTO_MAXIMO))
+
+def ventana_zoom(relayout_data):
+    """
+    Interpreta el relayoutData del gráfico.
+
+    Devuelve (es_zoom, ventana): ventana es (desde, hasta) si se hizo zoom en
+    el eje x, o None si se volvió al rango completo (autorange).
+    """
+    if not relayout_data:
+        return False, None
+    if relayout_data.get('xaxis.autorange'):
+        return True, None
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return True, (pd.Timestamp(relayout_data['xaxis.range[0]']), pd.Timestamp(relayout_data['xaxis.range[1]']))
+    if 'xaxis.range' in relayout_data:
+        desde, hasta = relayout_data['xaxis.range']
+        return True, (pd.Timestamp(desde), pd.Timestamp(hasta))
+    return False, None
+
+PALETA_PRIMARIA = ['#24272A', '#0B2DCE', '#5A646E', '#98A4AE', '#FFE946']
+PALETA_SECUNDARIA = [
+    '#727272', '#52C599', '#CC9967', '#9B5634', '#D4BE7F', 
+    '#3C86B4', '#A0A0A0', '#7FD4B3', '#D5AB80', '#C9805C', 
+    '#9E3541', '#A8CDE2', '#C8C8C8', '#A3E1C2', '#E0C1A2', 
+    '#D49A7D', '#DE9CA6', '#CBB363'
+]
+
+# Sobre este total de puntos el gráfico usa trazas WebGL (Scattergl)
+UMBRAL_WEBGL = int(os.environ.get('GRAFICO_UMBRAL_WEBGL', 5000))
+
+def colores_fondos(fondos_seleccionados):
+    colores_a_usar = PALETA_PRIMARIA if len(fondos_seleccionados) <= 5 else PALETA_SECUNDARIA
+    return {fondo: colores_a_usar[i % len(colores_a_usar)] for i, fondo in enumerate(fondos_seleccionados)}
+
+def series_retornos(df_retornos, fondos, presupuesto=None, ventana=None):
+    """(fondo, fechas, retornos) de cada fondo con datos, ya submuestreados si corresponde."""
+    if df_retornos.empty:
+        return []
+    fechas = df_retornos['Dates'].to_numpy(dtype='datetime64[ns]')
+    series = []
+    for fondo in fondos:
+        if fondo in df_retornos.columns:
+            x, y = fechas, df_retornos[fondo].to_numpy(dtype=np.float64)
+            
+            # Solo se submuestrea si la serie supera el presupuesto; los puntos retenidos son reales
+            if presupuesto and np.count_nonzero(~np.isnan(y)) > presupuesto:
+                indices = submuestreo.indices_submuestreo(x, y, presupuesto, ventana)
+                x, y = x[indices], y[indices]
+            series.append((fondo, x, y))
+    return series
+
+def usar_webgl(series):
+    return sum(len(x) for _, x, _ in series) > UMBRAL_WEBGL
+
+def traza_retornos(fondo, x, y, color_linea, webgl=False):
+    clase_traza = go.Scattergl if webgl else go.Scatter
+    return clase_traza(
+        x=x,
+        y=y,
+        mode='lines',
+        name=fondo,
+        line=dict(color=color_linea, width=2),
+        hovertemplate=f'<b>{fondo}</b><br>' +
+                    'Fecha: %{x}<br>' +
+                    'Retorno: %{y:.2f}%<extra></extra>'
+    )
+
+def crear_grafico_retornos(df_retornos, fondos_seleccionados, presupuesto=None, ventana=None, series=None,
+                           modo='acumulado'):
+    if series is None:
+        series = series_retornos(df_retornos, fondos_seleccionados, presupuesto, ventana)
     if df_retornos.empty:
         return go.Figure().add_annotation(
             text="No hay datos para el período seleccionado",
@@ -545,44 +593,24 @@ def crear_grafico_retornos(df_retornos, fondos_seleccionados):
         )
     
     fig = go.Figure()
+    colores = colores_fondos(fondos_seleccionados)
+    webgl = usar_webgl(series)
     
-    paleta_primaria = ['#24272A', '#0B2DCE', '#5A646E', '#98A4AE', '#FFE946']
-    paleta_secundaria = [
-        '#727272', '#52C599', '#CC9967', '#9B5634', '#D4BE7F', 
-        '#3C86B4', '#A0A0A0', '#7FD4B3', '#D5AB80', '#C9805C', 
-        '#9E3541', '#A8CDE2', '#C8C8C8', '#A3E1C2', '#E0C1A2', 
-        '#D49A7D', '#DE9CA6', '#CBB363'
-    ]
-    
-    num_fondos = len(fondos_seleccionados)
-    colores_a_usar = paleta_primaria if num_fondos <= 5 else paleta_secundaria
-    
-    for i, fondo in enumerate(fondos_seleccionados):
-        if fondo in df_retornos.columns:
-            color_linea = colores_a_usar[i % len(colores_a_usar)]
-            
-            fig.add_trace(go.Scatter(
-                x=df_retornos['Dates'],
-                y=df_retornos[fondo],
-                mode='lines',
-                name=fondo,
-                line=dict(color=color_linea, width=2),
-                hovertemplate=f'<b>{fondo}</b><br>' +
-                            'Fecha: %{x}<br>' +
-                            'Retorno: %{y:.2f}%<extra></extra>'
-            ))
+    for fondo, x, y in series:
+        fig.add_trace(traza_retornos(fondo, x, y, colores[fondo], webgl))
     
     fig.add_hline(y=0, line_dash="dash", line_color="gray", opacity=0.5)
     
+    _, titulo, titulo_eje_y = MODOS_GRAFICO[modo]
     fig.update_layout(
         title={
-            'text': 'Retornos Acumulados',
+            'text': titulo,
             'x': 0.5,
             'y': 0.95,
             'font': {'family': 'SuraSans-SemiBold', 'size': 18, 'color': '#24272A'}
         },
         xaxis_title='Fecha',
-        yaxis_title='Retorno Acumulado (%)',
+        yaxis_title=titulo_eje_y,
         font={'family': 'SuraSans-Regular', 'color': '#24272A'},
         hovermode='x unified',
         legend=dict(
@@ -602,137 +630,313 @@ def crear_grafico_retornos(df_retornos, fondos_seleccionados):
     
     return fig
 
+# Resultados precalculados por versión de datos (se calculan una vez por instantánea)
+def matriz_precios(datos, moneda):
+    def construir():
+        base = datos.base
+        if base is not None:
+            matriz = MatrizPrecios.extender(matriz_precios(base, moneda), datos.precios(moneda))
+        else:
+            matriz = MatrizPrecios.desde_dataframe(datos.precios(moneda))
+        if moneda == 'USD':
+            # Un solo vector de fechas para ambas monedas
+            matriz.compartir_fechas(matriz_precios(datos, 'CLP'))
+        return matriz
+    
+    # En modo DATOS_COMPARTIDOS la matriz se adjunta desde memoria compartida entre workers
+    return datos.derivado(('matriz', moneda), lambda: memoria_compartida.obtener_matriz(
+        datos.version, moneda, construir))
+
+def leer_fecha_corte(fecha):
+    """Fecha de corte del selector (AAAA-MM-DD), o None si está vacío."""
+    return pd.Timestamp(fecha).normalize() if fecha else None
+
+def corte_efectivo(datos, moneda, fecha_corte):
+    # Un corte en o después del último precio es la tabla vigente, ya precalculada
+    if motor_rentabilidades.fila_corte(matriz_precios(datos, moneda), fecha_corte) is None:
+        return None
+    return fecha_corte
+
+# Las tablas con corte usan el índice de la matriz vigente (O(log n) por fondo) y se
+# memoizan junto a sus registros; sin corte se guardan con la versión de datos
+def tabla_periodos(datos, moneda, fecha_corte=None):
+    if corte_efectivo(datos, moneda, fecha_corte) is not None:
+        return motor_rentabilidades.calcular_tabla_periodos(
+            matriz_precios(datos, moneda), datos.series, datos.tac, fecha_corte)
+    return datos.derivado(('periodos', moneda), lambda: motor_rentabilidades.calcular_tabla_periodos(
+        matriz_precios(datos, moneda), datos.series, datos.tac))
+
+def tabla_anualizada(datos, moneda, fecha_corte=None):
+    if corte_efectivo(datos, moneda, fecha_corte) is not None:
+        return motor_rentabilidades.calcular_tabla_anualizada(matriz_precios(datos, moneda), datos.series, fecha_corte)
+    return datos.derivado(('anualizada', moneda), lambda: motor_rentabilidades.calcular_tabla_anualizada(
+        matriz_precios(datos, moneda), datos.series))
+
+def tabla_por_año(datos, moneda, fecha_corte=None):
+    if corte_efectivo(datos, moneda, fecha_corte) is not None:
+        return motor_rentabilidades.calcular_tabla_por_año(
+            matriz_precios(datos, moneda), datos.series, fecha_corte=fecha_corte)
+    
+    def calcular():
+        base = datos.base
+        if base is not None:
+            # Solo se recalculan los años que tocan las fechas nuevas
+            return motor_rentabilidades.actualizar_tabla_por_año(
+                tabla_por_año(base, moneda), matriz_precios(datos, moneda), datos.series, datos.filas_base)
+        return motor_rentabilidades.calcular_tabla_por_año(matriz_precios(datos, moneda), datos.series)
+    return datos.derivado(('por_año', moneda), calcular)
+
+def tablas_riesgo(datos, moneda, fecha_corte=None):
+    # Todas las ventanas a la vez: {ventana: tabla}
+    if corte_efectivo(datos, moneda, fecha_corte) is not None:
+        return motor_rentabilidades.calcular_tablas_riesgo(matriz_precios(datos, moneda), datos.series, fecha_corte)
+    return datos.derivado(('riesgo', moneda), lambda: motor_rentabilidades.calcular_tablas_riesgo(
+        matriz_precios(datos, moneda), datos.series))
+
+def calcular_retornos_moviles(datos, moneda, fondos_seleccionados, fecha_inicio, fecha_fin, dias):
+    """
+    Rentabilidad móvil a `dias` días de los fondos entre dos fechas, en el formato de calcular_retornos_acumulados.
+
+    La serie de toda la historia de cada fondo se calcula una vez por versión,
+    moneda y ventana; un cambio de fechas solo recorta filas.
+    """
+    matriz = matriz_precios(datos, moneda)
+    calculadas = datos.derivado(('moviles', moneda, dias), dict)
+    fondos = [fondo for fondo in fondos_seleccionados if fondo in matriz.posiciones]
+    faltantes = [fondo for fondo in fondos if fondo not in calculadas]
+    if faltantes:
+        # Todos los fondos que faltan en una sola búsqueda sobre la matriz
+        moviles = motor_rentabilidades.retornos_moviles(matriz, [matriz.posiciones[f] for f in faltantes], dias)
+        calculadas.update({fondo: moviles[:, i] for i, fondo in enumerate(faltantes)})
+    
+    desde, hasta = filas_en_rango(matriz, fecha_inicio, fecha_fin)
+    return dataframe_retornos(matriz, desde, hasta, fondos, [calculadas[fondo][desde:hasta] for fondo in fondos])
+
+def filas_en_rango(matriz, fecha_inicio, fecha_fin):
+    desde = np.searchsorted(matriz.fechas, np.datetime64(fecha_inicio, 'ns'), side='left')
+    hasta = np.searchsorted(matriz.fechas, np.datetime64(fecha_fin, 'ns'), side='right')
+    return int(desde), int(hasta)
+
+def dataframe_retornos(matriz, desde, hasta, fondos, series):
+    # Formato de calcular_retornos_acumulados: 'Dates' y una columna por fondo con algún valor
+    if desde >= hasta:
+        return pd.DataFrame()
+    retornos_data = {'Dates': pd.to_datetime(matriz.fechas[desde:hasta])}
+    for fondo, serie in zip(fondos, series):
+        if not np.isnan(serie).all():
+            retornos_data[fondo] = serie
+    return pd.DataFrame(retornos_data)
+
+def retornos_acumulados_matriz(datos, moneda, fondos_seleccionados, fecha_inicio, fecha_fin):
+    """Lo mismo que calcular_retornos_acumulados, leyendo solo las filas del rango en la matriz de precios."""
+    matriz = matriz_precios(datos, moneda)
+    fondos = [fondo for fondo in fondos_seleccionados if fondo in matriz.posiciones]
+    desde, hasta = filas_en_rango(matriz, fecha_inicio, fecha_fin)
+    retornos = motor_rentabilidades.retornos_acumulados(
+        matriz, [matriz.posiciones[fondo] for fondo in fondos], desde, hasta)
+    return dataframe_retornos(matriz, desde, hasta, fondos, retornos.T)
+
+def retornos_grafico(datos, moneda, fondos_seleccionados, fecha_inicio, fecha_fin, modo='acumulado'):
+    fecha_inicio, fecha_fin = pd.to_datetime(fecha_inicio), pd.to_datetime(fecha_fin)
+    if modo in DIAS_MODO_MOVIL:
+        return calcular_retornos_moviles(datos, moneda, fondos_seleccionados, fecha_inicio, fecha_fin,
+                                         DIAS_MODO_MOVIL[modo])
+    return retornos_acumulados_matriz(datos, moneda, fondos_seleccionados, fecha_inicio, fecha_fin)
+
+def precalcular_resultados(datos):
+    for moneda in ['CLP', 'USD']:
+        tabla_periodos(datos, moneda)
+        tabla_anualizada(datos, moneda)
+        tabla_por_año(datos, moneda)
+        tablas_riesgo(datos, moneda)
+
+# Con CARGA_INCREMENTAL=0 cada versión se recalcula completa
+CARGA_INCREMENTAL = os.environ.get('CARGA_INCREMENTAL', '1') != '0'
+
+def filas_base(datos, anterior):
+    """Filas que `datos` comparte con `anterior` si solo le agrega fechas nuevas; si no, None."""
+    if not CARGA_INCREMENTAL or anterior is None or list(datos.fondos) != list(anterior.fondos):
+        return None
+    filas = [motor_rentabilidades.filas_compartidas(datos.precios(moneda), anterior.precios(moneda))
+             for moneda in ('CLP', 'USD')]
+    return filas[0] if filas[0] is not None and filas[0] == filas[1] else None
+
+def preparar_version(datos, anterior=None):
+    """Tablas y vista inicial de una versión nueva, antes de publicarla."""
+    inicio = time.perf_counter()
+    filas = filas_base(datos, anterior)
+    if filas is not None:
+        # La matriz y la tabla por año se extienden desde la versión anterior
+        datos.base, datos.filas_base = anterior, filas
+        print(f"Precálculo incremental: {len(datos.pesos_df) - filas} fechas nuevas sobre la versión {anterior.version}")
+    precalcular_resultados(datos)
+    datos.fases['precalculo'] = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    vista_inicial(datos)
+    datos.fases['vista_inicial'] = time.perf_counter() - inicio
+
+# El almacén carga los datos al final del módulo y los recarga en caliente si cambia el Excel
+almacen = AlmacenDatos(
+    cargar_datos_optimizado, buscar_archivo_datos,
+    intervalo=int(os.environ.get('RECARGA_DATOS_SEGUNDOS', 60)),
+    preparar=preparar_version
+)
+
+# Memoización de tablas: clave (callback, moneda, fondos ordenados, versión de datos)
+memo = crear_memoizador_desde_entorno()
+
+def nombre_con_corte(nombre, fecha_corte):
+    return nombre if fecha_corte is None else f'{nombre}@{fecha_corte:%Y-%m-%d}'
+
+def tabla_memoizada(nombre, datos, moneda, fondos_seleccionados, construir):
+    clave = Memoizador.clave(nombre, moneda, fondos_seleccionados, datos.version)
+    tabla = memo.obtener(clave, construir)
+    
+    # La clave no depende del orden de selección; las filas se ordenan al responder
+    posicion = {fondo: i for i, fondo in enumerate(fondos_seleccionados)}
+    registros = sorted(tabla['registros'], key=lambda r: posicion.get(r['Fondo'], len(posicion)))
+    return tabla['columnas'], registros
+
+@server.route('/estadisticas/memoizacion')
+def estadisticas_memoizacion():
+    return memo.estadisticas()
+
+# Tiempos, CPU y bytes por callback, y estado de la carga de datos, en /metrics
+metricas.instrumentar(app, almacen)
+# Perfilado a pedido (PERFILADO=1 o token firmado con PERFILADO_CLAVE); sin ellas no hace nada
+perfilado.instrumentar(app)
+
+# API REST de solo lectura (/api/v1) sobre las mismas tablas del portal
+server.register_blueprint(api.crear_api(
+    almacen,
+    {'periodos': tabla_periodos, 'anualizadas': tabla_anualizada, 'por-ano': tabla_por_año},
+    matriz_precios, retornos_acumulados_matriz
+))
+
 # CALLBACKS OPTIMIZADOS
 
-@callback(
+# Los modales se abren y cierran en el navegador (assets/clientside.js)
+clientside_callback(
+    ClientsideFunction(namespace='panel', function_name='alternar_modal'),
     Output("info-modal", "is_open"),
     [Input("info-button", "n_clicks"), 
      Input("close-modal", "n_clicks")],
-    [State("info-modal", "is_open")]
+    [State("info-modal", "is_open")],
+    prevent_initial_call=True
 )
-def toggle_modal(n1, n2, is_open):
-    if n1 or n2:
-        return not is_open
-    return is_open
 
 # Callback para cambiar la visualización de pestañas
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace='panel', function_name='mostrar_pestaña'),
     [Output("content-acumulada", "style"),
      Output("content-anualizada", "style"),
-     Output("content-por-año", "style")],
-    [Input("tabs", "active_tab")]
-)
-def update_tab_display(active_tab):
-    styles = [{'display': 'none'}, {'display': 'none'}, {'display': 'none'}]
-    
-    if active_tab == "acumulada":
-        styles[0] = {'display': 'block'}
-    elif active_tab == "anualizada":
-        styles[1] = {'display': 'block'}
-    elif active_tab == "por_ano":
-        styles[2] = {'display': 'block'}
-    
-    return styles
-
-# Callback para inicializar opciones de fondos
-@callback(
-    [Output('fondos-selector-acumulada', 'options'),
-     Output('fondos-selector-anualizada', 'options'),
-     Output('fondos-selector-por-año', 'options')],
-    [Input('tabs', 'active_tab')]
+     Output("content-por-año", "style"),
+     Output("content-riesgo", "style")],
+    [Input("tabs", "active_tab")],
+    prevent_initial_call=True
 )
-def inicializar_opciones_fondos(active_tab):
-    if fondos:
-        opciones = [{'label': fondo, 'value': fondo} for fondo in fondos]
-        return opciones, opciones, opciones
-    else:
-        return [], [], []
 
-# NUEVO CALLBACK PRINCIPAL: SINCRONIZACIÓN DE FONDOS ENTRE PESTAÑAS
-@callback(
+# Sincronización de fondos entre pestañas: la selección común vive en el store
+# 'fondos-seleccionados' y solo se copia al selector de la pestaña visible
+clientside_callback(
+    ClientsideFunction(namespace='panel', function_name='sincronizar_fondos'),
     [Output('fondos-selector-acumulada', 'value'),
      Output('fondos-selector-anualizada', 'value'),
-     Output('fondos-selector-por-año', 'value')],
+     Output('fondos-selector-por-año', 'value'),
+     Output('fondos-selector-riesgo', 'value'),
+     Output('fondos-seleccionados', 'data')],
     [Input('fondos-selector-acumulada', 'value'),
      Input('fondos-selector-anualizada', 'value'),
-     Input('fondos-selector-por-año', 'value')],
+     Input('fondos-selector-por-año', 'value'),
+     Input('fondos-selector-riesgo', 'value'),
+     Input('tabs', 'active_tab')],
+    [State('fondos-seleccionados', 'data')],
     prevent_initial_call=True
 )
-def sincronizar_fondos_entre_pestañas(fondos_acumulada, fondos_anualizada, fondos_por_año):
-    """
-    Sincroniza las selecciones de fondos entre todas las pestañas.
-    Cuando cambias fondos en cualquier pestaña, se actualizan automáticamente en las otras.
-    """
-    ctx = dash.callback_context
-    
-    if not ctx.triggered:
-        # Valores iniciales - primeros 5 fondos para acumulada y por año, 10 para anualizada
-        if fondos:
-            valores_acumulada = fondos[:5] if len(fondos) > 5 else fondos
-            valores_anualizada = fondos[:10] if len(fondos) > 10 else fondos
-            valores_por_año = fondos[:5] if len(fondos) > 5 else fondos
-            return valores_acumulada, valores_anualizada, valores_por_año
-        else:
-            return [], [], []
-    
-    # Determinar qué selector fue el que cambió
-    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    
-    if trigger_id == 'fondos-selector-acumulada':
-        # Si cambió acumulada, sincronizar con las otras dos
-        return fondos_acumulada, fondos_acumulada, fondos_acumulada
-    elif trigger_id == 'fondos-selector-anualizada':
-        # Si cambió anualizada, sincronizar con las otras dos
-        return fondos_anualizada, fondos_anualizada, fondos_anualizada
-    elif trigger_id == 'fondos-selector-por-año':
-        # Si cambió por año, sincronizar con las otras dos
-        return fondos_por_año, fondos_por_año, fondos_por_año
-    
-    # Fallback - mantener valores actuales
-    return fondos_acumulada, fondos_anualizada, fondos_por_año
 
-# Callback SOLO para inicializar fechas por defecto
-@callback(
-    [Output('fecha-inicio-grafico', 'date'),
-     Output('fecha-fin-grafico', 'date')],
-    [Input('tabs', 'active_tab')]
+# La fecha de corte sigue el mismo camino: solo se copia al store de la pestaña
+# visible, y las demás la reciben al mostrarse
+clientside_callback(
+    ClientsideFunction(namespace='panel', function_name='sincronizar_fecha_corte'),
+    [Output('fecha-corte-acumulada', 'data'),
+     Output('fecha-corte-anualizada', 'data'),
+     Output('fecha-corte-por-año', 'data'),
+     Output('fecha-corte-riesgo', 'data')],
+    [Input('fecha-corte', 'date'),
+     Input('tabs', 'active_tab')],
+    [State('fecha-corte-acumulada', 'data'),
+     State('fecha-corte-anualizada', 'data'),
+     State('fecha-corte-por-año', 'data'),
+     State('fecha-corte-riesgo', 'data')],
+    prevent_initial_call=True
 )
-def inicializar_fechas_grafico(active_tab):
-    if pesos_df is not None:
-        fecha_fin = pesos_df['Dates'].max()
-        fecha_inicio = fecha_fin - timedelta(days=365)
-        return fecha_inicio, fecha_fin
-    else:
-        fecha_fin = datetime.now()
-        fecha_inicio = fecha_fin - timedelta(days=365)
-        return fecha_inicio, fecha_fin
 
-# Callback para Rentabilidad Acumulada
-@callback(
-   Output('tabla-rentabilidades-acumulada', 'children'),
-   [Input('moneda-selector-acumulada', 'value'),
-    Input('fondos-selector-acumulada', 'value')]
-)
-def actualizar_tabla_acumulada(moneda, fondos_seleccionados):
-   if not fondos_seleccionados or pesos_df is None:
-       return html.P("Selecciona al menos un fondo", style={'fontFamily': 'SuraSans-Regular'})
+MENSAJE_CARGANDO = "Cargando datos, intenta nuevamente en unos segundos"
+
+def mensaje_sin_tabla(datos):
+   texto = MENSAJE_CARGANDO if datos is None else "Selecciona al menos un fondo"
+   return html.P(texto, style={'fontFamily': 'SuraSans-Regular'})
+
+# Paginación y orden en el servidor: el navegador recibe solo la página visible
+FILAS_POR_PAGINA = 15
+# Columnas de años que se envían a la vez en la tabla por año
+AÑOS_POR_VENTANA = 8
+
+def pagina_registros(registros, pagina, orden, columnas=None):
+   """Filas de la página `pagina` según el `sort_by` de la tabla; con `columnas`, solo esas claves."""
+   if orden:
+       columna = orden[0]['column_id']
+       con_valor = [r for r in registros if not pd.isna(r.get(columna))]
+       sin_valor = [r for r in registros if pd.isna(r.get(columna))]
+       # Los vacíos van al final en ambas direcciones
+       registros = sorted(con_valor, key=lambda r: r[columna], reverse=orden[0]['direction'] == 'desc') + sin_valor
    
-   df_actual = pesos_df if moneda == 'CLP' else dolares_df
+   inicio = (pagina or 0) * FILAS_POR_PAGINA
+   filas = registros[inicio:inicio + FILAS_POR_PAGINA]
+   if columnas is not None:
+       filas = [{col: r.get(col) for col in columnas} for r in filas]
+   return filas
+
+def opciones_paginacion(registros):
+   return {
+       'page_action': 'custom',
+       'page_current': 0,
+       'page_size': FILAS_POR_PAGINA,
+       'page_count': max(1, -(-len(registros) // FILAS_POR_PAGINA)),
+       'sort_action': 'custom',
+       'sort_mode': 'single',
+       'sort_by': [],
+   }
+
+def registros_tabla_acumulada(datos, moneda, fondos_seleccionados, fecha_corte=None):
+   fecha_corte = corte_efectivo(datos, moneda, fecha_corte)
    
-   fondos_filtrados = [f for f in fondos_seleccionados if f in fondos]
-   series_filtradas = [series[fondos.index(f)] for f in fondos_filtrados if f in fondos]
+   def construir():
+       tabla_data = motor_rentabilidades.seleccionar_fondos(
+           tabla_periodos(datos, moneda, fecha_corte), matriz_precios(datos, moneda), fondos_seleccionados
+       )
+       tabla_data['Moneda'] = moneda
+       
+       columnas_orden = ['Fondo', 'Serie', 'Moneda', 'TAC', '1 Mes', '3 Meses', 'YTD', '12 Meses', '3 Años', '5 Años', 'ITD']
+       return {'columnas': columnas_orden, 'registros': tabla_data[columnas_orden].to_dict('records')}
    
-   tabla_data = calcular_rentabilidades(df_actual, fondos_filtrados, series_filtradas)
-   tabla_data['Moneda'] = moneda
+   return tabla_memoizada(nombre_con_corte('tabla_acumulada', fecha_corte), datos, moneda, fondos_seleccionados,
+                          construir)
+
+# Tabla de Rentabilidad Acumulada para una instantánea de datos
+def componente_tabla_acumulada(datos, moneda, fondos_seleccionados, fecha_corte=None):
+   if not fondos_seleccionados or datos is None:
+       return mensaje_sin_tabla(datos)
    
-   columnas_orden = ['Fondo', 'Serie', 'Moneda', 'TAC', '1 Mes', '3 Meses', 'YTD', '12 Meses', '3 Años', '5 Años', 'ITD']
-   tabla_data = tabla_data[columnas_orden]
+   columnas, registros = registros_tabla_acumulada(datos, moneda, fondos_seleccionados, fecha_corte)
    
    return dash_table.DataTable(
-       data=tabla_data.to_dict('records'),
+       id='datatable-acumulada',
+       data=pagina_registros(registros, 0, None),
+       **opciones_paginacion(registros),
        columns=[{"name": col, "id": col, "type": "numeric", "format": {"specifier": ".2f"}} 
                if col not in ['Fondo', 'Serie', 'Moneda'] else {"name": col, "id": col} 
-               for col in tabla_data.columns],
+               for col in columnas],
        style_table={'overflowX': 'auto'},
        style_cell={
            'textAlign': 'center',
@@ -758,32 +962,63 @@ def actualizar_tabla_acumulada(moneda, fondos_seleccionados):
        ]
    )
 
-# Callback para Rentabilidad Anualizada
+# Callback para Rentabilidad Acumulada (la vista inicial ya viene en el layout)
 @callback(
-   Output('tabla-rentabilidades-anualizada', 'children'),
-   [Input('moneda-selector-anualizada', 'value'),
-    Input('fondos-selector-anualizada', 'value')]
+   Output('tabla-rentabilidades-acumulada', 'children'),
+   [Input('moneda-selector-acumulada', 'value'),
+    Input('fondos-selector-acumulada', 'value'),
+    Input('fecha-corte-acumulada', 'data')],
+   prevent_initial_call=True
 )
-def actualizar_tabla_anualizada(moneda, fondos_seleccionados):
-   if not fondos_seleccionados or pesos_df is None:
-       return html.P("Selecciona al menos un fondo", style={'fontFamily': 'SuraSans-Regular'})
-   
-   df_actual = pesos_df if moneda == 'CLP' else dolares_df
+def actualizar_tabla_acumulada(moneda, fondos_seleccionados, fecha_corte):
+   return componente_tabla_acumulada(almacen.actual(), moneda, fondos_seleccionados, leer_fecha_corte(fecha_corte))
+
+# Cambio de página u orden: se ordena el resultado memoizado y se envía una página
+@callback(
+   Output('datatable-acumulada', 'data'),
+   [Input('datatable-acumulada', 'page_current'),
+    Input('datatable-acumulada', 'sort_by')],
+   [State('moneda-selector-acumulada', 'value'),
+    State('fondos-selector-acumulada', 'value'),
+    State('fecha-corte-acumulada', 'data')],
+   prevent_initial_call=True
+)
+def paginar_tabla_acumulada(pagina, orden, moneda, fondos_seleccionados, fecha_corte):
+   datos = almacen.actual()
+   if datos is None or not fondos_seleccionados:
+       return dash.no_update
+   _, registros = registros_tabla_acumulada(datos, moneda, fondos_seleccionados, leer_fecha_corte(fecha_corte))
+   return pagina_registros(registros, pagina, orden)
+
+def registros_tabla_anualizada(datos, moneda, fondos_seleccionados, fecha_corte=None):
+   fecha_corte = corte_efectivo(datos, moneda, fecha_corte)
    
-   fondos_filtrados = [f for f in fondos_seleccionados if f in fondos]
-   series_filtradas = [series[fondos.index(f)] for f in fondos_filtrados if f in fondos]
+   def construir():
+       tabla_data = motor_rentabilidades.seleccionar_fondos(
+           tabla_anualizada(datos, moneda, fecha_corte), matriz_precios(datos, moneda), fondos_seleccionados
+       )
+       tabla_data['Moneda'] = moneda
+       
+       columnas_orden = ['Fondo', 'Serie', 'Moneda', '1 Año', '3 Años', '5 Años', 'ITD', 'Años Historial']
+       return {'columnas': columnas_orden, 'registros': tabla_data[columnas_orden].to_dict('records')}
    
-   tabla_data = calcular_rentabilidades_anualizadas(df_actual, fondos_filtrados, series_filtradas)
-   tabla_data['Moneda'] = moneda
+   return tabla_memoizada(nombre_con_corte('tabla_anualizada', fecha_corte), datos, moneda, fondos_seleccionados,
+                          construir)
+
+# Tabla de Rentabilidad Anualizada para una instantánea de datos
+def componente_tabla_anualizada(datos, moneda, fondos_seleccionados, fecha_corte=None):
+   if not fondos_seleccionados or datos is None:
+       return mensaje_sin_tabla(datos)
    
-   columnas_orden = ['Fondo', 'Serie', 'Moneda', '1 Año', '3 Años', '5 Años', 'ITD', 'Años Historial']
-   tabla_data = tabla_data[columnas_orden]
+   columnas, registros = registros_tabla_anualizada(datos, moneda, fondos_seleccionados, fecha_corte)
    
    return dash_table.DataTable(
-       data=tabla_data.to_dict('records'),
+       id='datatable-anualizada',
+       data=pagina_registros(registros, 0, None),
+       **opciones_paginacion(registros),
        columns=[{"name": col, "id": col, "type": "numeric", "format": {"specifier": ".2f"}} 
                if col not in ['Fondo', 'Serie', 'Moneda'] else {"name": col, "id": col} 
-               for col in tabla_data.columns],
+               for col in columnas],
        style_table={'overflowX': 'auto'},
        style_cell={
            'textAlign': 'center',
@@ -809,41 +1044,273 @@ def actualizar_tabla_anualizada(moneda, fondos_seleccionados):
        ]
    )
 
-# Callback para Rentabilidad por Año
+# Callback para Rentabilidad Anualizada (la vista inicial ya viene en el layout)
 @callback(
-   Output('tabla-rentabilidades-por-año', 'children'),
+   Output('tabla-rentabilidades-anualizada', 'children'),
+   [Input('moneda-selector-anualizada', 'value'),
+    Input('fondos-selector-anualizada', 'value'),
+    Input('fecha-corte-anualizada', 'data')],
+   prevent_initial_call=True
+)
+def actualizar_tabla_anualizada(moneda, fondos_seleccionados, fecha_corte):
+   return componente_tabla_anualizada(almacen.actual(), moneda, fondos_seleccionados, leer_fecha_corte(fecha_corte))
+
+@callback(
+   Output('datatable-anualizada', 'data'),
+   [Input('datatable-anualizada', 'page_current'),
+    Input('datatable-anualizada', 'sort_by')],
+   [State('moneda-selector-anualizada', 'value'),
+    State('fondos-selector-anualizada', 'value'),
+    State('fecha-corte-anualizada', 'data')],
+   prevent_initial_call=True
+)
+def paginar_tabla_anualizada(pagina, orden, moneda, fondos_seleccionados, fecha_corte):
+   datos = almacen.actual()
+   if datos is None or not fondos_seleccionados:
+       return dash.no_update
+   _, registros = registros_tabla_anualizada(datos, moneda, fondos_seleccionados, leer_fecha_corte(fecha_corte))
+   return pagina_registros(registros, pagina, orden)
+
+COLUMNAS_BASE_POR_AÑO = ['Fondo', 'Serie', 'Moneda']
+
+def registros_tabla_por_año(datos, moneda, fondos_seleccionados, fecha_corte=None):
+   fecha_corte = corte_efectivo(datos, moneda, fecha_corte)
+   
+   def construir():
+       tabla_data = motor_rentabilidades.seleccionar_fondos(
+           tabla_por_año(datos, moneda, fecha_corte), matriz_precios(datos, moneda), fondos_seleccionados
+       )
+       tabla_data['Moneda'] = moneda
+       
+       años_columnas = [col for col in tabla_data.columns if col not in COLUMNAS_BASE_POR_AÑO]
+       años_columnas.sort(reverse=True)
+       columnas_orden = COLUMNAS_BASE_POR_AÑO + años_columnas
+       return {'columnas': columnas_orden, 'registros': tabla_data[columnas_orden].to_dict('records')}
+   
+   return tabla_memoizada(nombre_con_corte('tabla_por_año', fecha_corte), datos, moneda, fondos_seleccionados,
+                          construir)
+
+def ventana_años(columnas, inicio):
+   """Años visibles (del más reciente al más antiguo) desde la posición `inicio`, ya acotada."""
+   años = [col for col in columnas if col not in COLUMNAS_BASE_POR_AÑO]
+   inicio = min(max(inicio or 0, 0), max(len(años) - AÑOS_POR_VENTANA, 0))
+   return años, años[inicio:inicio + AÑOS_POR_VENTANA], inicio
+
+# Tabla de Rentabilidad por Año para una instantánea de datos; solo se
+# envían las columnas de la ventana de años visible
+def componente_tabla_por_año(datos, moneda, fondos_seleccionados, inicio_años=0, fecha_corte=None):
+   if not fondos_seleccionados or datos is None:
+       return mensaje_sin_tabla(datos)
+   
+   columnas, registros = registros_tabla_por_año(datos, moneda, fondos_seleccionados, fecha_corte)
+   años, años_columnas, _ = ventana_años(columnas, inicio_años)
+   columnas = COLUMNAS_BASE_POR_AÑO + años_columnas
+   
+   rango = (f"Años {años_columnas[0]} a {años_columnas[-1]} (historial {años[-1]} a {años[0]})"
+            if años_columnas else "Sin años calendario con datos")
+   
+   return html.Div([
+       html.P(rango, style={'fontFamily': 'SuraSans-Regular', 'fontSize': '12px', 'color': '#666666'}),
+       dash_table.DataTable(
+           id='datatable-por-año',
+           data=pagina_registros(registros, 0, None, columnas),
+           **opciones_paginacion(registros),
+           columns=[{"name": col, "id": col, "type": "numeric", "format": {"specifier": ".2f"}} 
+                   if col not in ['Fondo', 'Serie', 'Moneda'] else {"name": col, "id": col} 
+                   for col in columnas],
+           style_table={'overflowX': 'auto'},
+           style_cell={
+               'textAlign': 'center',
+               'fontFamily': 'SuraSans-Regular',
+               'fontSize': '11px'
+           },
+           style_header={
+               'backgroundColor': '#000000',
+               'color': 'white',
+               'fontFamily': 'SuraSans-SemiBold',
+               'fontWeight': 'bold'
+           },
+           style_data_conditional=[
+               {
+                   'if': {'column_id': col, 'filter_query': f'{{{col}}} > 0'},
+                   'color': 'green'
+               } for col in años_columnas
+           ] + [
+               {
+                   'if': {'column_id': col, 'filter_query': f'{{{col}}} < 0'},
+                   'color': 'red'
+               } for col in años_columnas
+           ]
+       )
+   ])
+
+# Callback para Rentabilidad por Año (la vista inicial ya viene en el layout);
+# los botones de años mueven la ventana de columnas
+@callback(
+   [Output('tabla-rentabilidades-por-año', 'children'),
+    Output('ventana-años', 'data')],
    [Input('moneda-selector-por-año', 'value'),
-    Input('fondos-selector-por-año', 'value')]
+    Input('fondos-selector-por-año', 'value'),
+    Input('años-anteriores', 'n_clicks'),
+    Input('años-recientes', 'n_clicks'),
+    Input('fecha-corte-por-año', 'data')],
+   [State('ventana-años', 'data')],
+   prevent_initial_call=True
 )
-def actualizar_tabla_por_año(moneda, fondos_seleccionados):
-   if not fondos_seleccionados or pesos_df is None:
-       return html.P("Selecciona al menos un fondo", style={'fontFamily': 'SuraSans-Regular'})
+def actualizar_tabla_por_año(moneda, fondos_seleccionados, n_anteriores, n_recientes, fecha_corte, inicio_años):
+   datos = almacen.actual()
+   fecha_corte = leer_fecha_corte(fecha_corte)
+   inicio_años = inicio_años or 0
+   if dash.ctx.triggered_id == 'años-anteriores':
+       inicio_años += AÑOS_POR_VENTANA
+   elif dash.ctx.triggered_id == 'años-recientes':
+       inicio_años -= AÑOS_POR_VENTANA
    
-   df_actual = pesos_df if moneda == 'CLP' else dolares_df
+   if datos is not None and fondos_seleccionados:
+       columnas, _ = registros_tabla_por_año(datos, moneda, fondos_seleccionados, fecha_corte)
+       _, _, inicio_años = ventana_años(columnas, inicio_años)
+   return componente_tabla_por_año(datos, moneda, fondos_seleccionados, inicio_años, fecha_corte), inicio_años
+
+@callback(
+   Output('datatable-por-año', 'data'),
+   [Input('datatable-por-año', 'page_current'),
+    Input('datatable-por-año', 'sort_by')],
+   [State('moneda-selector-por-año', 'value'),
+    State('fondos-selector-por-año', 'value'),
+    State('ventana-años', 'data'),
+    State('fecha-corte-por-año', 'data')],
+   prevent_initial_call=True
+)
+def paginar_tabla_por_año(pagina, orden, moneda, fondos_seleccionados, inicio_años, fecha_corte):
+   datos = almacen.actual()
+   if datos is None or not fondos_seleccionados:
+       return dash.no_update
+   columnas, registros = registros_tabla_por_año(datos, moneda, fondos_seleccionados, leer_fecha_corte(fecha_corte))
+   _, años_columnas, _ = ventana_años(columnas, inicio_años)
+   return pagina_registros(registros, pagina, orden, COLUMNAS_BASE_POR_AÑO + años_columnas)
+
+COLUMNAS_RIESGO = ['Volatilidad', 'Sharpe', 'Sortino', 'Máx. Drawdown', 'Fecha Máx. Drawdown', 'Recuperación (días)']
+
+def registros_tabla_riesgo(datos, moneda, ventana, fondos_seleccionados, fecha_corte=None):
+   fecha_corte = corte_efectivo(datos, moneda, fecha_corte)
+   
+   def construir():
+       tabla_data = motor_rentabilidades.seleccionar_fondos(
+           tablas_riesgo(datos, moneda, fecha_corte)[ventana], matriz_precios(datos, moneda), fondos_seleccionados
+       )
+       tabla_data['Moneda'] = moneda
+       
+       columnas_orden = ['Fondo', 'Serie', 'Moneda'] + COLUMNAS_RIESGO
+       return {'columnas': columnas_orden, 'registros': tabla_data[columnas_orden].to_dict('records')}
    
-   fondos_filtrados = [f for f in fondos_seleccionados if f in fondos]
-   series_filtradas = [series[fondos.index(f)] for f in fondos_filtrados if f in fondos]
+   return tabla_memoizada(nombre_con_corte(f'tabla_riesgo:{ventana}', fecha_corte), datos, moneda,
+                          fondos_seleccionados, construir)
+
+# Tabla de Riesgo de una ventana para una instantánea de datos
+def componente_tabla_riesgo(datos, moneda, ventana, fondos_seleccionados, fecha_corte=None):
+   if not fondos_seleccionados or datos is None:
+       return mensaje_sin_tabla(datos)
+   
+   columnas, registros = registros_tabla_riesgo(datos, moneda, ventana, fondos_seleccionados, fecha_corte)
+   formatos = {'Fecha Máx. Drawdown': None, 'Recuperación (días)': '.0f'}
+   
+   return dash_table.DataTable(
+       id='datatable-riesgo',
+       data=pagina_registros(registros, 0, None),
+       **opciones_paginacion(registros),
+       columns=[{"name": col, "id": col} if col in ['Fondo', 'Serie', 'Moneda', 'Fecha Máx. Drawdown']
+               else {"name": col, "id": col, "type": "numeric", "format": {"specifier": formatos.get(col, '.2f')}}
+               for col in columnas],
+       style_table={'overflowX': 'auto'},
+       style_cell={
+           'textAlign': 'center',
+           'fontFamily': 'SuraSans-Regular',
+           'fontSize': '12px'
+       },
+       style_header={
+           'backgroundColor': '#000000',
+           'color': 'white',
+           'fontFamily': 'SuraSans-SemiBold',
+           'fontWeight': 'bold'
+       },
+       style_data_conditional=[
+           {
+               'if': {'column_id': col, 'filter_query': f'{{{col}}} > 0'},
+               'color': 'green'
+           } for col in ['Sharpe', 'Sortino']
+       ] + [
+           {
+               'if': {'column_id': col, 'filter_query': f'{{{col}}} < 0'},
+               'color': 'red'
+           } for col in ['Sharpe', 'Sortino', 'Máx. Drawdown']
+       ]
+   )
+
+# Callback para Riesgo (la vista inicial ya viene en el layout)
+@callback(
+   Output('tabla-rentabilidades-riesgo', 'children'),
+   [Input('moneda-selector-riesgo', 'value'),
+    Input('ventana-selector-riesgo', 'value'),
+    Input('fondos-selector-riesgo', 'value'),
+    Input('fecha-corte-riesgo', 'data')],
+   prevent_initial_call=True
+)
+def actualizar_tabla_riesgo(moneda, ventana, fondos_seleccionados, fecha_corte):
+   return componente_tabla_riesgo(almacen.actual(), moneda, ventana, fondos_seleccionados,
+                                  leer_fecha_corte(fecha_corte))
+
+@callback(
+   Output('datatable-riesgo', 'data'),
+   [Input('datatable-riesgo', 'page_current'),
+    Input('datatable-riesgo', 'sort_by')],
+   [State('moneda-selector-riesgo', 'value'),
+    State('ventana-selector-riesgo', 'value'),
+    State('fondos-selector-riesgo', 'value'),
+    State('fecha-corte-riesgo', 'data')],
+   prevent_initial_call=True
+)
+def paginar_tabla_riesgo(pagina, orden, moneda, ventana, fondos_seleccionados, fecha_corte):
+   datos = almacen.actual()
+   if datos is None or not fondos_seleccionados:
+       return dash.no_update
+   _, registros = registros_tabla_riesgo(datos, moneda, ventana, fondos_seleccionados, leer_fecha_corte(fecha_corte))
+   return pagina_registros(registros, pagina, orden)
+
+COLUMNAS_RANGO = ['Fondo', 'Serie', 'Moneda', 'Desde', 'Hasta', 'Rentabilidad', 'Anualizada']
+
+def registros_tabla_rango(datos, moneda, fondos_seleccionados, fecha_inicio, fecha_fin):
+   desde, hasta = pd.to_datetime(fecha_inicio).normalize(), pd.to_datetime(fecha_fin).normalize()
    
-   tabla_data = calcular_rentabilidades_por_año(df_actual, fondos_filtrados, series_filtradas)
-   tabla_data['Moneda'] = moneda
+   def construir():
+       matriz = matriz_precios(datos, moneda)
+       tabla_data = motor_rentabilidades.seleccionar_fondos(
+           motor_rentabilidades.calcular_tabla_rango(matriz, datos.series, desde, hasta), matriz, fondos_seleccionados
+       )
+       tabla_data['Moneda'] = moneda
+       return {'columnas': COLUMNAS_RANGO, 'registros': tabla_data[COLUMNAS_RANGO].to_dict('records')}
    
-   columnas_base = ['Fondo', 'Serie', 'Moneda']
-   años_columnas = [col for col in tabla_data.columns if col not in columnas_base]
-   años_columnas.sort(reverse=True)
-   columnas_orden = columnas_base + años_columnas
+   return tabla_memoizada(f'tabla_rango:{desde:%Y-%m-%d}:{hasta:%Y-%m-%d}', datos, moneda, fondos_seleccionados,
+                          construir)
+
+# Rentabilidad de cada fondo en el rango exacto del gráfico
+def componente_tabla_rango(datos, moneda, fondos_seleccionados, fecha_inicio, fecha_fin):
+   if not fondos_seleccionados or datos is None or not fecha_inicio or not fecha_fin:
+       return None
    
-   tabla_data = tabla_data[columnas_orden]
+   columnas, registros = registros_tabla_rango(datos, moneda, fondos_seleccionados, fecha_inicio, fecha_fin)
    
    return dash_table.DataTable(
-       data=tabla_data.to_dict('records'),
+       id='datatable-rango',
+       data=pagina_registros(registros, 0, None),
+       **opciones_paginacion(registros),
        columns=[{"name": col, "id": col, "type": "numeric", "format": {"specifier": ".2f"}} 
-               if col not in ['Fondo', 'Serie', 'Moneda'] else {"name": col, "id": col} 
-               for col in tabla_data.columns],
+               if col in ['Rentabilidad', 'Anualizada'] else {"name": col, "id": col} 
+               for col in columnas],
        style_table={'overflowX': 'auto'},
        style_cell={
            'textAlign': 'center',
            'fontFamily': 'SuraSans-Regular',
-           'fontSize': '11px'
+           'fontSize': '12px'
        },
        style_header={
            'backgroundColor': '#000000',
@@ -855,19 +1322,47 @@ def actualizar_tabla_por_año(moneda, fondos_seleccionados):
            {
                'if': {'column_id': col, 'filter_query': f'{{{col}}} > 0'},
                'color': 'green'
-           } for col in años_columnas
+           } for col in ['Rentabilidad', 'Anualizada']
        ] + [
            {
                'if': {'column_id': col, 'filter_query': f'{{{col}}} < 0'},
                'color': 'red'
-           } for col in años_columnas
+           } for col in ['Rentabilidad', 'Anualizada']
        ]
    )
 
+@callback(
+   Output('tabla-rango-grafico', 'children'),
+   [Input('moneda-selector-acumulada', 'value'),
+    Input('fondos-selector-acumulada', 'value'),
+    Input('fecha-inicio-grafico', 'date'),
+    Input('fecha-fin-grafico', 'date')],
+   prevent_initial_call=True
+)
+def actualizar_tabla_rango(moneda, fondos_seleccionados, fecha_inicio, fecha_fin):
+   return componente_tabla_rango(almacen.actual(), moneda, fondos_seleccionados, fecha_inicio, fecha_fin)
+
+@callback(
+   Output('datatable-rango', 'data'),
+   [Input('datatable-rango', 'page_current'),
+    Input('datatable-rango', 'sort_by')],
+   [State('moneda-selector-acumulada', 'value'),
+    State('fondos-selector-acumulada', 'value'),
+    State('fecha-inicio-grafico', 'date'),
+    State('fecha-fin-grafico', 'date')],
+   prevent_initial_call=True
+)
+def paginar_tabla_rango(pagina, orden, moneda, fondos_seleccionados, fecha_inicio, fecha_fin):
+   datos = almacen.actual()
+   if datos is None or not fondos_seleccionados or not fecha_inicio or not fecha_fin:
+       return dash.no_update
+   _, registros = registros_tabla_rango(datos, moneda, fondos_seleccionados, fecha_inicio, fecha_fin)
+   return pagina_registros(registros, pagina, orden)
+
 # Callback para botones de período
 @callback(
-    [Output('fecha-inicio-grafico', 'date', allow_duplicate=True),
-     Output('fecha-fin-grafico', 'date', allow_duplicate=True)],
+    [Output('fecha-inicio-grafico', 'date'),
+     Output('fecha-fin-grafico', 'date')],
     [Input('btn-1m', 'n_clicks'),
      Input('btn-3m', 'n_clicks'),
      Input('btn-6m', 'n_clicks'),
@@ -880,11 +1375,12 @@ def actualizar_tabla_por_año(moneda, fondos_seleccionados):
 )
 def actualizar_fechas_grafico(btn1m, btn3m, btn6m, btnytd, btn1y, btn3y, btn5y, btnmax):
     ctx = dash.callback_context
-    if not ctx.triggered or pesos_df is None:
+    datos = almacen.actual()
+    if not ctx.triggered or datos is None:
         return dash.no_update, dash.no_update
     
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    fecha_fin = pesos_df['Dates'].max()
+    fecha_fin = datos.pesos_df['Dates'].max()
     
     if button_id == 'btn-1m':
         fecha_inicio = fecha_fin - timedelta(days=30)
@@ -901,25 +1397,98 @@ def actualizar_fechas_grafico(btn1m, btn3m, btn6m, btnytd, btn1y, btn3y, btn5y,
     elif button_id == 'btn-5y':
         fecha_inicio = fecha_fin - timedelta(days=1825)
     elif button_id == 'btn-max':
-        fecha_inicio = pesos_df['Dates'].min()
+        fecha_inicio = datos.pesos_df['Dates'].min()
     else:
         return dash.no_update, dash.no_update
     
     return fecha_inicio, fecha_fin
 
+# Ancho en píxeles del gráfico, para el presupuesto de puntos del submuestreo
+clientside_callback(
+    ClientsideFunction(namespace='panel', function_name='ancho_grafico'),
+    Output('ancho-grafico', 'data'),
+    Input('tabs', 'active_tab')
+)
+
+# Solo los cambios del eje x llegan al servidor (autosize y similares se descartan en el navegador)
+clientside_callback(
+    ClientsideFunction(namespace='panel', function_name='zoom_grafico'),
+    Output('zoom-grafico', 'data'),
+    Input('grafico-retornos-acumulados', 'relayoutData'),
+    prevent_initial_call=True
+)
+
+def parche_grafico(previo, estado, series, colores, colores_previos):
+    """
+    dash.Patch que lleva la figura de `previo` a `estado`, o None si hace falta la figura completa.
+
+    Quita las trazas de fondos deseleccionados, agrega al final las nuevas,
+    reemplaza solo x/y cuando cambió el rango o la ventana y ajusta colores
+    y tipo de traza (Scatter/Scattergl).
+    """
+    trazas_previas = previo['trazas']
+    retenidas = [fondo for fondo in trazas_previas if fondo in estado['trazas']]
+    if estado['trazas'][:len(retenidas)] != retenidas:
+        return None
+    
+    series = {fondo: (x, y) for fondo, x, y in series}
+    mismos_datos = previo['datos'] == estado['datos']
+    patch = dash.Patch()
+    for i in reversed(range(len(trazas_previas))):
+        if trazas_previas[i] not in estado['trazas']:
+            del patch['data'][i]
+    for i, fondo in enumerate(retenidas):
+        if not mismos_datos:
+            x, y = series[fondo]
+            patch['data'][i]['x'] = x
+            patch['data'][i]['y'] = y
+        if colores[fondo] != colores_previos.get(fondo):
+            patch['data'][i]['line']['color'] = colores[fondo]
+        if previo['webgl'] != estado['webgl']:
+            patch['data'][i]['type'] = 'scattergl' if estado['webgl'] else 'scatter'
+    for fondo in estado['trazas'][len(retenidas):]:
+        x, y = series[fondo]
+        patch['data'].append(traza_retornos(fondo, x, y, colores[fondo], estado['webgl']).to_plotly_json())
+    if previo['uirevision'] != estado['uirevision']:
+        patch['layout']['uirevision'] = estado['uirevision']
+    return patch
+
 # Callback para actualizar gráfico
 @callback(
-    Output('grafico-retornos-acumulados', 'figure'),
+    [Output('grafico-retornos-acumulados', 'figure'),
+     Output('estado-grafico', 'data')],
     [Input('moneda-selector-acumulada', 'value'),
      Input('fondos-selector-acumulada', 'value'),
      Input('fecha-inicio-grafico', 'date'),
-     Input('fecha-fin-grafico', 'date')]
+     Input('fecha-fin-grafico', 'date'),
+     Input('zoom-grafico', 'data'),
+     Input('modo-grafico', 'value')],
+    [State('ancho-grafico', 'data'),
+     State('estado-grafico', 'data')],
+    prevent_initial_call=True
 )
-def actualizar_grafico_retornos(moneda, fondos_seleccionados, fecha_inicio, fecha_fin):
-    if not fondos_seleccionados or pesos_df is None:
+def actualizar_grafico_retornos(moneda, fondos_seleccionados, fecha_inicio, fecha_fin, relayout_data,
+                                modo, ancho_grafico, estado_previo=None):
+    trigger_id = dash.callback_context.triggered_id
+    es_zoom, ventana = ventana_zoom(relayout_data)
+    if trigger_id == 'zoom-grafico':
+        # Solo el zoom del eje x pide una nueva resolución
+        if not es_zoom or not SUBMUESTREO_GRAFICO:
+            return dash.no_update, dash.no_update
+    elif trigger_id in ('fecha-inicio-grafico', 'fecha-fin-grafico', 'modo-grafico'):
+        # Cambia el rango o el modo del gráfico: el zoom anterior deja de aplicar
+        ventana = None
+    
+    return grafico_retornos(almacen.actual(), moneda, fondos_seleccionados, fecha_inicio, fecha_fin,
+                            ventana, ancho_grafico, estado_previo, modo or 'acumulado')
+
+def grafico_retornos(datos, moneda, fondos_seleccionados, fecha_inicio, fecha_fin,
+                     ventana=None, ancho_grafico=None, estado_previo=None, modo='acumulado'):
+    """Figura (o dash.Patch sobre la anterior) y estado del gráfico de retornos (acumulados o móviles)."""
+    if not fondos_seleccionados or datos is None:
         fig_vacio = go.Figure()
         fig_vacio.add_annotation(
-            text="Selecciona al menos un fondo para ver el gráfico",
+            text=MENSAJE_CARGANDO if datos is None else "Selecciona al menos un fondo para ver el gráfico",
             x=0.5, 
             y=0.5, 
             showarrow=False,
@@ -947,106 +1516,194 @@ def actualizar_grafico_retornos(moneda, fondos_seleccionados, fecha_inicio, fech
             margin=dict(t=20, b=20, l=20, r=20),
             height=500
         )
-        return fig_vacio
+        return fig_vacio, None
     
-    df_actual = pesos_df if moneda == 'CLP' else dolares_df
+    presupuesto = presupuesto_puntos(ancho_grafico)
+    estado = {
+        'version': datos.version,
+        'moneda': moneda,
+        'modo': modo,
+        'fondos': fondos_seleccionados,
+        'datos': [fecha_inicio, fecha_fin, [str(f) for f in ventana] if ventana else None, presupuesto],
+        # Conserva el zoom del usuario al redibujar con otra resolución
+        'uirevision': f'{moneda}|{modo}|{fecha_inicio}|{fecha_fin}',
+    }
     
-    df_retornos = calcular_retornos_acumulados(
-        df_actual, fondos_seleccionados, 
-        pd.to_datetime(fecha_inicio), pd.to_datetime(fecha_fin)
+    # Otro modo cambia títulos y ejes: figura completa
+    incremental = (
+        estado_previo is not None and estado_previo.get('trazas')
+        and estado_previo['version'] == estado['version'] and estado_previo['moneda'] == moneda
+        and estado_previo.get('modo', 'acumulado') == modo
     )
+    # Con el mismo rango y resolución solo se calculan los fondos recién agregados
+    if incremental and estado_previo['datos'] == estado['datos']:
+        fondos_a_calcular = [f for f in fondos_seleccionados if f not in estado_previo['trazas']]
+    else:
+        fondos_a_calcular = fondos_seleccionados
+    
+    df_retornos = retornos_grafico(datos, moneda, fondos_a_calcular, fecha_inicio, fecha_fin, modo)
+    series = series_retornos(df_retornos, fondos_a_calcular, presupuesto, ventana)
+    
+    if fondos_a_calcular is fondos_seleccionados:
+        puntos = {fondo: len(x) for fondo, x, _ in series}
+    else:
+        puntos = {f: n for f, n in estado_previo['puntos'].items() if f in fondos_seleccionados}
+        puntos.update({fondo: len(x) for fondo, x, _ in series})
+    estado['puntos'] = puntos
+    estado['trazas'] = [f for f in fondos_seleccionados if f in puntos]
+    estado['webgl'] = sum(puntos.values()) > UMBRAL_WEBGL
+    
+    if incremental and estado['trazas']:
+        patch = parche_grafico(estado_previo, estado, series, colores_fondos(fondos_seleccionados),
+                               colores_fondos(estado_previo['fondos']))
+        if patch is not None:
+            return patch, estado
     
-    return crear_grafico_retornos(df_retornos, fondos_seleccionados)
+    if fondos_a_calcular is not fondos_seleccionados:
+        df_retornos = retornos_grafico(datos, moneda, fondos_seleccionados, fecha_inicio, fecha_fin, modo)
+        series = None
+    fig = crear_grafico_retornos(df_retornos, fondos_seleccionados, presupuesto, ventana, series, modo)
+    fig.update_layout(uirevision=estado['uirevision'])
+    return fig, (estado if estado['trazas'] else None)
 
 # Callback para abrir/cerrar modal de gráfico
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace='panel', function_name='alternar_modal_grafico'),
     Output("modal-grafico", "is_open"),
     [Input("btn-pantalla-completa", "n_clicks")],
     [State("modal-grafico", "is_open")],
     prevent_initial_call=True
 )
-def toggle_modal_grafico(btn_open, is_open):
-    if btn_open:
-        return not is_open
-    return is_open
 
-# Callback para sincronizar gráfico del modal
-@callback(
+# Callback para sincronizar gráfico del modal: la figura se deriva en el navegador
+clientside_callback(
+    ClientsideFunction(namespace='panel', function_name='sincronizar_grafico_modal'),
     Output('grafico-retornos-modal', 'figure'),
-    [Input('grafico-retornos-acumulados', 'figure')],
+    [Input('grafico-retornos-acumulados', 'figure'),
+     Input('modal-grafico', 'is_open')],
+    prevent_initial_call=True
+)
+
+clientside_callback(
+    ClientsideFunction(namespace='panel', function_name='titulo_grafico'),
+    Output('titulo-grafico', 'children'),
+    Input('modo-grafico', 'value'),
+    State('titulos-grafico', 'data'),
     prevent_initial_call=True
 )
-def sincronizar_grafico_modal(figure):
-    if figure and 'data' in figure and len(figure['data']) > 0:
-        figure_modal = figure.copy()
+
+# Vista inicial por defecto: CLP, primeros 5 fondos y gráfico del último año
+FONDOS_VISTA_INICIAL = 5
+
+def vista_inicial(datos):
+    """
+    Layout con la vista por defecto ya calculada, uno por versión de datos.
+
+    Trae las opciones de fondos, las fechas, las tablas y el gráfico listos en
+    la primera respuesta, así la carga de la página no dispara callbacks.
+    """
+    def construir():
+        moneda = 'CLP'
+        fondos = datos.fondos[:FONDOS_VISTA_INICIAL]
+        opciones = [{'label': fondo, 'value': fondo} for fondo in datos.fondos]
+        fecha_fin = datos.pesos_df['Dates'].max()
+        fecha_inicio = fecha_fin - timedelta(days=365)
+        # Mismo formato con el que el navegador devuelve las fechas a los callbacks
+        fecha_inicio, fecha_fin = fecha_inicio.isoformat(), fecha_fin.isoformat()
         
-        figure_modal['layout'].update({
-            'height': 750,
-            'margin': dict(t=100, b=80, l=20, r=20),
-            'title': {
-                'text': 'Retornos Acumulados - Vista Completa',
-                'x': 0.5,
-                'y': 0.95,
-                'font': {'family': 'SuraSans-SemiBold', 'size': 26, 'color': '#24272A'}
-            },
-            'legend': {
-                'orientation': 'h',
-                'x': 0.5,
-                'y': -0.15,
-                'xanchor': 'center',
-                'yanchor': 'top',
-                'font': {'family': 'SuraSans-Regular', 'size': 14},
-                'bgcolor': 'rgba(255,255,255,0.9)',
-                'bordercolor': 'rgba(0,0,0,0.1)',
-                'borderwidth': 1
-            },
-            'xaxis': {
-                'title': {'text': 'Fecha', 'font': {'size': 18}},
-                'tickfont': {'size': 14}
-            },
-            'yaxis': {
-                'title': {'text': 'Retorno Acumulado (%)', 'font': {'size': 18}},
-                'tickfont': {'size': 14}
-            },
-            'plot_bgcolor': 'white',
-            'paper_bgcolor': 'white'
-        })
+        layout = copy.deepcopy(layout_base)
+        for sufijo in ('acumulada', 'anualizada', 'por-año', 'riesgo'):
+            layout[f'fondos-selector-{sufijo}'].options = opciones
+            layout[f'fondos-selector-{sufijo}'].value = fondos
+        layout['fondos-seleccionados'].data = fondos
+        layout['fecha-inicio-grafico'].date = fecha_inicio
+        layout['fecha-fin-grafico'].date = fecha_fin
+        layout['fecha-corte'].min_date_allowed = datos.pesos_df['Dates'].min().isoformat()
+        layout['fecha-corte'].max_date_allowed = fecha_fin
         
-        return figure_modal
-    
-    # Si no hay datos, mostrar mensaje con fondo gris limpio
-    fig_vacio = go.Figure()
-    fig_vacio.add_annotation(
-        text="Selecciona fondos para ver el gráfico",
-        x=0.5, 
-        y=0.5, 
-        showarrow=False,
-        font={'family': 'SuraSans-Regular', 'size': 20, 'color': '#666666'},
-        xanchor='center',   
-        yanchor='middle',
-        xref='paper',  # ← AGREGAR ESTA LÍNEA
-        yref='paper',  # ← AGREGAR ESTA LÍNEA
-    )
-    fig_vacio.update_layout(
-        plot_bgcolor='#f8f9fa',
-        paper_bgcolor='#f8f9fa',
-        xaxis=dict(
-            showgrid=False,
-            showticklabels=False,
-            zeroline=False,
-            visible=False
-        ),
-        yaxis=dict(
-            showgrid=False,
-            showticklabels=False,
-            zeroline=False,
-            visible=False
-        ),
-        margin=dict(t=20, b=20, l=20, r=20),
-        height=750
-    )
-    return fig_vacio
+        layout['tabla-rentabilidades-acumulada'].children = componente_tabla_acumulada(datos, moneda, fondos)
+        layout['tabla-rentabilidades-anualizada'].children = componente_tabla_anualizada(datos, moneda, fondos)
+        layout['tabla-rentabilidades-por-año'].children = componente_tabla_por_año(datos, moneda, fondos)
+        layout['tabla-rentabilidades-riesgo'].children = componente_tabla_riesgo(
+            datos, moneda, layout['ventana-selector-riesgo'].value, fondos)
+        layout['tabla-rango-grafico'].children = componente_tabla_rango(datos, moneda, fondos, fecha_inicio, fecha_fin)
+        
+        figura, estado = grafico_retornos(datos, moneda, fondos, fecha_inicio, fecha_fin)
+        layout['grafico-retornos-acumulados'].figure = figura
+        layout['estado-grafico'].data = estado
+        return layout
     
+    return datos.derivado(('vista_inicial',), construir)
+
+def layout_cargando():
+    """Layout sin datos que avisa y consulta cada 2 s si ya terminó la carga."""
+    layout = copy.deepcopy(layout_base)
+    layout['aviso-cargando-datos'].style = {'display': 'block', 'padding': '15px 30px 0', 'color': '#666666'}
+    layout['espera-datos'].disabled = False
+    return layout
+
+@callback(
+    Output('datos-listos', 'data'),
+    Input('espera-datos', 'n_intervals'),
+    prevent_initial_call=True
+)
+def consultar_datos_listos(n_intervals):
+    datos = almacen.actual()
+    return datos.version if datos is not None else dash.no_update
+
+# Cuando los datos quedan listos el navegador recarga la página y recibe la vista inicial
+clientside_callback(
+    ClientsideFunction(namespace='panel', function_name='recargar_con_datos'),
+    Output('espera-datos', 'disabled'),
+    Input('datos-listos', 'data'),
+    prevent_initial_call=True
+)
+
+def servir_layout():
+    datos = almacen.actual()
+    if datos is None:
+        return layout_cargando() if almacen.cargando else layout_base
+    if not datos.fondos:
+        return layout_base
+    return vista_inicial(datos)
+
+# Las tablas se crean en callbacks; el layout de validación las declara para
+# que Dash acepte sus callbacks de paginación aunque no estén en layout_base
+app.validation_layout = html.Div([layout_base] + [
+    dash_table.DataTable(id=f'datatable-{sufijo}') for sufijo in ('acumulada', 'anualizada', 'por-año', 'riesgo', 'rango')
+])
+app.layout = servir_layout
+
+# Vida y disponibilidad para los health checks de la plataforma
+@server.route('/healthz')
+def healthz():
+    return {'estado': 'vivo'}
+
+@server.route('/readyz')
+def readyz():
+    datos = almacen.actual()
+    if datos is None:
+        return {'estado': 'cargando' if almacen.cargando else 'sin_datos'}, 503
+    return {'estado': 'listo', 'version': datos.version, 'fases_arranque': FASES_ARRANQUE}
+
+def reportar_arranque():
+    datos = almacen.actual()
+    if datos is not None:
+        FASES_ARRANQUE.update({f'datos.{fase}': segundos for fase, segundos in datos.fases.items()})
+    FASES_ARRANQUE['total_hasta_listo'] = time.perf_counter() - INICIO_ARRANQUE
+    for fase, segundos in FASES_ARRANQUE.items():
+        FASES_ARRANQUE[fase] = round(segundos, 3)
+    print("Arranque: " + ", ".join(f"{fase} {segundos:.2f} s" for fase, segundos in FASES_ARRANQUE.items()))
+
+# Carga inicial: con CARGA_EN_SEGUNDO_PLANO=1 el worker atiende /healthz (y la página
+# "cargando datos") de inmediato mientras un hilo lee el libro
+FASES_ARRANQUE = {'importacion': time.perf_counter() - INICIO_ARRANQUE}
+if os.environ.get('CARGA_EN_SEGUNDO_PLANO') == '1':
+    almacen.cargar_en_segundo_plano(al_terminar=reportar_arranque)
+else:
+    almacen.recargar()
+    reportar_arranque()
+
 if __name__ == '__main__':
     import os
     port = int(os.environ.get('PORT', 8050))
@@ -0,0 +1,173 @@
+// Callbacks que corren en el navegador: solo mueven valores y estilos,
+// no necesitan datos del servidor ni ocupar un worker.
+var PESTAÑAS = ['acumulada', 'anualizada', 'por_ano', 'riesgo'];
+var SELECTORES_FONDOS = ['fondos-selector-acumulada', 'fondos-selector-anualizada',
+                         'fondos-selector-por-año', 'fondos-selector-riesgo'];
+
+// El título de la figura o de un eje puede venir como texto o como {text: ...}
+function texto_titulo(titulo) {
+    return titulo && typeof titulo === 'object' ? titulo.text : titulo;
+}
+
+function eje_modal(eje) {
+    eje = eje || {};
+    return Object.assign({}, eje, {
+        title: {text: texto_titulo(eje.title), font: {size: 18}},
+        tickfont: {size: 14}
+    });
+}
+
+function mismos_fondos(a, b) {
+    a = a || [];
+    b = b || [];
+    return a.length === b.length && a.every(function(fondo, i) { return fondo === b[i]; });
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    panel: {
+        mostrar_pestaña: function(active_tab) {
+            return PESTAÑAS.map(function(pestaña) {
+                return {display: pestaña === active_tab ? 'block' : 'none'};
+            });
+        },
+
+        // La selección común vive en el store; solo se escribe en el selector de la
+        // pestaña visible, así un cambio de fondos dispara un único cálculo por salida visible
+        sincronizar_fondos: function(fondos_acumulada, fondos_anualizada, fondos_por_año, fondos_riesgo,
+                                     active_tab, seleccion) {
+            var valores = {acumulada: fondos_acumulada, anualizada: fondos_anualizada, por_ano: fondos_por_año,
+                           riesgo: fondos_riesgo};
+            var disparador = dash_clientside.callback_context.triggered[0].prop_id.split('.')[0];
+            if (disparador !== 'tabs') {
+                seleccion = valores[PESTAÑAS[SELECTORES_FONDOS.indexOf(disparador)]];
+            }
+            seleccion = seleccion || [];
+            var salidas = PESTAÑAS.map(function(pestaña) {
+                if (pestaña === active_tab && !mismos_fondos(valores[pestaña], seleccion)) {
+                    return seleccion;
+                }
+                return dash_clientside.no_update;
+            });
+            return salidas.concat([seleccion]);
+        },
+
+        // Igual para la fecha de corte: solo el store de la pestaña visible recibe la fecha
+        // nueva, así un cambio de corte dispara un único cálculo; las demás la toman al mostrarse
+        sincronizar_fecha_corte: function(fecha, active_tab, corte_acumulada, corte_anualizada, corte_por_año,
+                                          corte_riesgo) {
+            var cortes = {acumulada: corte_acumulada, anualizada: corte_anualizada, por_ano: corte_por_año,
+                          riesgo: corte_riesgo};
+            fecha = fecha || null;
+            return PESTAÑAS.map(function(pestaña) {
+                if (pestaña === active_tab && (cortes[pestaña] || null) !== fecha) {
+                    return fecha;
+                }
+                return dash_clientside.no_update;
+            });
+        },
+
+        // Ancho en píxeles del gráfico, para el presupuesto de puntos del submuestreo
+        ancho_grafico: function(active_tab) {
+            var grafico = document.getElementById('grafico-retornos-acumulados');
+            return grafico && grafico.offsetWidth ? grafico.offsetWidth : null;
+        },
+
+        // Solo deja pasar los cambios del eje x (zoom o vuelta al rango completo)
+        zoom_grafico: function(relayout) {
+            if (relayout && ('xaxis.range[0]' in relayout || 'xaxis.range' in relayout ||
+                             'xaxis.autorange' in relayout)) {
+                return relayout;
+            }
+            return dash_clientside.no_update;
+        },
+
+        // Los datos terminaron de cargar: recargar trae la vista inicial completa
+        recargar_con_datos: function(version) {
+            if (version) {
+                window.location.reload();
+                return true;
+            }
+            return dash_clientside.no_update;
+        },
+
+        alternar_modal: function(n1, n2, is_open) {
+            if (n1 || n2) {
+                return !is_open;
+            }
+            return is_open;
+        },
+
+        alternar_modal_grafico: function(btn_open, is_open) {
+            if (btn_open) {
+                return !is_open;
+            }
+            return is_open;
+        },
+
+        titulo_grafico: function(modo, titulos) {
+            if (!titulos || !titulos[modo]) {
+                return window.dash_clientside.no_update;
+            }
+            return 'Gráfico de ' + titulos[modo] + ':';
+        },
+
+        // La figura del modal se deriva de la que ya está cargada en el navegador; títulos
+        // y ejes vienen del servidor (cambian con el modo), aquí solo se agrandan
+        sincronizar_grafico_modal: function(figure, is_open) {
+            if (figure && figure.data && figure.data.length > 0) {
+                var titulo = texto_titulo((figure.layout || {}).title);
+                var layout = Object.assign({}, figure.layout, {
+                    height: 750,
+                    margin: {t: 100, b: 80, l: 20, r: 20},
+                    title: {
+                        text: titulo ? titulo + ' - Vista Completa' : 'Vista Completa',
+                        x: 0.5,
+                        y: 0.95,
+                        font: {family: 'SuraSans-SemiBold', size: 26, color: '#24272A'}
+                    },
+                    legend: {
+                        orientation: 'h',
+                        x: 0.5,
+                        y: -0.15,
+                        xanchor: 'center',
+                        yanchor: 'top',
+                        font: {family: 'SuraSans-Regular', size: 14},
+                        bgcolor: 'rgba(255,255,255,0.9)',
+                        bordercolor: 'rgba(0,0,0,0.1)',
+                        borderwidth: 1
+                    },
+                    xaxis: eje_modal(figure.layout && figure.layout.xaxis),
+                    yaxis: eje_modal(figure.layout && figure.layout.yaxis),
+                    plot_bgcolor: 'white',
+                    paper_bgcolor: 'white'
+                });
+                return {data: figure.data, layout: layout};
+            }
+
+            // Si no hay datos, mostrar mensaje con fondo gris limpio
+            var eje_oculto = {showgrid: false, showticklabels: false, zeroline: false, visible: false};
+            return {
+                data: [],
+                layout: {
+                    annotations: [{
+                        text: 'Selecciona fondos para ver el gráfico',
+                        x: 0.5,
+                        y: 0.5,
+                        showarrow: false,
+                        font: {family: 'SuraSans-Regular', size: 20, color: '#666666'},
+                        xanchor: 'center',
+                        yanchor: 'middle',
+                        xref: 'paper',
+                        yref: 'paper'
+                    }],
+                    plot_bgcolor: '#f8f9fa',
+                    paper_bgcolor: '#f8f9fa',
+                    xaxis: eje_oculto,
+                    yaxis: eje_oculto,
+                    margin: {t: 20, b: 20, l: 20, r: 20},
+                    height: 750
+                }
+            };
+        }
+    }
+});
@@ -0,0 +1,308 @@
+"""
+Paso de build de los assets estáticos y su servicio con caché inmutable.
+
+`python assets_estaticos.py` lee assets/ y escribe assets_dist/:
+- Fuentes .otf subseteadas a Latin-1 y convertidas a WOFF2 (fontTools), con
+  el .otf como respaldo en el CSS.
+- PNG reoptimizados (Pillow), solo si quedan más livianos.
+- Nombres con hash del contenido (custom_styles.3f2a1b9c0d.css) y el CSS
+  reescrito para apuntar a ellos.
+- Variantes .gz y .br de los archivos de texto y de los bundles JS de los
+  componentes de Dash (se guardan en assets_dist/_componentes/).
+- manifest.json con el nombre final de cada archivo y el hash de su origen.
+
+fontTools, Pillow y brotli son dependencias solo del build
+(requirements-assets.txt); si falta alguna el paso se omite con un aviso.
+
+Al iniciar, la aplicación usa assets_dist/ si existe y su manifiesto
+corresponde a los archivos de assets/ (ASSETS_COMPILADOS=0 lo desactiva).
+Los hooks de `servir` responden los archivos con hash y los bundles con
+huella de Dash con Cache-Control inmutable y la variante precomprimida que
+acepte el navegador.
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+
+from flask import request, send_file
+from werkzeug.security import safe_join
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+CARPETA_ORIGEN = os.path.join(RAIZ, 'assets')
+CARPETA_DIST = os.path.join(RAIZ, 'assets_dist')
+MANIFIESTO = 'manifest.json'
+COMPONENTES = '_componentes'
+
+# Paquetes cuyos bundles sirve Dash en /_dash-component-suites/
+PAQUETES_COMPONENTES = ('dash', 'dash_bootstrap_components', 'plotly')
+COMPRIMIBLES = ('.css', '.js', '.otf', '.ttf', '.svg', '.json', '.map')
+# Latin-1, puntuación general y €: suficiente para los textos en español del portal
+UNICODES_FUENTES = list(range(0x20, 0x7F)) + list(range(0xA0, 0x100)) + list(range(0x2010, 0x2028)) + [0x20AC]
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
+mimetypes.add_type('font/woff2', '.woff2')
+mimetypes.add_type('font/otf', '.otf')
+
+
+def _hash(datos):
+    return hashlib.sha256(datos).hexdigest()
+
+
+def _nombre_con_hash(nombre, datos):
+    base, extension = os.path.splitext(nombre)
+    return f'{base}.{_hash(datos)[:10]}{extension}'
+
+
+def _modulo_brotli():
+    for nombre in ('brotli', 'brotlicffi'):
+        try:
+            return __import__(nombre)
+        except ImportError:
+            continue
+    return None
+
+
+def _escribir_comprimidos(ruta, datos, brotli):
+    """Escribe ruta.gz y ruta.br cuando resultan más livianos que el original."""
+    comprimido = gzip.compress(datos, compresslevel=9, mtime=0)
+    if len(comprimido) < len(datos):
+        with open(f'{ruta}.gz', 'wb') as archivo:
+            archivo.write(comprimido)
+    if brotli is not None:
+        comprimido = brotli.compress(datos, quality=11)
+        if len(comprimido) < len(datos):
+            with open(f'{ruta}.br', 'wb') as archivo:
+                archivo.write(comprimido)
+
+
+def fuente_woff2(datos):
+    """WOFF2 subseteado de una fuente OpenType; None si falta fontTools o brotli."""
+    try:
+        from fontTools import subset
+        from fontTools.ttLib import TTFont
+    except ImportError:
+        return None
+
+    opciones = subset.Options()
+    opciones.flavor = 'woff2'
+    opciones.layout_features = ['*']
+    fuente = TTFont(io.BytesIO(datos))
+    subsetter = subset.Subsetter(opciones)
+    subsetter.populate(unicodes=UNICODES_FUENTES)
+    subsetter.subset(fuente)
+    salida = io.BytesIO()
+    try:
+        subset.save_font(fuente, salida, opciones)
+    except ImportError:
+        return None
+    return salida.getvalue()
+
+
+def imagen_optimizada(datos, formato):
+    """La imagen re-guardada con optimize=True si queda más liviana; si no, la original."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return datos
+    salida = io.BytesIO()
+    Image.open(io.BytesIO(datos)).save(salida, format=formato, optimize=True)
+    return salida.getvalue() if salida.tell() < len(datos) else datos
+
+
+def _reescribir_css(css, archivos, woff2):
+    """Apunta las url() del CSS a los nombres con hash y antepone el WOFF2 a cada fuente."""
+    def fuente(coincidencia):
+        original = coincidencia.group(2)
+        fuentes = []
+        if original in woff2:
+            fuentes.append(f"url('{woff2[original]}') format('woff2')")
+        fuentes.append(f"url('{archivos.get(original, original)}') format('{coincidencia.group(4)}')")
+        return ', '.join(fuentes)
+
+    css = re.sub(r"url\((['\"]?)(?:\./)?([^'\")]+)\1\)\s*format\((['\"])([\w-]+)\3\)", fuente, css)
+    return re.sub(
+        r"url\((['\"]?)(?:\./)?([^'\")]+)\1\)(?!\s*format)",
+        lambda m: f"url('{archivos.get(m.group(2), m.group(2))}')" if m.group(2) in archivos else m.group(0),
+        css,
+    )
+
+
+def construir(origen=CARPETA_ORIGEN, destino=CARPETA_DIST):
+    """Genera `destino` a partir de `origen` y devuelve el manifiesto."""
+    if os.path.isdir(destino):
+        if not os.path.exists(os.path.join(destino, MANIFIESTO)):
+            raise SystemExit(f"{destino} existe y no es una salida de este build; no se borra")
+        shutil.rmtree(destino)
+    os.makedirs(destino)
+
+    brotli = _modulo_brotli()
+    if brotli is None:
+        print("Aviso: sin brotli/brotlicffi no se generan variantes .br")
+
+    manifiesto = {'archivos': {}, 'origen': {}, 'paquetes': {}}
+    archivos, woff2 = manifiesto['archivos'], {}
+    nombres = sorted(n for n in os.listdir(origen) if os.path.isfile(os.path.join(origen, n)))
+
+    def publicar(nombre, datos):
+        final = _nombre_con_hash(nombre, datos)
+        ruta = os.path.join(destino, final)
+        with open(ruta, 'wb') as archivo:
+            archivo.write(datos)
+        if final.endswith(COMPRIMIBLES):
+            _escribir_comprimidos(ruta, datos, brotli)
+        return final
+
+    # Fuentes e imágenes primero: el CSS se reescribe con sus nombres finales
+    for nombre in sorted(nombres, key=lambda n: n.endswith(('.css', '.js'))):
+        with open(os.path.join(origen, nombre), 'rb') as archivo:
+            datos = archivo.read()
+        manifiesto['origen'][nombre] = _hash(datos)
+        extension = os.path.splitext(nombre)[1].lower()
+
+        if extension in ('.otf', '.ttf'):
+            convertida = fuente_woff2(datos)
+            if convertida is None:
+                print(f"Aviso: sin fontTools[woff2] {nombre} se publica solo como {extension}")
+            else:
+                woff2[nombre] = publicar(os.path.splitext(nombre)[0] + '.woff2', convertida)
+                print(f"{nombre}: {len(datos) / 1024:.0f} KB -> WOFF2 {len(convertida) / 1024:.0f} KB")
+        elif extension in ('.png', '.jpg', '.jpeg'):
+            datos = imagen_optimizada(datos, 'PNG' if extension == '.png' else 'JPEG')
+        elif extension == '.css':
+            datos = _reescribir_css(datos.decode('utf-8'), archivos, woff2).encode('utf-8')
+
+        archivos[nombre] = publicar(nombre, datos)
+
+    for paquete in PAQUETES_COMPONENTES:
+        modulo = __import__(paquete)
+        manifiesto['paquetes'][paquete] = modulo.__version__
+        base = os.path.dirname(modulo.__file__)
+        for carpeta, _, contenidos in os.walk(base):
+            for nombre in contenidos:
+                if not nombre.endswith('.js'):
+                    continue
+                relativa = os.path.relpath(os.path.join(carpeta, nombre), base)
+                ruta = os.path.join(destino, COMPONENTES, paquete, relativa)
+                os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                with open(os.path.join(carpeta, nombre), 'rb') as archivo:
+                    _escribir_comprimidos(ruta, archivo.read(), brotli)
+
+    with open(os.path.join(destino, MANIFIESTO), 'w', encoding='utf-8') as archivo:
+        json.dump(manifiesto, archivo, ensure_ascii=False, indent=2)
+    return manifiesto
+
+
+def cargar_manifiesto(origen=CARPETA_ORIGEN, destino=CARPETA_DIST):
+    """Manifiesto de `destino` si corresponde a los archivos actuales de `origen`; si no, None."""
+    if os.environ.get('ASSETS_COMPILADOS', '1') == '0':
+        return None
+    try:
+        with open(os.path.join(destino, MANIFIESTO), encoding='utf-8') as archivo:
+            manifiesto = json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+    actuales = {}
+    for nombre in os.listdir(origen):
+        ruta = os.path.join(origen, nombre)
+        if os.path.isfile(ruta):
+            with open(ruta, 'rb') as archivo:
+                actuales[nombre] = _hash(archivo.read())
+    if actuales != manifiesto.get('origen'):
+        print(f"Aviso: {destino} no corresponde a {origen}; se sirven los assets sin compilar "
+              f"(ejecute python assets_estaticos.py)")
+        return None
+    return manifiesto
+
+
+class Assets:
+    """Carpeta de assets que usa la aplicación y nombres finales de cada archivo."""
+
+    def __init__(self, origen=CARPETA_ORIGEN, destino=CARPETA_DIST):
+        self.manifiesto = cargar_manifiesto(origen, destino)
+        self.carpeta = destino if self.manifiesto is not None else origen
+
+    @property
+    def compilados(self):
+        return self.manifiesto is not None
+
+    def url(self, nombre):
+        if self.compilados:
+            nombre = self.manifiesto['archivos'].get(nombre, nombre)
+        return f'/assets/{nombre}'
+
+    def servir(self, app_dash):
+        """Sirve assets con hash y bundles de componentes precomprimidos y con caché inmutable."""
+        if not self.compilados:
+            return
+
+        from dash.fingerprint import check_fingerprint
+
+        prefijo = app_dash.config.routes_pathname_prefix
+        prefijo_assets = prefijo + app_dash.config.assets_url_path.lstrip('/') + '/'
+        prefijo_componentes = prefijo + '_dash-component-suites/'
+        con_hash = set(self.manifiesto['archivos'].values())
+        paquetes = self.manifiesto['paquetes']
+        componentes = os.path.join(self.carpeta, COMPONENTES)
+
+        @app_dash.server.before_request
+        def _servir_estatico():
+            if request.path.startswith(prefijo_assets):
+                nombre = request.path[len(prefijo_assets):]
+                if nombre in con_hash:
+                    return _respuesta_precomprimida(os.path.join(self.carpeta, nombre), nombre)
+            elif request.path.startswith(prefijo_componentes):
+                paquete, _, ruta = request.path[len(prefijo_componentes):].partition('/')
+                ruta, con_huella = check_fingerprint(ruta)
+                modulo = sys.modules.get(paquete)
+                # Solo bundles con huella y de la misma versión del paquete con que se compilaron
+                if not con_huella or modulo is None or paquetes.get(paquete) != getattr(modulo, '__version__', None):
+                    return None
+                base = safe_join(componentes, paquete, ruta)
+                if base is not None:
+                    return _respuesta_precomprimida(base, ruta, solo_comprimida=True)
+            return None
+
+
+def _respuesta_precomprimida(ruta, nombre, solo_comprimida=False):
+    """La variante .br o .gz que acepte el cliente (o el original); None si no hay ninguna."""
+    aceptadas = request.accept_encodings
+    for codificacion, extension in (('br', '.br'), ('gzip', '.gz')):
+        if codificacion in aceptadas and os.path.exists(ruta + extension):
+            archivo = ruta + extension
+            break
+    else:
+        if solo_comprimida or not os.path.exists(ruta):
+            return None
+        archivo, codificacion = ruta, None
+
+    tipo = mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+    respuesta = send_file(archivo, mimetype=tipo, conditional=True, max_age=31536000)
+    if codificacion is not None:
+        respuesta.headers['Content-Encoding'] = codificacion
+    respuesta.headers['Vary'] = 'Accept-Encoding'
+    respuesta.headers['Cache-Control'] = CACHE_INMUTABLE
+    return respuesta
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compila los assets estáticos del portal')
+    parser.add_argument('--origen', default=CARPETA_ORIGEN)
+    parser.add_argument('--destino', default=CARPETA_DIST)
+    args = parser.parse_args()
+
+    manifiesto = construir(args.origen, args.destino)
+    total = sum(os.path.getsize(os.path.join(carpeta, nombre))
+                for carpeta, _, nombres in os.walk(args.destino) for nombre in nombres)
+    print(f"{len(manifiesto['archivos'])} assets compilados en {args.destino} ({total / 1024 / 1024:.1f} MB con variantes)")
+
+
+if __name__ == '__main__':
+    main()
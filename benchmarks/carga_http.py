@@ -0,0 +1,444 @@
+"""
+Prueba de carga local del endpoint de callbacks de Dash.
+
+Levanta `gunicorn server:server` contra un libro sintético (sin red: todo
+corre en 127.0.0.1) y simula usuarios concurrentes que cargan la página y
+repiten secuencias realistas de interacción: cambio de moneda, agregar y
+quitar fondos, botones de período (btn-1m … btn-max), cambio de pestaña y
+zoom en el gráfico.
+
+Cada usuario reproduce lo que haría el navegador: lee el layout inicial y el
+grafo de callbacks desde /_dash-layout y /_dash-dependencies, arma el cuerpo
+de /_dash-update-component con los valores vigentes de entradas y estados,
+aplica las respuestas y dispara en cascada los callbacks cuyas entradas
+cambiaron. Los callbacks del navegador (assets/clientside.js) no llegan al
+servidor; su efecto sobre los selectores se emula en `cambiar_pestaña` y
+`_cambiar_seleccion`.
+
+Reporta throughput, latencias p50/p95/p99 y bytes de respuesta por callback
+para cada combinación de cantidad y clase de workers.
+
+Uso:
+    python benchmarks/carga_http.py --workers 1,2,4 --clases sync,gthread --usuarios 8 --duracion 30
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(DIRECTORIO)
+sys.path.insert(0, DIRECTORIO)
+
+from libro_sintetico import generar_libro  # noqa: E402
+
+PESTAÑAS = {'acumulada': 'acumulada', 'anualizada': 'anualizada', 'por_ano': 'por-año', 'riesgo': 'riesgo'}
+BOTONES_PERIODO = ['btn-1m', 'btn-3m', 'btn-6m', 'btn-ytd', 'btn-1y', 'btn-3y', 'btn-5y', 'btn-max']
+
+# Peso relativo de cada acción en las secuencias de los usuarios
+ACCIONES = {
+    'moneda': 2,
+    'agregar_fondo': 3,
+    'quitar_fondo': 2,
+    'periodo': 3,
+    'pestaña': 2,
+    'zoom': 1,
+}
+
+
+def _separar_salidas(salida):
+    """'..a.b...c.d..' -> [('a', 'b'), ('c', 'd')]; 'a.b' -> [('a', 'b')]."""
+    if salida.startswith('..'):
+        partes = salida[2:-2].split('...')
+    else:
+        partes = [salida]
+    return [tuple(parte.rsplit('.', 1)) for parte in partes]
+
+
+def _valores_layout(nodo, valores):
+    """Recorre el layout serializado y guarda las props de los componentes con id."""
+    if isinstance(nodo, list):
+        for hijo in nodo:
+            _valores_layout(hijo, valores)
+    elif isinstance(nodo, dict) and 'props' in nodo:
+        props = nodo['props']
+        if 'id' in props:
+            for prop, valor in props.items():
+                valores[(props['id'], prop)] = valor
+        _valores_layout(props.get('children'), valores)
+    return valores
+
+
+class Cliente:
+    """Conexión keep-alive de un usuario virtual."""
+
+    def __init__(self, puerto, timeout=60):
+        self.puerto = puerto
+        self.timeout = timeout
+        self._conexion = None
+
+    def solicitar(self, metodo, ruta, cuerpo=None):
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else None
+        encabezados = {'Content-Type': 'application/json'} if datos is not None else {}
+        for intento in range(2):
+            if self._conexion is None:
+                self._conexion = http.client.HTTPConnection('127.0.0.1', self.puerto, timeout=self.timeout)
+            try:
+                self._conexion.request(metodo, ruta, body=datos, headers=encabezados)
+                respuesta = self._conexion.getresponse()
+                return respuesta.status, respuesta.read()
+            except (http.client.HTTPException, OSError):
+                # El worker cerró la conexión (p. ej. worker sync): se reintenta una vez
+                self._conexion.close()
+                self._conexion = None
+                if intento:
+                    raise
+
+
+class UsuarioVirtual:
+    """Estado de una página abierta: valores de componentes y grafo de callbacks."""
+
+    def __init__(self, cliente, dependencias, registro, rng):
+        self.cliente = cliente
+        self.registro = registro
+        self.rng = rng
+        self.callbacks = [c for c in dependencias if not c.get('clientside_function')]
+        self.por_entrada = defaultdict(list)
+        for callback in self.callbacks:
+            for entrada in callback['inputs']:
+                self.por_entrada[(entrada['id'], entrada['property'])].append(callback)
+        self.valores = {}
+
+    def cargar_pagina(self):
+        inicio = time.perf_counter()
+        estado, cuerpo = self.cliente.solicitar('GET', '/_dash-layout')
+        self.registro.anotar('GET /_dash-layout', time.perf_counter() - inicio, len(cuerpo), estado)
+        self.valores = _valores_layout(json.loads(cuerpo), {})
+        # El navegador mide el ancho del gráfico y lo deja en su store
+        self.valores[('ancho-grafico', 'data')] = 1200
+        self.fondos_disponibles = [o['value'] for o in self.valores.get(('fondos-selector-acumulada', 'options'), [])]
+
+    @property
+    def pestaña(self):
+        return self.valores.get(('tabs', 'active_tab'), 'acumulada')
+
+    def cambiar(self, cambios):
+        """Aplica cambios de props hechos por el usuario y dispara los callbacks afectados."""
+        pendientes = []
+        for clave, valor in cambios.items():
+            self.valores[clave] = valor
+            pendientes.append(clave)
+        self._propagar(pendientes)
+
+    def _propagar(self, cambiados):
+        # Como el renderer: cada callback se dispara una vez por lote de cambios
+        while cambiados:
+            disparados = []
+            for clave in cambiados:
+                for callback in self.por_entrada.get(clave, []):
+                    if callback not in [c for c, _ in disparados]:
+                        disparados.append((callback, clave))
+            cambiados = []
+            for callback, clave in disparados:
+                cambiados.extend(self._ejecutar(callback, clave))
+
+    def _ejecutar(self, callback, disparador):
+        salidas = _separar_salidas(callback['output'])
+        multiple = callback['output'].startswith('..')
+        cuerpo = {
+            'output': callback['output'],
+            'outputs': [{'id': i, 'property': p} for i, p in salidas] if multiple
+            else {'id': salidas[0][0], 'property': salidas[0][1]},
+            'inputs': [dict(e, value=self.valores.get((e['id'], e['property']))) for e in callback['inputs']],
+            'state': [dict(e, value=self.valores.get((e['id'], e['property']))) for e in callback['state']],
+            'changedPropIds': [f'{disparador[0]}.{disparador[1]}'],
+        }
+        etiqueta = callback['output'].strip('.').replace('...', ' + ')
+        inicio = time.perf_counter()
+        estado, respuesta = self.cliente.solicitar('POST', '/_dash-update-component', cuerpo)
+        self.registro.anotar(etiqueta, time.perf_counter() - inicio, len(respuesta), estado)
+        if estado != 200:
+            return []
+
+        cambiados = []
+        for id_componente, props in json.loads(respuesta).get('response', {}).items():
+            for prop, valor in props.items():
+                if isinstance(valor, dict) and '__dash_patch_update' in valor:
+                    continue  # Los Patch solo afectan la figura, que no es entrada de callbacks del servidor
+                if self.valores.get((id_componente, prop)) != valor:
+                    self.valores[(id_componente, prop)] = valor
+                    cambiados.append((id_componente, prop))
+        return cambiados
+
+    def seleccion(self):
+        return list(self.valores.get(('fondos-seleccionados', 'data')) or [])
+
+    def _cambiar_seleccion(self, fondos):
+        sufijo = PESTAÑAS[self.pestaña]
+        self.cambiar({
+            (f'fondos-selector-{sufijo}', 'value'): fondos,
+            ('fondos-seleccionados', 'data'): fondos,
+        })
+
+    def accion(self, nombre):
+        rng = self.rng
+        sufijo = PESTAÑAS[self.pestaña]
+        if nombre == 'moneda':
+            clave = (f'moneda-selector-{sufijo}', 'value')
+            self.cambiar({clave: 'USD' if self.valores.get(clave) == 'CLP' else 'CLP'})
+        elif nombre == 'agregar_fondo':
+            seleccion = self.seleccion()
+            candidatos = [f for f in self.fondos_disponibles if f not in seleccion]
+            if candidatos and len(seleccion) < 15:
+                self._cambiar_seleccion(seleccion + [rng.choice(candidatos)])
+        elif nombre == 'quitar_fondo':
+            seleccion = self.seleccion()
+            if len(seleccion) > 1:
+                seleccion.remove(rng.choice(seleccion))
+                self._cambiar_seleccion(seleccion)
+        elif nombre == 'pestaña':
+            nueva = rng.choice([p for p in PESTAÑAS if p != self.pestaña])
+            self.cambiar_pestaña(nueva)
+        elif nombre in ('periodo', 'zoom'):
+            if self.pestaña != 'acumulada':
+                self.cambiar_pestaña('acumulada')
+            if nombre == 'periodo':
+                boton = rng.choice(BOTONES_PERIODO)
+                clics = (self.valores.get((boton, 'n_clicks')) or 0) + 1
+                self.cambiar({(boton, 'n_clicks'): clics})
+            else:
+                self.zoom()
+
+    def cambiar_pestaña(self, pestaña):
+        # mostrar_pestaña y sincronizar_fondos (clientside): solo el selector visible recibe la selección
+        cambios = {('tabs', 'active_tab'): pestaña}
+        clave = (f'fondos-selector-{PESTAÑAS[pestaña]}', 'value')
+        if self.valores.get(clave) != self.seleccion():
+            cambios[clave] = self.seleccion()
+        self.cambiar(cambios)
+
+    def zoom(self):
+        desde = self.valores.get(('fecha-inicio-grafico', 'date'))
+        hasta = self.valores.get(('fecha-fin-grafico', 'date'))
+        if not desde or not hasta:
+            return
+        inicio = datetime.fromisoformat(str(desde)[:19])
+        fin = datetime.fromisoformat(str(hasta)[:19])
+        a, b = sorted(self.rng.random() for _ in range(2))
+        self.cambiar({('zoom-grafico', 'data'): {
+            'xaxis.range[0]': (inicio + (fin - inicio) * a).isoformat(sep=' '),
+            'xaxis.range[1]': (inicio + (fin - inicio) * max(b, a + 0.05)).isoformat(sep=' '),
+        }})
+
+
+class Registro:
+    """Latencias y tamaños por callback, compartido entre hilos."""
+
+    def __init__(self):
+        self._bloqueo = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.bytes = defaultdict(list)
+        self.errores = defaultdict(int)
+
+    def anotar(self, etiqueta, segundos, tamaño, estado):
+        with self._bloqueo:
+            if estado in (200, 204):
+                self.latencias[etiqueta].append(segundos)
+                self.bytes[etiqueta].append(tamaño)
+            else:
+                self.errores[etiqueta] += 1
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(int(round(p / 100 * (len(ordenados) - 1))), len(ordenados) - 1)]
+
+
+def resumir(registro, duracion):
+    por_callback = {}
+    total = 0
+    for etiqueta, latencias in sorted(registro.latencias.items()):
+        total += len(latencias)
+        por_callback[etiqueta] = {
+            'solicitudes': len(latencias),
+            'p50_ms': round(_percentil(latencias, 50) * 1000, 2),
+            'p95_ms': round(_percentil(latencias, 95) * 1000, 2),
+            'p99_ms': round(_percentil(latencias, 99) * 1000, 2),
+            'bytes_promedio': int(statistics.mean(registro.bytes[etiqueta])),
+            'errores': registro.errores.get(etiqueta, 0),
+        }
+    return {
+        'solicitudes': total,
+        'errores': sum(registro.errores.values()),
+        'throughput_rps': round(total / duracion, 2),
+        'por_callback': por_callback,
+    }
+
+
+def usuario(puerto, dependencias, registro, fin, semilla, pausa):
+    rng = random.Random(semilla)
+    acciones, pesos = zip(*ACCIONES.items())
+    cliente = Cliente(puerto)
+    virtual = UsuarioVirtual(cliente, dependencias, registro, rng)
+    try:
+        virtual.cargar_pagina()
+        while time.monotonic() < fin:
+            virtual.accion(rng.choices(acciones, pesos)[0])
+            if pausa:
+                time.sleep(rng.uniform(0, pausa))
+            # De vez en cuando el usuario recarga la página
+            if rng.random() < 0.02:
+                virtual.cargar_pagina()
+    except (OSError, http.client.HTTPException) as e:
+        registro.anotar('conexion', 0, 0, str(e))
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(workers, clase, hilos, entorno, puerto):
+    comando = [
+        sys.executable, '-m', 'gunicorn', '-c', os.path.join(RAIZ, 'gunicorn.conf.py'),
+        '-w', str(workers), '-k', clase, '-b', f'127.0.0.1:{puerto}', '--timeout', '120',
+    ]
+    if clase == 'gthread':
+        comando += ['--threads', str(hilos)]
+    comando.append('server:server')
+    proceso = subprocess.Popen(comando, cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, start_new_session=True)
+
+    limite = time.monotonic() + 300
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"gunicorn terminó al iniciar (código {proceso.returncode})")
+        try:
+            conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=5)
+            conexion.request('GET', '/_dash-dependencies')
+            if conexion.getresponse().status == 200:
+                conexion.close()
+                return proceso
+        except OSError:
+            pass
+        time.sleep(0.5)
+    detener_servidor(proceso)
+    raise RuntimeError("gunicorn no respondió a tiempo")
+
+
+def detener_servidor(proceso):
+    try:
+        os.killpg(proceso.pid, signal.SIGTERM)
+        proceso.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(proceso.pid, signal.SIGKILL)
+
+
+def ejecutar_configuracion(workers, clase, args, entorno):
+    puerto = _puerto_libre()
+    proceso = iniciar_servidor(workers, clase, args.hilos, entorno, puerto)
+    try:
+        cliente = Cliente(puerto)
+        _, cuerpo = cliente.solicitar('GET', '/_dash-dependencies')
+        dependencias = json.loads(cuerpo)
+
+        # Calentamiento: una pasada corta para que cada worker cargue y precalcule
+        registro_calentamiento = Registro()
+        fin = time.monotonic() + args.calentamiento
+        hilos = [threading.Thread(target=usuario, args=(puerto, dependencias, registro_calentamiento,
+                                                        fin, 10_000 + i, 0))
+                 for i in range(workers)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        registro = Registro()
+        inicio = time.monotonic()
+        fin = inicio + args.duracion
+        hilos = [threading.Thread(target=usuario, args=(puerto, dependencias, registro, fin,
+                                                        args.semilla + i, args.pausa))
+                 for i in range(args.usuarios)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return resumir(registro, time.monotonic() - inicio)
+    finally:
+        detener_servidor(proceso)
+
+
+def imprimir(configuracion, resumen):
+    print(f"\n== {configuracion}: {resumen['throughput_rps']} solicitudes/s, "
+          f"{resumen['solicitudes']} solicitudes, {resumen['errores']} errores")
+    print(f"{'callback':<72} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'bytes':>9}")
+    for etiqueta, m in resumen['por_callback'].items():
+        print(f"{etiqueta[:72]:<72} {m['solicitudes']:>6} {m['p50_ms']:>8} {m['p95_ms']:>8} "
+              f"{m['p99_ms']:>8} {m['bytes_promedio']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga local de los callbacks de Dash')
+    parser.add_argument('--workers', default='1,2', help='cantidades de workers separadas por coma')
+    parser.add_argument('--clases', default='sync,gthread', help='clases de worker de gunicorn')
+    parser.add_argument('--hilos', type=int, default=4, help='hilos por worker gthread')
+    parser.add_argument('--usuarios', type=int, default=8, help='usuarios virtuales concurrentes')
+    parser.add_argument('--duracion', type=float, default=30, help='segundos de medición por configuración')
+    parser.add_argument('--calentamiento', type=float, default=5)
+    parser.add_argument('--pausa', type=float, default=0.0, help='pausa máxima (s) entre acciones de un usuario')
+    parser.add_argument('--fondos', type=int, default=60)
+    parser.add_argument('--años', type=int, default=15)
+    parser.add_argument('--libro', help='usar este libro en lugar de generar uno sintético')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--salida', help='JSON con los resultados')
+    args = parser.parse_args()
+
+    libro = args.libro or os.path.join(DIRECTORIO, '.datos', f'libro_{args.fondos}f_{args.años}a_carga.xlsx')
+    if not os.path.exists(libro):
+        print(f"Generando libro sintético {libro} ...")
+        generar_libro(libro, args.fondos, args.años)
+
+    directorio_cache = tempfile.mkdtemp(prefix='carga_cache_')
+    entorno = dict(os.environ, RUTA_DATOS=os.path.abspath(libro), CACHE_DATOS_DIR=directorio_cache,
+                   RECARGA_DATOS_SEGUNDOS='0', PYTHONPATH=RAIZ)
+
+    resultados = {}
+    try:
+        for clase in args.clases.split(','):
+            for workers in [int(w) for w in args.workers.split(',')]:
+                configuracion = f'{clase} x{workers}' + (f' ({args.hilos} hilos)' if clase == 'gthread' else '')
+                print(f"Midiendo {configuracion} con {args.usuarios} usuarios durante {args.duracion:.0f} s ...")
+                try:
+                    resultados[configuracion] = ejecutar_configuracion(workers, clase, args, entorno)
+                except RuntimeError as e:
+                    print(f"  omitida: {e}")
+                    continue
+                imprimir(configuracion, resultados[configuracion])
+    finally:
+        shutil.rmtree(directorio_cache, ignore_errors=True)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump({
+                'fecha': datetime.now().isoformat(timespec='seconds'),
+                'parametros': vars(args),
+                'resultados': resultados,
+            }, archivo, ensure_ascii=False, indent=2)
+        print(f"\nResultados guardados en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+"""
+Benchmarks de carga, cálculo y gráfico a escala de producción.
+
+Genera (o reutiliza) un libro sintético, carga la aplicación contra él y mide
+el tiempo de cada etapa: parseo del Excel (lector streaming y pd.read_excel),
+caché binaria, las funciones de cálculo de app.py para ambas monedas, los
+retornos acumulados y la construcción de la figura. Cada medición guarda
+mediana/mínimo/máximo y el pico de memoria asignada (tracemalloc) en un JSON
+comparable entre corridas; los lectores del libro guardan además el pico de
+RSS medido en un proceso aparte.
+
+Uso:
+    python benchmarks/ejecutar.py --fondos 500 --años 25
+    python benchmarks/ejecutar.py --comparar benchmarks/resultados/base.json --tolerancia 0.25
+
+Con --comparar el proceso termina con código 1 si alguna medición es más
+lenta que la referencia por sobre la tolerancia (regresión).
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(DIRECTORIO)
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, DIRECTORIO)
+
+from libro_sintetico import generar_libro  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def medir(funcion, repeticiones, preparar=None):
+    """Tiempos de `funcion()` en `repeticiones` corridas más una corrida con tracemalloc."""
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+
+    # Memoria en una corrida aparte: tracemalloc distorsiona los tiempos
+    if preparar is not None:
+        preparar()
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'mediana_s': round(statistics.median(tiempos), 6),
+        'min_s': round(min(tiempos), 6),
+        'max_s': round(max(tiempos), 6),
+        'repeticiones': repeticiones,
+        'pico_memoria_mb': round(pico / MB, 2),
+    }
+
+
+def ruta_libro(args):
+    if args.libro:
+        return args.libro
+    nombre = f'libro_{args.fondos}f_{args.años}a_nan{args.densidad_nan}_s{args.semilla}.xlsx'
+    return os.path.join(DIRECTORIO, '.datos', nombre)
+
+
+def preparar_libro(args):
+    ruta = ruta_libro(args)
+    if not os.path.exists(ruta):
+        print(f"Generando libro sintético {ruta} ...")
+        inicio = time.perf_counter()
+        generar_libro(ruta, args.fondos, args.años, args.densidad_nan, semilla=args.semilla)
+        print(f"  listo en {time.perf_counter() - inicio:.1f} s")
+    return ruta
+
+
+def pico_rss_lectura(ruta, funcion):
+    """Pico de RSS (MB) de leer el libro con `carga_datos.<funcion>` en un proceso nuevo, y el de sus hijos."""
+    codigo = ('import sys, carga_datos; getattr(carga_datos, sys.argv[1])(sys.argv[2]); '
+              'print(carga_datos.pico_rss_mb(), carga_datos.pico_rss_mb(hijos=True))')
+    salida = subprocess.run([sys.executable, '-c', codigo, funcion, ruta], cwd=RAIZ,
+                            capture_output=True, text=True, check=True).stdout
+    pico, pico_hijos = salida.strip().splitlines()[-1].split()
+    return {'pico_rss_mb': round(float(pico), 1), 'pico_rss_hijos_mb': round(float(pico_hijos), 1)}
+
+
+def benchmarks_carga(ruta, args, resultados):
+    import cache_datos
+    from carga_datos import leer_libro, leer_libro_excel, leer_libro_streaming
+
+    print("Midiendo carga ...")
+    resultados['carga.leer_libro_excel'] = medir(lambda: leer_libro_excel(ruta), args.repeticiones_carga)
+    resultados['carga.leer_libro_excel'].update(pico_rss_lectura(ruta, 'leer_libro_excel'))
+    resultados['carga.leer_libro_streaming'] = medir(lambda: leer_libro_streaming(ruta), args.repeticiones_carga)
+    resultados['carga.leer_libro_streaming'].update(pico_rss_lectura(ruta, 'leer_libro_streaming'))
+
+    directorio_cache = os.environ['CACHE_DATOS_DIR']
+    limpiar = lambda: shutil.rmtree(directorio_cache, ignore_errors=True)  # noqa: E731
+    resultados['carga.cache_construccion'] = medir(
+        lambda: cache_datos.cargar_con_cache(ruta, leer_libro), args.repeticiones_carga, limpiar
+    )
+    cache_datos.cargar_con_cache(ruta, leer_libro)
+    resultados['carga.cache_lectura'] = medir(
+        lambda: cache_datos.cargar_con_cache(ruta, leer_libro), args.repeticiones
+    )
+
+
+def benchmarks_calculo(args, resultados):
+    print("Importando la aplicación ...")
+    inicio = time.perf_counter()
+    import app
+    from almacen_datos import InstantaneaDatos
+    resultados['arranque.import_app'] = {'mediana_s': round(time.perf_counter() - inicio, 6), 'repeticiones': 1}
+
+    datos = app.almacen.actual()
+    if datos is None:
+        raise SystemExit("La aplicación no pudo cargar el libro sintético")
+
+    fondos, series, tac = datos.fondos, datos.series, datos.tac
+    seleccion = fondos[:args.fondos_grafico]
+    rep = args.repeticiones
+
+    if not verificar_carga_en_segundo_plano(app, resultados):
+        raise SystemExit("/readyz espera la carga en segundo plano")
+
+    for moneda in ('CLP', 'USD'):
+        df = datos.precios(moneda)
+        print(f"Midiendo cálculos {moneda} ...")
+        resultados[f'calculo.calcular_rentabilidades[{moneda}]'] = medir(
+            lambda: app.calcular_rentabilidades(df, fondos, series, tac), rep)
+        resultados[f'calculo.calcular_rentabilidades_anualizadas[{moneda}]'] = medir(
+            lambda: app.calcular_rentabilidades_anualizadas(df, fondos, series), rep)
+        resultados[f'calculo.calcular_rentabilidades_por_año[{moneda}]'] = medir(
+            lambda: app.calcular_rentabilidades_por_año(df, fondos, series), rep)
+
+        fecha_inicio, fecha_fin = df['Dates'].min(), df['Dates'].max()
+        resultados[f'grafico.calcular_retornos_acumulados[{moneda}]'] = medir(
+            lambda: app.calcular_retornos_acumulados(df, seleccion, fecha_inicio, fecha_fin), rep)
+        resultados[f'grafico.retornos_acumulados_matriz[{moneda}]'] = medir(
+            lambda: app.retornos_acumulados_matriz(datos, moneda, seleccion, fecha_inicio, fecha_fin), rep)
+
+        df_retornos = app.calcular_retornos_acumulados(df, seleccion, fecha_inicio, fecha_fin)
+        for etiqueta, presupuesto in (('completo', None), ('submuestreado', app.PRESUPUESTO_POR_DEFECTO)):
+            nombre = f'grafico.crear_grafico_retornos[{moneda},{etiqueta}]'
+            resultados[nombre] = medir(
+                lambda: app.crear_grafico_retornos(df_retornos, seleccion, presupuesto), rep)
+            figura = app.crear_grafico_retornos(df_retornos, seleccion, presupuesto)
+            resultados[nombre]['bytes_json'] = len(figura.to_json())
+
+    # Primera página tras publicar una versión: tablas precalculadas y vista inicial desde cero
+    print("Midiendo vista inicial ...")
+    nueva = {}
+
+    def nueva_instantanea():
+        nueva['datos'] = InstantaneaDatos(datos.pesos_df, datos.dolares_df, fondos, series, tac, datos.version)
+
+    def primera_pagina():
+        app.precalcular_resultados(nueva['datos'])
+        app.vista_inicial(nueva['datos'])
+
+    resultados['layout.version_nueva'] = medir(primera_pagina, rep, nueva_instantanea)
+
+
+def verificar_carga_en_segundo_plano(app, resultados, segundos=3.0):
+    """
+    Durante una carga lenta en segundo plano, /readyz debe responder 503 de inmediato.
+
+    Se simula un worker recién creado con un almacén cuyo cargador tarda hasta
+    `segundos` (y no carga nada, para no competir con los benchmarks); devuelve
+    False si /readyz esperó la carga o no respondió 503.
+    """
+    import threading
+
+    from almacen_datos import AlmacenDatos
+
+    liberar = threading.Event()
+
+    def cargador_lento(ruta):
+        liberar.wait(segundos)
+        return None, None, None, None, None, None
+
+    print("Verificando /readyz durante la carga en segundo plano ...")
+    almacen_original = app.almacen
+    app.almacen = AlmacenDatos(cargador_lento, app.buscar_archivo_datos, intervalo=60)
+    try:
+        app.almacen.cargar_en_segundo_plano()
+        inicio = time.perf_counter()
+        respuesta = app.server.test_client().get('/readyz')
+        duracion = time.perf_counter() - inicio
+    finally:
+        liberar.set()
+        app.almacen = almacen_original
+
+    resultados['arranque.readyz_durante_carga'] = {'mediana_s': round(duracion, 6), 'estado_http': respuesta.status_code}
+    correcto = respuesta.status_code == 503 and duracion < segundos / 2
+    if not correcto:
+        print(f"  /readyz respondió {respuesta.status_code} en {duracion:.2f} s (se esperaba 503 inmediato)")
+    return correcto
+
+
+def comparar(resultados, referencia, tolerancia):
+    """Imprime la comparación con una corrida anterior y devuelve las regresiones."""
+    regresiones = []
+    print(f"\n{'medición':<58} {'ref (s)':>10} {'actual (s)':>11} {'cambio':>8}")
+    for nombre, medicion in resultados.items():
+        anterior = referencia.get(nombre)
+        if not anterior or not anterior.get('mediana_s'):
+            continue
+        cambio = medicion['mediana_s'] / anterior['mediana_s'] - 1
+        marca = ''
+        if cambio > tolerancia:
+            regresiones.append(nombre)
+            marca = '  << REGRESIÓN'
+        print(f"{nombre:<58} {anterior['mediana_s']:>10.4f} {medicion['mediana_s']:>11.4f} {cambio:>+8.1%}{marca}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks del Portal de Rentabilidades')
+    parser.add_argument('--fondos', type=int, default=500)
+    parser.add_argument('--años', type=int, default=25)
+    parser.add_argument('--densidad-nan', type=float, default=0.02)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--libro', help='usar este libro en lugar de generar uno sintético')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--repeticiones-carga', type=int, default=1,
+                        help='repeticiones del parseo del Excel (lento a escala completa)')
+    parser.add_argument('--fondos-grafico', type=int, default=15)
+    parser.add_argument('--sin-carga', action='store_true', help='omite los benchmarks de parseo y caché')
+    parser.add_argument('--salida', help='JSON de resultados (por defecto benchmarks/resultados/<fecha>.json)')
+    parser.add_argument('--comparar', help='JSON de una corrida anterior para detectar regresiones')
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help='aumento relativo de la mediana tolerado antes de marcar regresión')
+    args = parser.parse_args()
+
+    ruta = os.path.abspath(preparar_libro(args))
+    directorio_cache = tempfile.mkdtemp(prefix='bench_cache_')
+    # La aplicación se importa contra el libro sintético, sin recarga en caliente ni memoización
+    os.environ['RUTA_DATOS'] = ruta
+    os.environ['CACHE_DATOS_DIR'] = directorio_cache
+    os.environ['RECARGA_DATOS_SEGUNDOS'] = '0'
+    os.environ['MEMO_BACKEND'] = 'ninguno'
+
+    resultados = {}
+    try:
+        if not args.sin_carga:
+            benchmarks_carga(ruta, args, resultados)
+        benchmarks_calculo(args, resultados)
+    finally:
+        shutil.rmtree(directorio_cache, ignore_errors=True)
+
+    import numpy as np
+    import pandas as pd
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'entorno': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'procesador': platform.processor() or platform.machine(),
+        },
+        'parametros': {
+            'libro': ruta,
+            'fondos': args.fondos,
+            'años': args.años,
+            'densidad_nan': args.densidad_nan,
+            'semilla': args.semilla,
+            'repeticiones': args.repeticiones,
+            'fondos_grafico': args.fondos_grafico,
+        },
+        'resultados': resultados,
+    }
+
+    salida = args.salida or os.path.join(
+        DIRECTORIO, 'resultados', datetime.now().strftime('%Y%m%d-%H%M%S') + '.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as archivo:
+        json.dump(informe, archivo, ensure_ascii=False, indent=2)
+    print(f"\nResultados guardados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            referencia = json.load(archivo)
+        if referencia.get('parametros', {}).get('fondos') != args.fondos or \
+                referencia.get('parametros', {}).get('años') != args.años:
+            print("Aviso: la referencia se midió con otro tamaño de libro")
+        regresiones = comparar(resultados, referencia['resultados'], args.tolerancia)
+        if regresiones:
+            print(f"\n{len(regresiones)} regresiones sobre la tolerancia de {args.tolerancia:.0%}")
+            sys.exit(1)
+        print("\nSin regresiones")
+
+
+if __name__ == '__main__':
+    main()
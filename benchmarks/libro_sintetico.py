@@ -0,0 +1,108 @@
+"""
+Generador de libros rentabilidades.xlsx sintéticos.
+
+Produce la misma estructura que espera carga_datos.leer_libro_excel: hoja
+"nombres" (fila 1 fondos, fila 3 series), hojas "Pesos" y "Dolares" con siete
+filas de encabezado de Bloomberg antes de la fila de títulos, y hoja "TAC".
+Los precios son caminatas aleatorias reproducibles (semilla fija) con fondos
+que parten tarde, huecos contiguos y celdas sueltas sin precio.
+
+Uso:
+    python benchmarks/libro_sintetico.py salida.xlsx --fondos 500 --años 25
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+DIAS_HABILES_POR_AÑO = 261
+
+
+def precios_sinteticos(n_filas, n_fondos, densidad_nan=0.02, proporcion_tardios=0.3,
+                       huecos_por_fondo=1, rng=None):
+    """Matriz filas × fondos de precios con NaN (inicios tardíos, huecos y celdas sueltas)."""
+    rng = rng if rng is not None else np.random.default_rng(0)
+    retornos = rng.normal(0.0002, 0.01, (n_filas, n_fondos))
+    precios = 100 * np.exp(np.cumsum(retornos, axis=0))
+
+    tardios = rng.random(n_fondos) < proporcion_tardios
+    for j in np.flatnonzero(tardios):
+        precios[:rng.integers(1, max(n_filas // 2, 2)), j] = np.nan
+
+    for j in range(n_fondos):
+        for _ in range(huecos_por_fondo):
+            largo = int(rng.integers(5, 30))
+            inicio = int(rng.integers(0, max(n_filas - largo, 1)))
+            precios[inicio:inicio + largo, j] = np.nan
+
+    precios[rng.random(precios.shape) < densidad_nan] = np.nan
+    return precios
+
+
+def generar_libro(ruta, n_fondos=500, años=25, densidad_nan=0.02, proporcion_tardios=0.3,
+                  huecos_por_fondo=1, texto_na=False, semilla=0, fecha_final='2025-06-30'):
+    """Escribe el libro en `ruta` y devuelve (fechas, fondos, series)."""
+    rng = np.random.default_rng(semilla)
+    fechas = pd.bdate_range(end=fecha_final, periods=años * DIAS_HABILES_POR_AÑO)
+    fondos = [f'Fondo Sintético {i:04d}' for i in range(n_fondos)]
+    series = [f'SINT{i:04d}' for i in range(n_fondos)]
+    # Bloomberg deja "#N/A N/A" en las celdas sin precio; por defecto quedan vacías
+    vacio = '#N/A N/A' if texto_na else None
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('nombres')
+    hoja.append(fondos)
+    hoja.append([None] * n_fondos)
+    hoja.append(series)
+
+    fechas_py = [fecha.to_pydatetime() for fecha in fechas]
+    for nombre_hoja, deriva in (('Pesos', 0.0), ('Dolares', 0.0001)):
+        hoja = libro.create_sheet(nombre_hoja)
+        for _ in range(7):
+            hoja.append(['Bloomberg'])
+        hoja.append(['Dates'] + [f'{serie} Equity' for serie in series])
+
+        precios = precios_sinteticos(len(fechas), n_fondos, densidad_nan, proporcion_tardios,
+                                     huecos_por_fondo, rng)
+        precios *= np.exp(deriva * np.arange(len(fechas)))[:, None]
+        filas = np.where(np.isnan(precios), None, precios.round(6)).tolist()
+        for fecha, fila in zip(fechas_py, filas):
+            if vacio is not None:
+                fila = [vacio if valor is None else valor for valor in fila]
+            hoja.append([fecha] + fila)
+
+    hoja = libro.create_sheet('TAC')
+    hoja.append(['Serie', 'TAC'])
+    for i, serie in enumerate(series):
+        if i % 4:
+            hoja.append([serie, round(0.3 + (i % 17) * 0.1, 2)])
+
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(directorio, exist_ok=True)
+    libro.save(ruta)
+    return fechas, fondos, series
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera un libro rentabilidades.xlsx sintético')
+    parser.add_argument('salida')
+    parser.add_argument('--fondos', type=int, default=500)
+    parser.add_argument('--años', type=int, default=25)
+    parser.add_argument('--densidad-nan', type=float, default=0.02)
+    parser.add_argument('--tardios', type=float, default=0.3, help='proporción de fondos que parten tarde')
+    parser.add_argument('--huecos', type=int, default=1, help='huecos contiguos por fondo')
+    parser.add_argument('--texto-na', action='store_true', help='escribe "#N/A N/A" en lugar de celdas vacías')
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    fechas, fondos, _ = generar_libro(
+        args.salida, args.fondos, args.años, args.densidad_nan, args.tardios,
+        args.huecos, args.texto_na, args.semilla
+    )
+    print(f"Libro generado en {args.salida}: {len(fondos)} fondos × {len(fechas)} fechas")
+
+
+if __name__ == '__main__':
+    main()
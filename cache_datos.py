@@ -0,0 +1,319 @@
+"""
+Caché binaria columnar del libro rentabilidades.xlsx.
+
+El libro se convierte a matrices .npy (fechas y precios de cada moneda) más
+un archivo de metadatos JSON. Los arranques siguientes abren esas matrices
+con memory-map en lugar de volver a parsear el XML del Excel.
+
+Las matrices son de solo anexar: cuando una actualización del libro solo
+agrega fechas posteriores, se escriben al final únicamente las filas nuevas y
+la versión queda registrada con su número de filas; cualquier versión
+registrada se abre como un prefijo de las mismas matrices. Si cambiaron
+precios históricos, la lista de fondos o hay menos fechas, el almacén se
+reconstruye completo (también con CARGA_INCREMENTAL=0).
+
+Cada versión se identifica por el hash SHA-256 del contenido del libro. El
+mtime y el tamaño se usan como verificación rápida para no recalcular el
+hash en cada arranque.
+"""
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+VERSION_FORMATO = 3
+NOMBRE_DIRECTORIO = '.cache_rentabilidades'
+NOMBRE_ALMACEN = f'columnar-v{VERSION_FORMATO}'
+ARCHIVO_PUNTERO = 'actual.json'
+ARCHIVO_METADATOS = 'metadatos.json'
+# Versiones registradas que se conservan en los metadatos
+MAX_VERSIONES = 50
+# Encabezado .npy de largo fijo, para reescribir la forma en su lugar al anexar
+BYTES_ENCABEZADO = 128
+COLUMNAS = (('fechas', 'datetime64[ns]'), ('pesos', np.float64), ('dolares', np.float64))
+
+
+def directorio_cache(ruta_archivo):
+    """Directorio de caché: CACHE_DATOS_DIR o una carpeta junto al libro."""
+    directorio = os.environ.get('CACHE_DATOS_DIR')
+    if directorio:
+        return directorio
+    return os.path.join(os.path.dirname(os.path.abspath(ruta_archivo)), NOMBRE_DIRECTORIO)
+
+
+def carga_incremental():
+    return os.environ.get('CARGA_INCREMENTAL', '1') != '0'
+
+
+def hash_archivo(ruta_archivo, tamaño_bloque=1 << 20):
+    sha = hashlib.sha256()
+    with open(ruta_archivo, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(tamaño_bloque), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def _escribir_json_atomico(ruta, datos):
+    directorio = os.path.dirname(ruta)
+    fd, ruta_tmp = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo, ensure_ascii=False, default=str)
+    os.replace(ruta_tmp, ruta)
+
+
+def _leer_json(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+
+def _matriz_precios(df):
+    # Bloomberg deja textos como "#N/A N/A" en celdas sin precio
+    return df.iloc[:, 1:].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+
+
+def _dataframe_desde_matrices(fechas, matriz, fondos):
+    # Sin copia: el DataFrame queda respaldado por el memory-map de solo lectura
+    df = pd.DataFrame(matriz, columns=fondos, copy=False)
+    df.insert(0, 'Dates', fechas)
+    return df
+
+
+def _encabezado_npy(dtype, forma):
+    texto = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False,
+                  'shape': tuple(forma)})
+    relleno = BYTES_ENCABEZADO - 10 - len(texto) - 1
+    if relleno < 0:
+        raise ValueError(f"Forma demasiado grande para el encabezado .npy: {forma}")
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', BYTES_ENCABEZADO - 10) + (texto + ' ' * relleno + '\n').encode('latin1')
+
+
+def _escribir_columna(ruta, arreglo):
+    arreglo = np.ascontiguousarray(arreglo)
+    with open(ruta, 'wb') as archivo:
+        archivo.write(_encabezado_npy(arreglo.dtype, arreglo.shape))
+        arreglo.tofile(archivo)
+
+
+def _anexar_columna(ruta, filas_previas, nuevas):
+    """Escribe `nuevas` tras las primeras `filas_previas` filas del .npy y actualiza su forma."""
+    nuevas = np.ascontiguousarray(nuevas)
+    bytes_fila = nuevas.dtype.itemsize * int(np.prod(nuevas.shape[1:], dtype=np.int64))
+    with open(ruta, 'r+b') as archivo:
+        # Primero los datos y después la forma: ningún lector ve filas a medio escribir
+        archivo.seek(BYTES_ENCABEZADO + filas_previas * bytes_fila)
+        nuevas.tofile(archivo)
+        archivo.truncate()
+        archivo.flush()
+        archivo.seek(0)
+        archivo.write(_encabezado_npy(nuevas.dtype, (filas_previas + len(nuevas),) + nuevas.shape[1:]))
+
+
+def _mapear(ruta, dtype, forma):
+    if forma[0] == 0:
+        return np.empty(forma, dtype=dtype)
+    return np.memmap(ruta, dtype=dtype, mode='r', offset=BYTES_ENCABEZADO, shape=forma)
+
+
+def _columnas_guardadas(directorio_almacen, filas, fondos):
+    return {
+        nombre: _mapear(os.path.join(directorio_almacen, f'{nombre}.npy'), dtype,
+                        (filas,) if nombre == 'fechas' else (filas, len(fondos)))
+        for nombre, dtype in COLUMNAS
+    }
+
+
+def _cargar_version(directorio_raiz, version):
+    directorio = os.path.join(directorio_raiz, NOMBRE_ALMACEN)
+    metadatos = _leer_json(os.path.join(directorio, ARCHIVO_METADATOS))
+    if not metadatos or metadatos.get('formato') != VERSION_FORMATO:
+        return None
+    registro = metadatos['versiones'].get(version)
+    if registro is None:
+        return None
+
+    # La versión es un prefijo de las matrices: se mapean solo sus filas
+    fondos = metadatos['fondos']
+    columnas = _columnas_guardadas(directorio, registro['filas'], fondos)
+    tac = [np.nan if valor is None else valor for valor in registro['tac']]
+    pesos_df = _dataframe_desde_matrices(columnas['fechas'], columnas['pesos'], fondos)
+    dolares_df = _dataframe_desde_matrices(columnas['fechas'], columnas['dolares'], fondos)
+    return pesos_df, dolares_df, fondos, registro['series'], tac, version
+
+
+def _filas_que_se_conservan(directorio, metadatos, fondos, nuevas):
+    """Filas guardadas que el libro repite sin cambios al comienzo; None si hay que reconstruir."""
+    if not metadatos or metadatos.get('formato') != VERSION_FORMATO:
+        return None
+    if metadatos['fondos'] != list(fondos):
+        print("Cambió la lista de fondos: se reconstruye la caché de datos")
+        return None
+    filas = metadatos['filas']
+    if len(nuevas['fechas']) < filas:
+        print("El libro tiene menos fechas que la caché: se reconstruye")
+        return None
+
+    guardadas = _columnas_guardadas(directorio, filas, fondos)
+    for nombre, _ in COLUMNAS:
+        if not np.array_equal(guardadas[nombre], nuevas[nombre][:filas], equal_nan=nombre != 'fechas'):
+            print(f"Cambiaron datos históricos ({nombre}): se reconstruye la caché de datos")
+            return None
+    return filas
+
+
+def _reconstruir_almacen(directorio_raiz, nuevas, fondos):
+    # Se escribe en un temporal y se reemplaza, así otro worker nunca ve un almacén a medias;
+    # los procesos que tengan mapeado el anterior lo siguen leyendo hasta soltarlo
+    destino = os.path.join(directorio_raiz, NOMBRE_ALMACEN)
+    temporal = tempfile.mkdtemp(dir=directorio_raiz, prefix=f'{NOMBRE_ALMACEN}.tmp')
+    try:
+        for nombre, _ in COLUMNAS:
+            _escribir_columna(os.path.join(temporal, f'{nombre}.npy'), nuevas[nombre])
+        metadatos = {'formato': VERSION_FORMATO, 'fondos': list(fondos), 'filas': 0, 'versiones': {}}
+        if os.path.isdir(destino):
+            descarte = tempfile.mkdtemp(dir=directorio_raiz, prefix='descartar.tmp')
+            os.rename(destino, os.path.join(descarte, NOMBRE_ALMACEN))
+        os.rename(temporal, destino)
+    except OSError:
+        shutil.rmtree(temporal, ignore_errors=True)
+        raise
+    return metadatos
+
+
+def _registrar_version(directorio_raiz, version, pesos_df, dolares_df, fondos, series, tac):
+    """Agrega la versión al almacén anexando sus fechas nuevas o, si no se puede, reconstruyéndolo."""
+    directorio = os.path.join(directorio_raiz, NOMBRE_ALMACEN)
+    nuevas = {
+        'fechas': pesos_df['Dates'].to_numpy(dtype='datetime64[ns]'),
+        'pesos': _matriz_precios(pesos_df),
+        'dolares': _matriz_precios(dolares_df),
+    }
+    metadatos = _leer_json(os.path.join(directorio, ARCHIVO_METADATOS))
+    filas = _filas_que_se_conservan(directorio, metadatos, fondos, nuevas) if carga_incremental() else None
+
+    total = len(nuevas['fechas'])
+    if filas is None:
+        metadatos = _reconstruir_almacen(directorio_raiz, nuevas, fondos)
+        print(f"Caché binaria de datos creada (versión {version})")
+    elif total > filas:
+        for nombre, _ in COLUMNAS:
+            _anexar_columna(os.path.join(directorio, f'{nombre}.npy'), filas, nuevas[nombre][filas:])
+        print(f"Caché binaria de datos: {total - filas} fechas nuevas anexadas (versión {version})")
+
+    # Series y TAC van por versión: cambiarlas no obliga a reescribir los precios
+    versiones = metadatos['versiones']
+    versiones.pop(version, None)
+    versiones[version] = {
+        'filas': total,
+        'series': list(series),
+        'tac': [None if pd.isna(valor) else float(valor) for valor in tac],
+    }
+    for antigua in list(versiones)[:-MAX_VERSIONES]:
+        del versiones[antigua]
+    metadatos['filas'] = total
+    _escribir_json_atomico(os.path.join(directorio, ARCHIVO_METADATOS), metadatos)
+
+
+def _limpiar_directorio(directorio_raiz):
+    # Almacenes descartados y cachés de formatos anteriores
+    for nombre in os.listdir(directorio_raiz):
+        ruta = os.path.join(directorio_raiz, nombre)
+        if nombre != NOMBRE_ALMACEN and os.path.isdir(ruta):
+            shutil.rmtree(ruta, ignore_errors=True)
+
+
+@contextmanager
+def _bloqueo_construccion(directorio_raiz):
+    # Un solo proceso parsea el Excel; los demás esperan y reutilizan su resultado
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(directorio_raiz, exist_ok=True)
+    with open(os.path.join(directorio_raiz, '.bloqueo'), 'w') as archivo:
+        fcntl.flock(archivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+def _cargar_o_construir(directorio_raiz, version, ruta_archivo, cargador):
+    try:
+        datos = _cargar_version(directorio_raiz, version)
+    except (OSError, ValueError, KeyError):
+        datos = None
+    if datos is not None:
+        print(f"Datos cargados desde caché binaria (versión {version})")
+        return datos
+
+    pesos_df, dolares_df, fondos, series, tac = cargador(ruta_archivo)
+    if pesos_df is None:
+        return None, None, [], [], [], None
+    try:
+        os.makedirs(directorio_raiz, exist_ok=True)
+        _registrar_version(directorio_raiz, version, pesos_df, dolares_df, fondos, series, tac)
+        _limpiar_directorio(directorio_raiz)
+        return _cargar_version(directorio_raiz, version)
+    except (OSError, ValueError) as e:
+        print(f"No se pudo escribir la caché de datos: {e}")
+        return pesos_df, dolares_df, fondos, series, tac, version
+
+
+def cargar_con_cache(ruta_archivo, cargador):
+    """
+    Devuelve (pesos_df, dolares_df, fondos, series, tac, version) del libro.
+
+    Usa la caché binaria si corresponde al contenido actual del libro; si no,
+    llama a `cargador(ruta_archivo)` para parsear el Excel y guarda el
+    resultado en la caché para los próximos arranques.
+    """
+    directorio_raiz = directorio_cache(ruta_archivo)
+    ruta_puntero = os.path.join(directorio_raiz, ARCHIVO_PUNTERO)
+    estado = os.stat(ruta_archivo)
+
+    # Verificación rápida: mismo mtime y tamaño que la última versión cacheada
+    puntero = _leer_json(ruta_puntero)
+    if (puntero and puntero.get('mtime_ns') == estado.st_mtime_ns
+            and puntero.get('tamaño') == estado.st_size):
+        try:
+            datos = _cargar_version(directorio_raiz, puntero['version'])
+            if datos is not None:
+                print(f"Datos cargados desde caché binaria (versión {puntero['version']})")
+                return datos
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Caché de datos inválida, se reconstruye: {e}")
+
+    version = hash_archivo(ruta_archivo)[:16]
+    try:
+        with _bloqueo_construccion(directorio_raiz):
+            datos = _cargar_o_construir(directorio_raiz, version, ruta_archivo, cargador)
+    except OSError as e:
+        print(f"Caché de datos no disponible: {e}")
+        pesos_df, dolares_df, fondos, series, tac = cargador(ruta_archivo)
+        return pesos_df, dolares_df, fondos, series, tac, version
+    if datos[0] is None:
+        return datos
+
+    try:
+        _escribir_json_atomico(ruta_puntero, {
+            'version': version,
+            'mtime_ns': estado.st_mtime_ns,
+            'tamaño': estado.st_size,
+        })
+    except OSError as e:
+        print(f"No se pudo actualizar el puntero de caché: {e}")
+
+    return datos
@@ -0,0 +1,294 @@
+"""
+Lectura del libro rentabilidades.xlsx.
+
+Separado de app.py para que el proceso maestro de gunicorn (o cualquier
+herramienta) pueda cargar los datos sin construir la aplicación Dash.
+
+El lector por defecto recorre las hojas en modo streaming de openpyxl y
+vuelca las filas en matrices NumPy, sin el modelo de objetos completo del
+libro que arma pd.read_excel. Ese lector anterior sigue disponible con
+LECTOR_EXCEL=pandas.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+import cache_datos
+
+try:
+    import resource
+except ImportError:  # Windows: sin pico de memoria
+    resource = None
+
+MB = 1024 * 1024
+
+# Función para parsear el libro Excel (sin caché)
+def leer_libro_excel(ruta_archivo):
+    nombres_df = pd.read_excel(ruta_archivo, sheet_name='nombres', 
+                             header=None, engine='openpyxl')
+    pesos_df = pd.read_excel(ruta_archivo, sheet_name='Pesos', 
+                           skiprows=7, engine='openpyxl')
+    dolares_df = pd.read_excel(ruta_archivo, sheet_name='Dolares', 
+                             skiprows=7, engine='openpyxl')
+    
+    fondos_raw = nombres_df.iloc[0, :].tolist()
+    series_raw = nombres_df.iloc[2, :].tolist()
+    
+    fondos = [f for f in fondos_raw if pd.notna(f)]
+    series = [s for s in series_raw if pd.notna(s)]
+    
+    nuevas_columnas = ['Dates'] + fondos
+    
+    if len(nuevas_columnas) == len(pesos_df.columns):
+        pesos_df.columns = nuevas_columnas
+        dolares_df.columns = nuevas_columnas
+    else:
+        print(f"Error: Longitud columnas no coincide")
+        return None, None, [], [], []
+    
+    pesos_df['Dates'] = pd.to_datetime(pesos_df['Dates'])
+    dolares_df['Dates'] = pd.to_datetime(dolares_df['Dates'])
+    
+    tac = leer_tac(ruta_archivo, series)
+    
+    return pesos_df, dolares_df, fondos, series, tac
+
+# Hoja opcional "TAC": columna A con el código de serie y columna B con la TAC (%)
+def leer_tac(ruta_archivo, series):
+    try:
+        tac_df = pd.read_excel(ruta_archivo, sheet_name='TAC', engine='openpyxl')
+    except ValueError:
+        print("Aviso: el libro no tiene hoja TAC; la columna TAC quedará vacía")
+        return [np.nan] * len(series)
+    
+    valores = pd.to_numeric(tac_df.iloc[:, 1], errors='coerce') if tac_df.shape[1] > 1 else []
+    return _tac_de_series(zip(tac_df.iloc[:, 0], valores), series)
+
+def _tac_de_series(pares, series):
+    tac_por_serie = {str(serie).strip(): valor for serie, valor in pares}
+    return [tac_por_serie.get(str(serie).strip(), np.nan) for serie in series]
+
+# Lector por defecto; LECTOR_EXCEL=pandas usa el anterior (pd.read_excel), para comparar
+LECTORES = ('streaming', 'pandas')
+HOJAS_PRECIOS = ('Pesos', 'Dolares')
+# Las hojas de precios traen 7 filas de Bloomberg antes de la fila de encabezados
+FILAS_PREVIAS_PRECIOS = 7
+# Bajo este tamaño el arranque de los procesos cuesta más que lo que se gana
+MIN_BYTES_PARALELO = 2 * 1024 * 1024
+
+def _a_numero(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return np.nan
+
+def leer_hoja_precios(ruta_archivo, hoja):
+    """
+    Encabezado, fechas y matriz de precios de una hoja, sin construir el libro completo.
+
+    Abre el libro en modo solo lectura y vuelca cada fila directamente en una
+    matriz float64 preasignada (se duplica si la hoja no declara su tamaño).
+    Las celdas no numéricas ("#N/A N/A") quedan como NaN y se descartan las
+    filas vacías del final, igual que pd.read_excel.
+    """
+    libro = load_workbook(ruta_archivo, read_only=True, data_only=True)
+    try:
+        hoja_precios = libro[hoja]
+        filas = hoja_precios.iter_rows(min_row=FILAS_PREVIAS_PRECIOS + 1, values_only=True)
+        encabezado = list(next(filas, ()))
+        while encabezado and encabezado[-1] is None:
+            encabezado.pop()
+        ancho = max(len(encabezado) - 1, 0)
+
+        capacidad = max((hoja_precios.max_row or 0) - FILAS_PREVIAS_PRECIOS - 1, 1024)
+        valores = np.empty((capacidad, ancho), dtype=np.float64)
+        fechas = []
+        n = 0
+        ultima_con_datos = 0
+        for fila in filas:
+            if n == len(valores):
+                valores = np.concatenate([valores, np.empty_like(valores)])
+            precios = fila[1:ancho + 1]
+            try:
+                # None queda como NaN; los textos de Bloomberg obligan a convertir celda a celda
+                valores[n, :len(precios)] = precios
+            except (TypeError, ValueError):
+                valores[n, :len(precios)] = [_a_numero(valor) for valor in precios]
+            if len(precios) < ancho:
+                valores[n, len(precios):] = np.nan
+            fechas.append(fila[0] if fila else None)
+            n += 1
+            if any(valor is not None for valor in fila[:ancho + 1]):
+                ultima_con_datos = n
+    finally:
+        libro.close()
+
+    valores = valores[:ultima_con_datos]
+    if ultima_con_datos < capacidad:
+        valores = valores.copy()
+    return encabezado, fechas[:ultima_con_datos], valores
+
+def _fechas(fechas):
+    return np.asarray(pd.to_datetime(fechas), dtype='datetime64[ns]')
+
+def _leer_nombres_y_tac(ruta_archivo):
+    libro = load_workbook(ruta_archivo, read_only=True, data_only=True)
+    try:
+        filas_nombres = list(libro['nombres'].iter_rows(max_row=3, values_only=True))
+        filas_nombres += [()] * (3 - len(filas_nombres))
+        fondos = [f for f in filas_nombres[0] if pd.notna(f)]
+        series = [s for s in filas_nombres[2] if pd.notna(s)]
+
+        if 'TAC' not in libro.sheetnames:
+            print("Aviso: el libro no tiene hoja TAC; la columna TAC quedará vacía")
+            return fondos, series, [np.nan] * len(series)
+        pares = [(fila[0], _a_numero(fila[1]) if len(fila) > 1 else np.nan)
+                 for fila in libro['TAC'].iter_rows(min_row=2, values_only=True) if fila]
+        return fondos, series, _tac_de_series(pares, series)
+    finally:
+        libro.close()
+
+def _leer_hojas_en_procesos(ruta_archivo):
+    """Lee cada hoja de precios en un proceso hijo; devuelve {hoja: (encabezado, fechas, valores)}."""
+    temporal = tempfile.mkdtemp(prefix='lectura_libro_')
+    try:
+        procesos = {
+            hoja: subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), hoja, os.path.abspath(ruta_archivo),
+                 os.path.join(temporal, hoja)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            )
+            for hoja in HOJAS_PRECIOS
+        }
+        # Mientras tanto este proceso lee los nombres y la TAC
+        nombres_y_tac = _leer_nombres_y_tac(ruta_archivo)
+        hojas = {}
+        for hoja, proceso in procesos.items():
+            _, error = proceso.communicate()
+            if proceso.returncode != 0:
+                raise RuntimeError(f"falló la lectura de la hoja {hoja}: {error.decode(errors='replace')[-500:]}")
+            destino = os.path.join(temporal, hoja)
+            with open(f'{destino}.json', encoding='utf-8') as archivo:
+                encabezado = json.load(archivo)
+            hojas[hoja] = (encabezado, np.load(f'{destino}.fechas.npy'), np.load(f'{destino}.valores.npy'))
+        return nombres_y_tac, hojas
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+def _guardar_hoja(ruta_archivo, hoja, destino):
+    encabezado, fechas, valores = leer_hoja_precios(ruta_archivo, hoja)
+    np.save(f'{destino}.valores.npy', valores)
+    np.save(f'{destino}.fechas.npy', _fechas(fechas))
+    with open(f'{destino}.json', 'w', encoding='utf-8') as archivo:
+        json.dump([str(nombre) for nombre in encabezado], archivo, ensure_ascii=False)
+
+def leer_en_paralelo(ruta_archivo):
+    if os.environ.get('LECTOR_EXCEL_PARALELO', '1') == '0' or (os.cpu_count() or 1) < 2:
+        return False
+    return os.path.getsize(ruta_archivo) >= MIN_BYTES_PARALELO
+
+def leer_libro_streaming(ruta_archivo):
+    """
+    Misma salida que leer_libro_excel, con el libro en modo streaming.
+
+    "Pesos" y "Dolares" se leen a la vez en dos procesos hijos si hay más
+    de un núcleo y el libro es grande (LECTOR_EXCEL_PARALELO=0 lo desactiva);
+    si no, una tras otra en este proceso.
+    """
+    hojas = None
+    if leer_en_paralelo(ruta_archivo):
+        try:
+            (fondos, series, tac), hojas = _leer_hojas_en_procesos(ruta_archivo)
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"Lectura en paralelo no disponible ({e}); se lee en este proceso")
+    if hojas is None:
+        fondos, series, tac = _leer_nombres_y_tac(ruta_archivo)
+        hojas = {hoja: leer_hoja_precios(ruta_archivo, hoja) for hoja in HOJAS_PRECIOS}
+
+    nuevas_columnas = ['Dates'] + fondos
+    precios = []
+    for hoja in HOJAS_PRECIOS:
+        encabezado, fechas, valores = hojas[hoja]
+        if len(nuevas_columnas) != len(encabezado):
+            print("Error: Longitud columnas no coincide")
+            return None, None, [], [], []
+        # Sin copia: el DataFrame queda respaldado por la matriz ya leída
+        df = pd.DataFrame(valores, columns=fondos, copy=False)
+        df.insert(0, 'Dates', _fechas(fechas))
+        precios.append(df)
+
+    return precios[0], precios[1], fondos, series, tac
+
+def pico_rss_mb(hijos=False):
+    """Pico de memoria residente del proceso (o de sus hijos ya terminados) en MB; None fuera de Unix."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_CHILDREN if hijos else resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB y macOS bytes
+    return pico / MB if sys.platform == 'darwin' else pico / 1024
+
+def leer_libro(ruta_archivo):
+    """Parsea el libro con el lector de LECTOR_EXCEL e informa el tiempo y el pico de memoria."""
+    lector = os.environ.get('LECTOR_EXCEL', 'streaming').lower()
+    if lector not in LECTORES:
+        print(f"Aviso: LECTOR_EXCEL={lector} no existe; se usa streaming")
+        lector = 'streaming'
+
+    inicio = time.perf_counter()
+    resultado = leer_libro_streaming(ruta_archivo) if lector == 'streaming' else leer_libro_excel(ruta_archivo)
+    duracion = time.perf_counter() - inicio
+    pico, pico_hijos = pico_rss_mb(), pico_rss_mb(hijos=True)
+    memoria = '' if pico is None else f", pico RSS {pico:.0f} MB" + (f" (hijos {pico_hijos:.0f} MB)" if pico_hijos else '')
+    print(f"Libro leído con el lector {lector} en {duracion:.2f} s{memoria}")
+    return resultado
+
+# Función para ubicar el libro de datos (RUTA_DATOS tiene prioridad si está definida)
+def buscar_archivo_datos():
+    ruta_entorno = os.environ.get('RUTA_DATOS')
+    if ruta_entorno:
+        if os.path.exists(ruta_entorno):
+            return ruta_entorno
+        print(f"Error: RUTA_DATOS apunta a un archivo inexistente: {ruta_entorno}")
+        return None
+    
+    posibles_rutas = [
+        'data/rentabilidades.xlsx',          # Para deployment
+        './data/rentabilidades.xlsx',       # Local relativa
+        '../data/rentabilidades.xlsx',      # Backup
+        'rentabilidades.xlsx'                # Si está en raíz
+    ]
+    
+    for ruta in posibles_rutas:
+        if os.path.exists(ruta):
+            return ruta
+    
+    print("Error: No se encontró el archivo rentabilidades.xlsx")
+    return None
+
+# Función para cargar y procesar datos (usa la caché binaria de cache_datos)
+def cargar_datos_optimizado(ruta_archivo=None):
+    try:
+        if ruta_archivo is None:
+            ruta_archivo = buscar_archivo_datos()
+        if ruta_archivo is None:
+            return None, None, [], [], [], None
+        
+        print(f"Cargando archivo desde: {ruta_archivo}")
+        
+        return cache_datos.cargar_con_cache(ruta_archivo, leer_libro)
+        
+    except Exception as e:
+        print(f"Error cargando datos: {e}")
+        return None, None, [], [], [], None
+
+if __name__ == '__main__':
+    # Uso interno de _leer_hojas_en_procesos: python carga_datos.py HOJA LIBRO DESTINO
+    _guardar_hoja(sys.argv[2], sys.argv[1], sys.argv[3])
@@ -0,0 +1,26 @@
+"""
+Configuración de gunicorn (se lee automáticamente desde el directorio de trabajo).
+
+El proceso maestro hace el paso de carga una sola vez antes de crear los
+workers: prepara la caché binaria del libro y, con DATOS_COMPARTIDOS=1,
+publica las matrices de precios en memoria compartida para que los workers
+las adjunten sin copiarlas. También vacía METRICAS_DIR para que /metrics no
+sume contadores de una ejecución anterior.
+
+Con CARGA_EN_SEGUNDO_PLANO=1 se omite el paso de carga: el maestro abre el
+puerto de inmediato y cada worker carga los datos en un hilo.
+"""
+import os
+
+import memoria_compartida
+import metricas
+
+
+def on_starting(server):
+    metricas.limpiar_directorio()
+    if os.environ.get('CARGA_EN_SEGUNDO_PLANO') != '1':
+        memoria_compartida.precargar()
+
+
+def post_worker_init(worker):
+    memoria_compartida.reportar_memoria('worker')
@@ -0,0 +1,171 @@
+"""
+Memoización de resultados de callbacks con backend configurable.
+
+La clave combina el nombre del callback, la moneda, la tupla ordenada de
+fondos y la versión de datos, así una recarga del libro invalida todo sin
+borrar nada: las entradas viejas simplemente salen por LRU.
+
+Backends (variable MEMO_BACKEND):
+- memoria: diccionario LRU dentro del proceso (un solo worker)
+- disco:   SQLite compartido por todos los workers de gunicorn (MEMO_RUTA)
+- ninguno: sin memoización
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoriaLRU:
+    nombre = 'memoria'
+
+    def __init__(self, max_entradas=256):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._bloqueo = threading.Lock()
+
+    def obtener(self, clave):
+        with self._bloqueo:
+            if clave not in self._entradas:
+                return None
+            self._entradas.move_to_end(clave)
+            return self._entradas[clave]
+
+    def guardar(self, clave, valor):
+        with self._bloqueo:
+            self._entradas[clave] = valor
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def tamaño(self):
+        return len(self._entradas)
+
+
+class DiscoLRU:
+    """LRU en SQLite; los valores se guardan como JSON."""
+    nombre = 'disco'
+
+    def __init__(self, ruta, max_entradas=2048):
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        self._local = threading.local()
+
+    def _conexion(self):
+        # Una conexión por hilo y por proceso (los workers se crean con fork)
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None or self._local.pid != os.getpid():
+            conexion = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            conexion.execute(
+                'CREATE TABLE IF NOT EXISTS memo '
+                '(clave TEXT PRIMARY KEY, valor TEXT NOT NULL, uso REAL NOT NULL)'
+            )
+            conexion.execute('CREATE INDEX IF NOT EXISTS memo_uso ON memo (uso)')
+            self._local.conexion = conexion
+            self._local.pid = os.getpid()
+        return conexion
+
+    def obtener(self, clave):
+        conexion = self._conexion()
+        fila = conexion.execute('SELECT valor FROM memo WHERE clave = ?', (clave,)).fetchone()
+        if fila is None:
+            return None
+        conexion.execute('UPDATE memo SET uso = ? WHERE clave = ?', (time.time(), clave))
+        return json.loads(fila[0])
+
+    def guardar(self, clave, valor):
+        conexion = self._conexion()
+        conexion.execute(
+            'INSERT OR REPLACE INTO memo (clave, valor, uso) VALUES (?, ?, ?)',
+            (clave, json.dumps(valor), time.time())
+        )
+        conexion.execute(
+            'DELETE FROM memo WHERE clave IN '
+            '(SELECT clave FROM memo ORDER BY uso DESC LIMIT -1 OFFSET ?)',
+            (self.max_entradas,)
+        )
+
+    def tamaño(self):
+        return self._conexion().execute('SELECT COUNT(*) FROM memo').fetchone()[0]
+
+
+class Memoizador:
+    """Envuelve un backend y lleva estadísticas de aciertos y fallos del proceso."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.aciertos = 0
+        self.fallos = 0
+        self.errores = 0
+        # Los hilos de gthread cuentan a la vez; += sin bloqueo pierde incrementos
+        self._bloqueo = threading.Lock()
+
+    def _contar(self, contador):
+        with self._bloqueo:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+    @staticmethod
+    def clave(callback, moneda, fondos, version):
+        return json.dumps([callback, moneda, sorted(fondos), version], ensure_ascii=False)
+
+    def obtener(self, clave, calcular):
+        if self.backend is None:
+            return calcular()
+
+        try:
+            valor = self.backend.obtener(clave)
+        except sqlite3.Error as e:
+            self._contar('errores')
+            print(f"Error leyendo memoización: {e}")
+            valor = None
+
+        if valor is not None:
+            self._contar('aciertos')
+            return valor
+
+        self._contar('fallos')
+        valor = calcular()
+        try:
+            self.backend.guardar(clave, valor)
+        except sqlite3.Error as e:
+            self._contar('errores')
+            print(f"Error guardando memoización: {e}")
+        return valor
+
+    def estadisticas(self):
+        with self._bloqueo:
+            aciertos, fallos, errores = self.aciertos, self.fallos, self.errores
+        consultas = aciertos + fallos
+        try:
+            entradas = self.backend.tamaño() if self.backend is not None else 0
+        except sqlite3.Error:
+            entradas = None
+        return {
+            'backend': self.backend.nombre if self.backend is not None else 'ninguno',
+            'pid': os.getpid(),
+            'aciertos': aciertos,
+            'fallos': fallos,
+            'errores': errores,
+            'tasa_aciertos': round(aciertos / consultas, 4) if consultas else None,
+            'entradas': entradas,
+            'max_entradas': self.backend.max_entradas if self.backend is not None else 0,
+        }
+
+
+def crear_memoizador_desde_entorno():
+    tipo = os.environ.get('MEMO_BACKEND', 'memoria').lower()
+    max_entradas = int(os.environ.get('MEMO_MAX_ENTRADAS', 256))
+
+    if tipo == 'disco':
+        ruta = os.environ.get('MEMO_RUTA') or os.path.join(
+            tempfile.gettempdir(), 'panel_rentabilidad_memo.sqlite3'
+        )
+        return Memoizador(DiscoLRU(ruta, max_entradas))
+    if tipo == 'ninguno':
+        return Memoizador(None)
+    return Memoizador(MemoriaLRU(max_entradas))
@@ -0,0 +1,153 @@
+"""
+Modo de memoria compartida entre los workers de gunicorn.
+
+Sin este modo cada worker construye su propia copia de las matrices de
+precios. Con DATOS_COMPARTIDOS=1, un paso de carga (el proceso maestro vía
+gunicorn.conf.py, o el primer worker que llegue) escribe las matrices
+alineadas y el índice de fechas de cada versión de datos como .npy en un
+directorio de memoria (/dev/shm por defecto) y los workers las abren con
+memory-map de solo lectura: todas comparten las mismas páginas físicas.
+"""
+import os
+import shutil
+import tempfile
+
+from motor_rentabilidades import MatrizPrecios
+
+DIRECTORIO_POR_DEFECTO = '/dev/shm/panel_rentabilidad'
+
+# Matrices adjuntas en este proceso, para el reporte de memoria
+_adjuntas = {}
+
+
+def directorio_compartido():
+    """Directorio del segmento compartido, o None si el modo está desactivado."""
+    if os.environ.get('DATOS_COMPARTIDOS', '').lower() not in ('1', 'true', 'si'):
+        return None
+    return os.environ.get('DATOS_COMPARTIDOS_DIR', DIRECTORIO_POR_DEFECTO)
+
+
+def _ruta_matriz(directorio, version, moneda):
+    return os.path.join(directorio, version, moneda)
+
+
+def publicar_matriz(version, moneda, matriz):
+    directorio = directorio_compartido()
+    destino = _ruta_matriz(directorio, version, moneda)
+    if os.path.isdir(destino):
+        return destino
+
+    padre = os.path.dirname(destino)
+    os.makedirs(padre, exist_ok=True)
+    temporal = tempfile.mkdtemp(dir=padre, prefix=f'.{moneda}.tmp')
+    try:
+        matriz.guardar(temporal)
+        os.rename(temporal, destino)
+    except OSError:
+        shutil.rmtree(temporal, ignore_errors=True)
+        if not os.path.isdir(destino):
+            raise
+    return destino
+
+
+def adjuntar_matriz(version, moneda):
+    ruta = _ruta_matriz(directorio_compartido(), version, moneda)
+    if not os.path.isdir(ruta):
+        return None
+    return MatrizPrecios.abrir(ruta)
+
+
+def obtener_matriz(version, moneda, construir):
+    """
+    Devuelve la MatrizPrecios de (version, moneda).
+
+    En modo compartido se adjunta la matriz publicada; si aún no existe se
+    construye con `construir()`, se publica y se vuelve a abrir desde el
+    segmento para no quedarse con la copia privada.
+    """
+    directorio = directorio_compartido()
+    if directorio is None or version is None:
+        return construir()
+
+    try:
+        matriz = adjuntar_matriz(version, moneda)
+        if matriz is None:
+            publicar_matriz(version, moneda, construir())
+            limpiar(version)
+            matriz = adjuntar_matriz(version, moneda)
+    except OSError as e:
+        print(f"Memoria compartida no disponible ({e}); se usa una copia privada")
+        return construir()
+
+    for clave in [c for c in _adjuntas if c[0] != version]:
+        del _adjuntas[clave]
+    _adjuntas[(version, moneda)] = matriz
+    return matriz
+
+
+def limpiar(version_vigente):
+    """
+    Elimina del segmento las versiones publicadas antes que la vigente.
+
+    Los workers que aún tienen abierta una versión eliminada no se ven
+    afectados: las páginas se liberan cuando cierran su memory-map.
+    """
+    directorio = directorio_compartido()
+    if directorio is None or not os.path.isdir(directorio):
+        return
+    vigente = os.path.join(directorio, version_vigente)
+    if not os.path.isdir(vigente):
+        return
+    publicada = os.stat(vigente).st_mtime
+    for nombre in os.listdir(directorio):
+        ruta = os.path.join(directorio, nombre)
+        if nombre != version_vigente and os.path.isdir(ruta) and os.stat(ruta).st_mtime < publicada:
+            shutil.rmtree(ruta, ignore_errors=True)
+
+
+def precargar():
+    """
+    Paso de carga previo a los workers (proceso maestro).
+
+    Deja lista la caché binaria del libro y, en modo compartido, publica las
+    matrices de ambas monedas para que los workers solo tengan que adjuntarlas.
+    """
+    from carga_datos import cargar_datos_optimizado
+
+    pesos_df, dolares_df, fondos, series, tac, version = cargar_datos_optimizado()
+    if pesos_df is None or directorio_compartido() is None:
+        return version
+
+    for moneda, df in (('CLP', pesos_df), ('USD', dolares_df)):
+        publicar_matriz(version, moneda, MatrizPrecios.desde_dataframe(df))
+    limpiar(version)
+    print(f"Matrices de precios publicadas en {directorio_compartido()} (versión {version})")
+    return version
+
+
+def memoria_proceso():
+    """RSS del proceso desglosada según /proc/self/status (bytes; vacío fuera de Linux)."""
+    campos = {'VmRSS': 'rss', 'RssAnon': 'rss_anonima', 'RssFile': 'rss_archivos', 'RssShmem': 'rss_compartida'}
+    memoria = {}
+    try:
+        with open('/proc/self/status') as archivo:
+            for linea in archivo:
+                nombre, _, valor = linea.partition(':')
+                if nombre in campos:
+                    memoria[campos[nombre]] = int(valor.split()[0]) * 1024
+    except OSError:
+        pass
+    return memoria
+
+
+def reportar_memoria(etiqueta):
+    mb = 1024 * 1024
+    memoria = memoria_proceso()
+    compartidos = sum(matriz.bytes_arreglos() for matriz in _adjuntas.values())
+    print(
+        f"[{etiqueta} pid={os.getpid()}] RSS {memoria.get('rss', 0) / mb:.1f} MB "
+        f"(privada {memoria.get('rss_anonima', 0) / mb:.1f} MB, "
+        f"compartida {memoria.get('rss_compartida', 0) / mb:.1f} MB); "
+        f"ahorro por worker: {compartidos / mb:.1f} MB de matrices adjuntas sin copia"
+    )
+    return {**memoria, 'bytes_compartidos': compartidos}
@@ -0,0 +1,290 @@
+"""
+Métricas de callbacks y de carga de datos en formato de texto de Prometheus.
+
+Los hooks de Flask alrededor de /_dash-update-component registran, por
+callback, el tiempo de reloj, el tiempo de CPU del hilo, el tamaño de la
+respuesta y las excepciones. La carga de datos se lee de la instantánea
+vigente al momento de cada consulta a /metrics.
+
+Con varios workers de gunicorn cada proceso tiene sus propios contadores.
+Si METRICAS_DIR está definida, cada proceso vuelca los suyos a ese
+directorio (un hilo por proceso, cada segundo si hubo cambios) y /metrics suma los de todos los
+workers; gunicorn.conf.py lo vacía al arrancar.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, g, request
+
+CUBETAS_DURACION = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CUBETAS_BYTES = (1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)
+
+DESCRIPCIONES = {
+    'panel_callback_solicitudes_total': ('counter', 'Solicitudes a callbacks por callback y resultado'),
+    'panel_callback_duracion_segundos': ('histogram', 'Tiempo de reloj de cada solicitud de callback'),
+    'panel_callback_cpu_segundos_total': ('counter', 'Tiempo de CPU del hilo consumido por callback'),
+    'panel_callback_respuesta_bytes': ('histogram', 'Tamaño de la respuesta de cada callback'),
+    'panel_callback_excepciones_total': ('counter', 'Excepciones no controladas por callback y tipo'),
+}
+
+INTERVALO_VOLCADO = 1.0
+
+
+class RegistroMetricas:
+    """Contadores e histogramas del proceso, con etiquetas como tuplas ordenadas."""
+
+    def __init__(self):
+        self._bloqueo = threading.Lock()
+        self.contadores = defaultdict(float)
+        self.histogramas = {}
+        self._sucio = False
+        self._pid_volcado = None
+
+    def incrementar(self, nombre, etiquetas, valor=1):
+        with self._bloqueo:
+            self._sucio = True
+            self.contadores[(nombre, tuple(sorted(etiquetas.items())))] += valor
+
+    def observar(self, nombre, etiquetas, valor, cubetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._bloqueo:
+            self._sucio = True
+            histograma = self.histogramas.get(clave)
+            if histograma is None:
+                histograma = self.histogramas[clave] = {'cubetas': list(cubetas), 'conteos': [0] * len(cubetas),
+                                                        'suma': 0.0, 'cuenta': 0}
+            for i, limite in enumerate(cubetas):
+                if valor <= limite:
+                    histograma['conteos'][i] += 1
+                    break
+            histograma['suma'] += valor
+            histograma['cuenta'] += 1
+
+    def exportar(self):
+        with self._bloqueo:
+            return {
+                'contadores': [[n, list(e), v] for (n, e), v in self.contadores.items()],
+                'histogramas': [[n, list(e), dict(h, conteos=list(h['conteos']))]
+                                for (n, e), h in self.histogramas.items()],
+            }
+
+    def volcar(self, directorio):
+        """Escribe las métricas del proceso en `directorio` (multi-worker)."""
+        self._sucio = False
+        os.makedirs(directorio, exist_ok=True)
+        ruta = os.path.join(directorio, f'{os.getpid()}.json')
+        temporal = f'{ruta}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            json.dump(self.exportar(), archivo, ensure_ascii=False)
+        os.replace(temporal, ruta)
+
+    def iniciar_volcado(self, directorio):
+        # Un hilo por proceso: tras el fork de gunicorn el del maestro no existe
+        if self._pid_volcado == os.getpid():
+            return
+        with self._bloqueo:
+            if self._pid_volcado == os.getpid():
+                return
+            self._pid_volcado = os.getpid()
+        threading.Thread(target=self._volcar_periodicamente, args=(directorio,),
+                         name='volcado-metricas', daemon=True).start()
+
+    def _volcar_periodicamente(self, directorio):
+        while True:
+            time.sleep(INTERVALO_VOLCADO)
+            if not self._sucio:
+                continue
+            try:
+                self.volcar(directorio)
+            except OSError as e:
+                print(f"No se pudieron volcar las métricas: {e}")
+
+
+registro = RegistroMetricas()
+
+
+def directorio_metricas():
+    return os.environ.get('METRICAS_DIR') or None
+
+
+def limpiar_directorio():
+    """Borra los volcados de una ejecución anterior (se llama desde el maestro de gunicorn)."""
+    directorio = directorio_metricas()
+    if directorio is None or not os.path.isdir(directorio):
+        return
+    for nombre in os.listdir(directorio):
+        if nombre.endswith('.json') or nombre.endswith('.tmp'):
+            os.remove(os.path.join(directorio, nombre))
+
+
+def _combinar(exportados):
+    contadores = defaultdict(float)
+    histogramas = {}
+    for datos in exportados:
+        for nombre, etiquetas, valor in datos['contadores']:
+            contadores[(nombre, tuple(tuple(e) for e in etiquetas))] += valor
+        for nombre, etiquetas, h in datos['histogramas']:
+            clave = (nombre, tuple(tuple(e) for e in etiquetas))
+            if clave not in histogramas:
+                histogramas[clave] = dict(h, conteos=list(h['conteos']))
+                continue
+            acumulado = histogramas[clave]
+            acumulado['conteos'] = [a + b for a, b in zip(acumulado['conteos'], h['conteos'])]
+            acumulado['suma'] += h['suma']
+            acumulado['cuenta'] += h['cuenta']
+    return contadores, histogramas
+
+
+def _metricas_procesos():
+    directorio = directorio_metricas()
+    if directorio is None:
+        return [registro.exportar()]
+
+    registro.volcar(directorio)
+    exportados = []
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directorio, nombre), encoding='utf-8') as archivo:
+                exportados.append(json.load(archivo))
+        except (OSError, ValueError):
+            continue
+    return exportados
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _etiquetas(etiquetas, extra=None):
+    pares = list(etiquetas) + ([extra] if extra else [])
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in pares) + '}'
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def texto_prometheus(almacen):
+    contadores, histogramas = _combinar(_metricas_procesos())
+    lineas = []
+
+    for nombre, (tipo, ayuda) in DESCRIPCIONES.items():
+        lineas.append(f'# HELP {nombre} {ayuda}')
+        lineas.append(f'# TYPE {nombre} {tipo}')
+        if tipo == 'counter':
+            for (n, etiquetas), valor in sorted(contadores.items()):
+                if n == nombre:
+                    lineas.append(f'{nombre}{_etiquetas(etiquetas)} {_numero(valor)}')
+        else:
+            for (n, etiquetas), h in sorted(histogramas.items()):
+                if n != nombre:
+                    continue
+                acumulado = 0
+                for limite, conteo in zip(h['cubetas'], h['conteos']):
+                    acumulado += conteo
+                    lineas.append(f'{nombre}_bucket{_etiquetas(etiquetas, ("le", _numero(limite)))} {acumulado}')
+                lineas.append(f'{nombre}_bucket{_etiquetas(etiquetas, ("le", "+Inf"))} {h["cuenta"]}')
+                lineas.append(f'{nombre}_sum{_etiquetas(etiquetas)} {_numero(h["suma"])}')
+                lineas.append(f'{nombre}_count{_etiquetas(etiquetas)} {h["cuenta"]}')
+
+    lineas.extend(_metricas_datos(almacen))
+    return '\n'.join(lineas) + '\n'
+
+
+def _metricas_datos(almacen):
+    """Estado de la carga de datos del proceso que responde."""
+    lineas = [
+        '# HELP panel_datos_cargas_fallidas_total Cargas del libro que fallaron',
+        '# TYPE panel_datos_cargas_fallidas_total counter',
+        f'panel_datos_cargas_fallidas_total {almacen.cargas_fallidas}',
+    ]
+    datos = almacen.actual()
+    if datos is None:
+        return lineas
+
+    lineas += [
+        '# HELP panel_datos_version_info Versión (hash del libro) de los datos vigentes',
+        '# TYPE panel_datos_version_info gauge',
+        f'panel_datos_version_info{_etiquetas([("version", datos.version)])} 1',
+        '# HELP panel_datos_carga_duracion_segundos Duración de la carga de la versión vigente',
+        '# TYPE panel_datos_carga_duracion_segundos gauge',
+        f'panel_datos_carga_duracion_segundos {_numero(datos.duracion_carga or 0.0)}',
+        '# HELP panel_datos_cargados_timestamp_segundos Momento en que se publicó la versión vigente',
+        '# TYPE panel_datos_cargados_timestamp_segundos gauge',
+        f'panel_datos_cargados_timestamp_segundos {_numero(datos.cargada_en)}',
+        '# HELP panel_datos_fondos Fondos en los datos vigentes',
+        '# TYPE panel_datos_fondos gauge',
+        f'panel_datos_fondos {len(datos.fondos)}',
+        '# HELP panel_datos_filas Fechas (filas) de precios por moneda',
+        '# TYPE panel_datos_filas gauge',
+    ]
+    for moneda in ('CLP', 'USD'):
+        lineas.append(f'panel_datos_filas{_etiquetas([("moneda", moneda)])} {len(datos.precios(moneda))}')
+    return lineas
+
+
+def nombre_callback(app_dash, cuerpo):
+    # Solo nombres de callbacks registrados, para no abrir etiquetas con entradas arbitrarias
+    salida = (cuerpo or {}).get('output')
+    callback = app_dash.callback_map.get(salida, {}).get('callback') if isinstance(salida, str) else None
+    return getattr(callback, '__name__', 'desconocido')
+
+
+def instrumentar(app_dash, almacen, ruta='/metrics'):
+    """Registra los hooks de medición de callbacks y la ruta de métricas en el servidor Flask."""
+    server = app_dash.server
+    prefijo = app_dash.config.routes_pathname_prefix
+
+    @server.before_request
+    def _iniciar_medicion():
+        if request.path == f'{prefijo}_dash-update-component':
+            g.medicion_callback = (
+                nombre_callback(app_dash, request.get_json(silent=True)),
+                time.perf_counter(),
+                time.thread_time(),
+            )
+
+    @server.after_request
+    def _registrar_medicion(respuesta):
+        medicion = g.pop('medicion_callback', None)
+        if medicion is None:
+            return respuesta
+        callback, inicio, inicio_cpu = medicion
+        etiquetas = {'callback': callback}
+        resultado = {200: 'ok', 204: 'sin_cambios'}.get(respuesta.status_code, 'error')
+
+        registro.incrementar('panel_callback_solicitudes_total', dict(etiquetas, resultado=resultado))
+        registro.observar('panel_callback_duracion_segundos', etiquetas,
+                          time.perf_counter() - inicio, CUBETAS_DURACION)
+        registro.incrementar('panel_callback_cpu_segundos_total', etiquetas, time.thread_time() - inicio_cpu)
+        tamaño = respuesta.calculate_content_length()
+        if tamaño is None and not respuesta.is_streamed:
+            tamaño = len(respuesta.get_data())
+        registro.observar('panel_callback_respuesta_bytes', etiquetas, tamaño or 0, CUBETAS_BYTES)
+
+        directorio = directorio_metricas()
+        if directorio is not None:
+            registro.iniciar_volcado(directorio)
+        return respuesta
+
+    @server.teardown_request
+    def _registrar_excepcion(error):
+        if error is not None and request.path == f'{prefijo}_dash-update-component':
+            cuerpo = request.get_json(silent=True)
+            registro.incrementar('panel_callback_excepciones_total', {
+                'callback': nombre_callback(app_dash, cuerpo),
+                'tipo': type(error).__name__,
+            })
+
+    @server.route(ruta)
+    def metricas():
+        return Response(texto_prometheus(almacen), content_type='text/plain; version=0.0.4; charset=utf-8')
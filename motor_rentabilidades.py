@@ -0,0 +1,563 @@
+"""
+Motor vectorizado de rentabilidades.
+
+En lugar de recorrer los fondos uno a uno con `df[['Dates', fondo]].dropna()`,
+los precios de una moneda se guardan como una matriz alineada por fecha y un
+índice de los precios válidos de cada columna. Cada período se resuelve para
+todos los fondos a la vez con `searchsorted` sobre ese índice.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+DIA = np.timedelta64(1, 'D')
+
+# (columna, días hacia atrás); None = desde el inicio del año
+PERIODOS = [
+    ('1 Mes', 30),
+    ('3 Meses', 90),
+    ('YTD', None),
+    ('12 Meses', 365),
+    ('3 Años', 1095),
+    ('5 Años', 1825),
+]
+
+PERIODOS_ANUALIZADOS = [
+    ('1 Año', 365),
+    ('3 Años', 1095),
+    ('5 Años', 1825),
+]
+
+
+# Precios válidos en float32 (la mitad de memoria); PRECIOS_FLOAT64=1 los guarda en float64.
+# Los cálculos leen siempre en float64 (ver MatrizPrecios.precios)
+TIPO_PRECIOS = np.float64 if os.environ.get('PRECIOS_FLOAT64', '0') == '1' else np.float32
+
+
+def _tipo_claves(filas, columnas):
+    # int32 mientras la clave más grande (columnas * (filas + 1)) quepa
+    return np.int32 if columnas * (filas + 1) < np.iinfo(np.int32).max else np.int64
+
+
+class MatrizPrecios:
+    """
+    Precios de una moneda: vector de fechas ordenado e índice de los precios válidos.
+
+    Los precios válidos (no NaN) de cada fondo se guardan contiguos en arreglos
+    planos ordenados por la clave `columna * (n + 1) + fila`, de modo que el
+    primer o último precio válido de cualquier fondo alrededor de una fila se
+    obtiene con un único `searchsorted` para todos los fondos. `inicio` y
+    `fin` delimitan el tramo de cada fondo y `posiciones` da la columna de
+    cada fondo; la fila de un precio se deriva de su clave. No se guarda la
+    matriz densa filas × fondos.
+    """
+
+    __slots__ = ('fechas', 'fondos', 'claves', 'precios_validos', 'inicio', 'fin', 'con_datos', 'posiciones', '_paso')
+
+    # Arreglos que se guardan/abren con memory-map
+    ARREGLOS = ('fechas', 'claves', 'precios_validos', 'inicio', 'fin')
+
+    def __init__(self, fechas, valores, fondos):
+        fechas = np.asarray(fechas, dtype='datetime64[ns]')
+        if len(fechas) > 1 and (np.diff(fechas) < np.timedelta64(0, 'ns')).any():
+            orden = np.argsort(fechas, kind='stable')
+            fechas = fechas[orden]
+            valores = valores[orden]
+
+        self.fechas = fechas
+        self.fondos = list(fondos)
+
+        n, k = valores.shape
+        paso = n + 1
+        columnas, filas = np.nonzero(~np.isnan(valores.T))
+        self.claves = (columnas.astype(np.int64) * paso + filas).astype(_tipo_claves(n, k))
+        self.precios_validos = np.asarray(valores[filas, columnas], dtype=TIPO_PRECIOS)
+
+        limites = np.searchsorted(self.claves, (np.arange(k + 1, dtype=np.int64) * paso).astype(self.claves.dtype))
+        self.inicio = limites[:-1]
+        self.fin = limites[1:]
+        self._completar()
+
+    def _completar(self):
+        self._paso = len(self.fechas) + 1
+        self.con_datos = self.fin > self.inicio
+        self.posiciones = {}
+        for j, fondo in enumerate(self.fondos):
+            self.posiciones.setdefault(fondo, j)
+
+    def guardar(self, directorio):
+        """Escribe los arreglos de la matriz como .npy para abrirlos después con memory-map."""
+        for nombre in self.ARREGLOS:
+            np.save(os.path.join(directorio, f'{nombre}.npy'), np.ascontiguousarray(getattr(self, nombre)))
+        with open(os.path.join(directorio, 'fondos.json'), 'w', encoding='utf-8') as archivo:
+            json.dump(self.fondos, archivo, ensure_ascii=False, default=str)
+
+    @classmethod
+    def abrir(cls, directorio):
+        """Abre una matriz guardada con `guardar`, de solo lectura y sin copiar los arreglos."""
+        matriz = cls.__new__(cls)
+        for nombre in cls.ARREGLOS:
+            setattr(matriz, nombre, np.load(os.path.join(directorio, f'{nombre}.npy'), mmap_mode='r'))
+        with open(os.path.join(directorio, 'fondos.json'), encoding='utf-8') as archivo:
+            matriz.fondos = json.load(archivo)
+        matriz._completar()
+        return matriz
+
+    def bytes_arreglos(self):
+        return sum(getattr(self, nombre).nbytes for nombre in self.ARREGLOS)
+
+    def compartir_fechas(self, otra):
+        """Usa el vector de fechas de `otra` si es igual al propio (un solo índice para ambas monedas)."""
+        if otra is not self and np.array_equal(self.fechas, otra.fechas):
+            self.fechas = otra.fechas
+
+    @classmethod
+    def desde_dataframe(cls, df):
+        """Construye la matriz desde un DataFrame con columna 'Dates' y una columna por fondo."""
+        return cls(df['Dates'].to_numpy(dtype='datetime64[ns]'), valores_precios(df), df.columns[1:])
+
+    @classmethod
+    def extender(cls, anterior, df):
+        """
+        Matriz de `df` a partir de `anterior`, la matriz de sus primeras filas.
+
+        Solo se indexan los precios de las filas nuevas; los de la historia se
+        reubican en el índice plano sin volver a recorrer la matriz. Si las
+        fechas no están ordenadas se construye completa.
+        """
+        fechas = df['Dates'].to_numpy(dtype='datetime64[ns]')
+        valores = valores_precios(df)
+        n_anterior = len(anterior.fechas)
+        n, k = valores.shape
+        if n < n_anterior or len(anterior.inicio) != k or (np.diff(fechas) < np.timedelta64(0, 'ns')).any():
+            return cls(fechas, valores, df.columns[1:])
+
+        paso = n + 1
+        nuevas = valores[n_anterior:]
+        columnas, filas = np.nonzero(~np.isnan(nuevas.T))
+        # Cada precio nuevo va al final del tramo de su columna
+        posiciones = anterior.fin[columnas]
+        largo_anterior = anterior.fin - anterior.inicio
+        columnas_anteriores = np.repeat(np.arange(k, dtype=np.int64), largo_anterior)
+        filas_anteriores = anterior.claves.astype(np.int64) - columnas_anteriores * anterior._paso
+
+        matriz = cls.__new__(cls)
+        matriz.fechas = fechas
+        matriz.fondos = list(df.columns[1:])
+        matriz.claves = np.insert(columnas_anteriores * paso + filas_anteriores, posiciones,
+                                  columnas.astype(np.int64) * paso + filas + n_anterior).astype(_tipo_claves(n, k))
+        matriz.precios_validos = np.insert(anterior.precios_validos, posiciones,
+                                           nuevas[filas, columnas].astype(TIPO_PRECIOS))
+        agregados = np.bincount(columnas, minlength=k)
+        matriz.fin = anterior.fin + np.cumsum(agregados)
+        matriz.inicio = matriz.fin - largo_anterior - agregados
+        matriz._completar()
+        return matriz
+
+    def recortar(self, fila_desde, fila_hasta):
+        """Matriz de las filas [fila_desde, fila_hasta): solo se copian los precios de ese rango."""
+        k = len(self.fondos)
+        columnas = np.arange(k, dtype=np.int64)
+        desde = self.siguiente_valido(columnas, fila_desde)
+        desde = np.where(desde >= 0, desde, self.fin)
+        hasta = np.maximum(self.anterior_valido(columnas, fila_hasta - 1) + 1, desde)
+        largos = hasta - desde
+        tramo = np.repeat(columnas, largos)
+        comienzos = np.concatenate(([0], np.cumsum(largos)[:-1]))
+        posiciones = desde[tramo] + (np.arange(largos.sum()) - comienzos[tramo])
+
+        n = fila_hasta - fila_desde
+        matriz = type(self).__new__(type(self))
+        matriz.fechas = self.fechas[fila_desde:fila_hasta]
+        matriz.fondos = list(self.fondos)
+        matriz.claves = (tramo * (n + 1) + self.filas(posiciones) - fila_desde).astype(_tipo_claves(n, k))
+        matriz.precios_validos = self.precios_validos[posiciones]
+        matriz.fin = np.cumsum(largos)
+        matriz.inicio = matriz.fin - largos
+        matriz._completar()
+        return matriz
+
+    def _clave(self, columnas, filas):
+        # En el tipo de `claves`, para que searchsorted no convierta el arreglo completo
+        return (np.asarray(columnas, dtype=np.int64) * self._paso + filas).astype(self.claves.dtype)
+
+    def siguiente_valido(self, columnas, filas):
+        """Posición del primer precio válido en fila >= `filas`; -1 si no hay."""
+        pos = np.searchsorted(self.claves, self._clave(columnas, filas), side='left')
+        return np.where(pos < self.fin[columnas], pos, -1)
+
+    def anterior_valido(self, columnas, filas):
+        """Posición del último precio válido en fila <= `filas`; -1 si no hay."""
+        pos = np.searchsorted(self.claves, self._clave(columnas, filas), side='right') - 1
+        return np.where(pos >= self.inicio[columnas], pos, -1)
+
+    def filas(self, posiciones):
+        """Fila de la matriz de cada precio válido."""
+        return self.claves[posiciones] % self._paso
+
+    def fecha_valida(self, posiciones):
+        return self.fechas[self.filas(posiciones)]
+
+    def precios(self, posiciones):
+        """Precios válidos en `posiciones`, en float64 para los cálculos."""
+        return self.precios_validos[posiciones].astype(np.float64)
+
+
+def valores_precios(df):
+    """Precios de un DataFrame de precios como matriz float64 (textos de Bloomberg como NaN)."""
+    precios = df.iloc[:, 1:]
+    try:
+        return precios.to_numpy(dtype=np.float64, na_value=np.nan)
+    except (TypeError, ValueError):
+        return precios.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+
+
+def filas_compartidas(df, df_anterior):
+    """
+    Filas de `df_anterior` que `df` repite sin cambios al comienzo.
+
+    None si `df` no es solo `df_anterior` más fechas posteriores: otros
+    fondos, menos filas, fechas desordenadas o precios históricos distintos.
+    """
+    filas = len(df_anterior)
+    if list(df.columns) != list(df_anterior.columns) or len(df) < filas or filas == 0:
+        return None
+    fechas = df['Dates'].to_numpy(dtype='datetime64[ns]')
+    if not np.array_equal(fechas[:filas], df_anterior['Dates'].to_numpy(dtype='datetime64[ns]')):
+        return None
+    if (np.diff(fechas[filas - 1:]) <= np.timedelta64(0, 'ns')).any():
+        return None
+    if not np.array_equal(valores_precios(df.iloc[:filas]), valores_precios(df_anterior), equal_nan=True):
+        return None
+    return filas
+
+
+def _serie(series, j):
+    return series[j] if j < len(series) else 'N/A'
+
+
+def _años_entre(fecha_inicial, fecha_final):
+    # Igual que Timedelta.days: días completos
+    return ((fecha_final - fecha_inicial) // DIA) / 365.25
+
+
+def fila_corte(matriz, fecha_corte):
+    """Última fila con fecha <= `fecha_corte`; None si no hay corte o es posterior a todas las fechas."""
+    if fecha_corte is None:
+        return None
+    fila = int(np.searchsorted(matriz.fechas, np.datetime64(fecha_corte, 'ns'), side='right')) - 1
+    return fila if fila < len(matriz.fechas) - 1 else None
+
+
+def _base_tabla(matriz, series, fecha_corte=None):
+    # Con corte, el último precio de cada fondo es el último en o antes de esa fecha
+    fila = fila_corte(matriz, fecha_corte)
+    if fila is None:
+        columnas = np.flatnonzero(matriz.con_datos)
+        ultimo = matriz.fin[columnas] - 1
+    else:
+        ultimo = matriz.anterior_valido(np.arange(len(matriz.fondos)), fila)
+        columnas = np.flatnonzero(ultimo >= 0)
+        ultimo = ultimo[columnas]
+    base = {
+        'Fondo': [matriz.fondos[j] for j in columnas],
+        'Serie': [_serie(series, j) for j in columnas],
+    }
+    return columnas, ultimo, base
+
+
+def calcular_tabla_periodos(matriz, series, tac=None, fecha_corte=None):
+    """Rentabilidades 1M/3M/YTD/12M/3A/5A/ITD de todos los fondos de la matriz, al cierre de `fecha_corte`."""
+    columnas, ultimo, resultado = _base_tabla(matriz, series, fecha_corte)
+    tac = tac if tac is not None else []
+    resultado['TAC'] = [tac[j] if j < len(tac) else np.nan for j in columnas]
+    precio_actual = matriz.precios(ultimo)
+    fecha_actual = matriz.fecha_valida(ultimo)
+
+    for nombre, dias in PERIODOS:
+        if dias is None:
+            objetivo = fecha_actual.astype('datetime64[Y]').astype('datetime64[ns]')
+        else:
+            objetivo = fecha_actual - dias * DIA
+        filas = np.searchsorted(matriz.fechas, objetivo, side='left')
+        pos = matriz.siguiente_valido(columnas, filas)
+        resultado[nombre] = (precio_actual / matriz.precios(pos) - 1) * 100
+
+    precio_inicial = matriz.precios(matriz.inicio[columnas])
+    resultado['ITD'] = (precio_actual / precio_inicial - 1) * 100
+
+    return pd.DataFrame(resultado, index=columnas).round(2)
+
+
+def calcular_tabla_anualizada(matriz, series, fecha_corte=None):
+    """Rentabilidades anualizadas 1A/3A/5A/ITD de todos los fondos de la matriz, al cierre de `fecha_corte`."""
+    columnas, ultimo, resultado = _base_tabla(matriz, series, fecha_corte)
+    precio_actual = matriz.precios(ultimo)
+    fecha_actual = matriz.fecha_valida(ultimo)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for nombre, dias in PERIODOS_ANUALIZADOS:
+            filas = np.searchsorted(matriz.fechas, fecha_actual - dias * DIA, side='left')
+            pos = matriz.siguiente_valido(columnas, filas)
+            años = _años_entre(matriz.fecha_valida(pos), fecha_actual)
+            anual = ((precio_actual / matriz.precios(pos)) ** (1 / años) - 1) * 100
+            # Se requieren al menos dos observaciones dentro del período
+            resultado[nombre] = np.where((pos < ultimo) & (años > 0), anual, np.nan)
+
+        primero = matriz.inicio[columnas]
+        años_historial = _años_entre(matriz.fecha_valida(primero), fecha_actual)
+        anual_itd = ((precio_actual / matriz.precios(primero)) ** (1 / años_historial) - 1) * 100
+        resultado['ITD'] = np.where(años_historial > 0, anual_itd, 0.0)
+
+    resultado['Años Historial'] = np.round(años_historial, 1)
+    return pd.DataFrame(resultado, index=columnas).round(2)
+
+
+def calcular_tabla_por_año(matriz, series, desde_año=None, fecha_corte=None):
+    """
+    Rentabilidad de cada año calendario para todos los fondos de la matriz.
+
+    Los límites de cada año se obtienen una sola vez sobre el vector de fechas
+    y el primer/último precio válido de cada fondo en cada año se resuelve con
+    un `searchsorted` sobre la grilla fondos × años. Un año requiere más de
+    una observación del fondo. Con `desde_año` solo se calculan ese año y
+    los siguientes; con `fecha_corte` el último año llega hasta esa fecha.
+    """
+    columnas, _, resultado = _base_tabla(matriz, series, fecha_corte)
+    fila = fila_corte(matriz, fecha_corte)
+    filas = len(matriz.fechas) if fila is None else fila + 1
+    años_fila = matriz.fechas[:filas].astype('datetime64[Y]').astype(np.int64) + 1970
+    años, inicio_año = np.unique(años_fila, return_index=True)
+    fin_año = np.append(inicio_año[1:], len(años_fila)) if len(años) else inicio_año
+    if desde_año is not None:
+        recientes = años >= desde_año
+        años, inicio_año, fin_año = años[recientes], inicio_año[recientes], fin_año[recientes]
+
+    grilla_columnas = columnas[:, None]
+    primero = matriz.siguiente_valido(grilla_columnas, inicio_año[None, :])
+    ultimo = matriz.anterior_valido(grilla_columnas, fin_año[None, :] - 1)
+
+    # Ambos extremos dentro del año y distintos: más de una observación
+    dentro = (primero >= 0) & (ultimo >= 0) & (primero < ultimo)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rentabilidades = (matriz.precios(ultimo) / matriz.precios(primero) - 1) * 100
+    rentabilidades = np.where(dentro, rentabilidades, np.nan).round(2)
+
+    for i, año in enumerate(años):
+        resultado[str(año)] = rentabilidades[:, i]
+    return pd.DataFrame(resultado, index=columnas)
+
+
+def actualizar_tabla_por_año(anterior, matriz, series, filas_anteriores):
+    """
+    Tabla por año de `matriz` cuando solo cambió desde la fila `filas_anteriores`.
+
+    Los años previos al de la primera fila nueva no cambian y se toman de
+    `anterior`; se calculan solo los años que tocan las filas nuevas.
+    """
+    if filas_anteriores >= len(matriz.fechas):
+        return anterior
+    primer_año = int(matriz.fechas[filas_anteriores].astype('datetime64[Y]').astype(np.int64)) + 1970
+    recientes = calcular_tabla_por_año(matriz, series, desde_año=primer_año)
+    previos = [col for col in anterior.columns if col not in ('Fondo', 'Serie') and int(col) < primer_año]
+    # Un fondo que recién tiene precios no tenía años previos: quedan en NaN
+    return pd.concat([
+        recientes[['Fondo', 'Serie']],
+        anterior[previos].reindex(recientes.index),
+        recientes.drop(columns=['Fondo', 'Serie']),
+    ], axis=1)
+
+
+def retornos_moviles(matriz, columnas, dias):
+    """
+    Retorno móvil a `dias` días de `columnas`, alineado a las filas de la matriz.
+
+    Para cada precio válido se busca, con un único `searchsorted` sobre el
+    índice plano, el último precio del mismo fondo en o antes de la fecha
+    `dias` atrás (así los feriados y los huecos toman el precio vigente a esa
+    fecha). Devuelve una matriz filas × columnas con NaN en las fechas sin
+    precio y mientras el fondo no tenga una ventana completa de historia.
+    """
+    columnas = np.asarray(columnas, dtype=np.int64)
+    resultado = np.full((len(matriz.fechas), len(columnas)), np.nan)
+    largos = matriz.fin[columnas] - matriz.inicio[columnas]
+    if not largos.sum():
+        return resultado
+
+    comienzos = np.concatenate(([0], np.cumsum(largos)[:-1]))
+    tramo = np.repeat(np.arange(len(columnas)), largos)
+    posiciones = matriz.inicio[columnas][tramo] + (np.arange(largos.sum()) - comienzos[tramo])
+    filas = matriz.filas(posiciones)
+    filas_objetivo = np.searchsorted(matriz.fechas, matriz.fechas[filas] - dias * DIA, side='right') - 1
+    previas = matriz.anterior_valido(columnas[tramo], filas_objetivo)
+
+    completas = previas >= 0
+    resultado[filas[completas], tramo[completas]] = (
+        matriz.precios(posiciones[completas]) / matriz.precios(previas[completas]) - 1
+    ) * 100
+    return resultado
+
+
+def retornos_acumulados(matriz, columnas, fila_desde, fila_hasta):
+    """
+    Retorno acumulado de `columnas` en las filas [fila_desde, fila_hasta).
+
+    La base de cada fondo es su primer precio válido dentro del rango. Solo se
+    leen los precios del rango, sin copiar la matriz; devuelve una matriz
+    (fila_hasta - fila_desde) × columnas con NaN en las fechas sin precio.
+    """
+    columnas = np.asarray(columnas, dtype=np.int64)
+    resultado = np.full((max(fila_hasta - fila_desde, 0), len(columnas)), np.nan)
+    if not len(resultado) or not len(columnas):
+        return resultado
+
+    primero = matriz.siguiente_valido(columnas, fila_desde)
+    primero = np.where(primero >= 0, primero, matriz.fin[columnas])
+    largos = np.maximum(matriz.anterior_valido(columnas, fila_hasta - 1) + 1 - primero, 0)
+    if not largos.sum():
+        return resultado
+
+    comienzos = np.concatenate(([0], np.cumsum(largos)[:-1]))
+    tramo = np.repeat(np.arange(len(columnas)), largos)
+    posiciones = primero[tramo] + (np.arange(largos.sum()) - comienzos[tramo])
+    resultado[matriz.filas(posiciones) - fila_desde, tramo] = (
+        matriz.precios(posiciones) / matriz.precios(primero[tramo]) - 1
+    ) * 100
+    return resultado
+
+
+def _suma_en_ventana(acumulada, desde, hasta):
+    # Suma de los elementos (desde, hasta] a partir de la suma acumulada con un cero inicial
+    return acumulada[hasta + 1] - acumulada[desde + 1]
+
+
+def calcular_tablas_riesgo(matriz, series, fecha_corte=None):
+    """
+    Volatilidad, Sharpe, Sortino, máximo drawdown y recuperación por ventana.
+
+    Devuelve {ventana: tabla} con las mismas ventanas de la tabla de
+    períodos (1M ... 5A e ITD). Los retornos son entre precios válidos
+    consecutivos de cada fondo sobre el índice plano de la matriz; cada
+    ventana es un tramo contiguo de ese índice, de modo que medias y
+    varianzas salen de sumas acumuladas y el drawdown de un único máximo
+    acumulado sobre los tramos de todos los fondos. Volatilidad y razones
+    se anualizan con las observaciones por año de cada tramo, sin tasa
+    libre de riesgo; la recuperación son los días desde el mínimo hasta
+    volver al máximo previo (NaN si aún no recupera). Con `fecha_corte` las
+    ventanas terminan en el último precio en o antes de esa fecha.
+    """
+    columnas, ultimo, base = _base_tabla(matriz, series, fecha_corte)
+    precios = matriz.precios(slice(None))
+    fecha_actual = matriz.fecha_valida(ultimo)
+
+    # Retorno de cada precio válido respecto del anterior del mismo fondo (0 en el primero)
+    retornos = np.zeros(len(precios))
+    retornos[1:] = precios[1:] / precios[:-1] - 1
+    retornos[matriz.inicio[matriz.con_datos]] = 0.0
+    suma = np.concatenate(([0.0], np.cumsum(retornos)))
+    suma_cuadrados = np.concatenate(([0.0], np.cumsum(retornos ** 2)))
+    suma_bajistas = np.concatenate(([0.0], np.cumsum(np.minimum(retornos, 0.0) ** 2)))
+    log_precios = np.log(precios)
+    # Separación entre tramos para que el máximo acumulado no pase de un fondo a otro
+    separacion = (np.nanmax(log_precios) - np.nanmin(log_precios) + 1.0) if len(precios) else 1.0
+
+    ventanas = [(nombre, dias) for nombre, dias in PERIODOS] + [('ITD', 'inicio')]
+    tablas = {}
+    for nombre, dias in ventanas:
+        if dias == 'inicio':
+            inicio = matriz.inicio[columnas]
+        else:
+            if dias is None:
+                objetivo = fecha_actual.astype('datetime64[Y]').astype('datetime64[ns]')
+            else:
+                objetivo = fecha_actual - dias * DIA
+            inicio = matriz.siguiente_valido(columnas, np.searchsorted(matriz.fechas, objetivo, side='left'))
+
+        n = (ultimo - inicio).astype(np.float64)
+        años = _años_entre(matriz.fecha_valida(inicio), fecha_actual)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            media = _suma_en_ventana(suma, inicio, ultimo) / n
+            varianza = (_suma_en_ventana(suma_cuadrados, inicio, ultimo) - n * media ** 2) / (n - 1)
+            desvio = np.sqrt(np.maximum(varianza, 0.0))
+            desvio_bajista = np.sqrt(_suma_en_ventana(suma_bajistas, inicio, ultimo) / n)
+            raiz_obs_año = np.sqrt(n / años)
+            validos = (n >= 2) & (años > 0)
+            volatilidad = np.where(validos, desvio * raiz_obs_año * 100, np.nan)
+            sharpe = np.where(validos & (desvio > 0), media / desvio * raiz_obs_año, np.nan)
+            sortino = np.where(validos & (desvio_bajista > 0), media / desvio_bajista * raiz_obs_año, np.nan)
+
+        # Tramos [inicio, ultimo] de todos los fondos concatenados
+        largos = ultimo - inicio + 1
+        comienzos = np.concatenate(([0], np.cumsum(largos)[:-1]))
+        tramo = np.repeat(np.arange(len(columnas)), largos)
+        posiciones = inicio[tramo] + (np.arange(largos.sum()) - comienzos[tramo])
+        desplazado = log_precios[posiciones] + tramo * separacion
+        caida = np.exp(desplazado - np.maximum.accumulate(desplazado)) - 1
+        maximo_drawdown = np.minimum.reduceat(caida, comienzos) if len(columnas) else np.array([])
+
+        # Primer punto del mínimo de cada tramo y primer regreso al máximo previo
+        en_minimo = np.flatnonzero(caida == maximo_drawdown[tramo])
+        _, primero = np.unique(tramo[en_minimo], return_index=True)
+        punto_minimo = en_minimo[primero]
+        recuperado = np.flatnonzero((caida >= 0) & (np.arange(len(caida)) > punto_minimo[tramo]))
+        tramos_recuperados, primero = np.unique(tramo[recuperado], return_index=True)
+        recuperacion = np.full(len(columnas), np.nan)
+        recuperacion[tramos_recuperados] = (
+            (matriz.fecha_valida(posiciones[recuperado[primero]])
+             - matriz.fecha_valida(posiciones[punto_minimo[tramos_recuperados]])) // DIA
+        )
+
+        con_caida = maximo_drawdown < 0
+        fecha_minimo = pd.to_datetime(matriz.fecha_valida(posiciones[punto_minimo])).strftime('%Y-%m-%d')
+        tabla = dict(base)
+        tabla.update({
+            'Volatilidad': volatilidad,
+            'Sharpe': sharpe,
+            'Sortino': sortino,
+            'Máx. Drawdown': np.where(con_caida, maximo_drawdown * 100, 0.0),
+            'Fecha Máx. Drawdown': np.where(con_caida, fecha_minimo, None),
+            'Recuperación (días)': np.where(con_caida, recuperacion, np.nan),
+        })
+        tablas[nombre] = pd.DataFrame(tabla, index=columnas).round(2)
+    return tablas
+
+
+def calcular_tabla_rango(matriz, series, desde, hasta):
+    """
+    Rentabilidad de cada fondo entre su primer precio desde `desde` y su último hasta `hasta`.
+
+    Los dos extremos salen del índice de precios válidos (un `searchsorted`
+    por extremo para todos los fondos), sin recorrer los precios del rango.
+    La anualizada se informa solo con al menos un año entre los extremos.
+    """
+    columnas = np.flatnonzero(matriz.con_datos)
+    fila_desde = np.searchsorted(matriz.fechas, np.datetime64(desde, 'ns'), side='left')
+    fila_hasta = np.searchsorted(matriz.fechas, np.datetime64(hasta, 'ns'), side='right') - 1
+    primero = matriz.siguiente_valido(columnas, fila_desde)
+    ultimo = matriz.anterior_valido(columnas, fila_hasta)
+    # Más de una observación dentro del rango
+    dentro = (primero >= 0) & (ultimo >= 0) & (primero < ultimo)
+    columnas, primero, ultimo = columnas[dentro], primero[dentro], ultimo[dentro]
+
+    fecha_inicial, fecha_final = matriz.fecha_valida(primero), matriz.fecha_valida(ultimo)
+    años = _años_entre(fecha_inicial, fecha_final)
+    razon = matriz.precios(ultimo) / matriz.precios(primero)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        anual = (razon ** (1 / años) - 1) * 100
+    return pd.DataFrame({
+        'Fondo': [matriz.fondos[j] for j in columnas],
+        'Serie': [_serie(series, j) for j in columnas],
+        'Desde': pd.to_datetime(fecha_inicial).strftime('%Y-%m-%d'),
+        'Hasta': pd.to_datetime(fecha_final).strftime('%Y-%m-%d'),
+        'Rentabilidad': (razon - 1) * 100,
+        'Anualizada': np.where(años >= 1, anual, np.nan),
+    }, index=columnas).round(2)
+
+
+def seleccionar_fondos(tabla, matriz, fondos_seleccionados):
+    """Filas de `tabla` para los fondos seleccionados, en el orden de la selección."""
+    indices = [matriz.posiciones[f] for f in fondos_seleccionados if f in matriz.posiciones]
+    indices = [j for j in indices if j in tabla.index]
+    return tabla.loc[indices].reset_index(drop=True)
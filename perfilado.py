@@ -0,0 +1,229 @@
+"""
+Perfilado a pedido de solicitudes de callbacks.
+
+Un hilo muestreador lee la pila del hilo que atiende la solicitud cada
+PERFILADO_INTERVALO_MS milisegundos y, al terminar, escribe las pilas en
+formato "collapsed" (una línea "raiz;...;hoja conteo" por pila), que leen
+flamegraph.pl, speedscope e inferno. Junto al perfil queda un .json con el
+callback, las entradas y la duración.
+
+Se activa de dos formas:
+- PERFILADO=1 perfila todas las solicitudes (o solo las de PERFILADO_CALLBACKS).
+- PERFILADO_CLAVE=<secreto> perfila las solicitudes que traen un token
+  firmado en el encabezado X-Perfilar o en la cookie "perfilar". Abrir
+  /perfilado?token=<token> deja la cookie en el navegador del usuario.
+  Los tokens se generan con: python perfilado.py --minutos 15
+
+Sin ninguna de las dos variables no se registra ningún hook.
+
+Solo con PERFILADO=1 (desarrollo) se acorta el intervalo de cambio de GIL
+del proceso mientras haya perfiles en curso, para muestrear bien callbacks
+cortos; eso hace más lentos los demás hilos del worker. Con PERFILADO_CLAVE
+se deja intacto y los callbacks muy cortos pueden quedar con pocas muestras.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import Response, g, request
+
+import metricas
+
+ENCABEZADO = 'X-Perfilar'
+COOKIE = 'perfilar'
+
+# Perfiles en curso y el intervalo de cambio de GIL que había antes del primero
+_bloqueo_gil = threading.Lock()
+_perfiles_activos = 0
+_intervalo_gil_original = None
+
+
+def firmar(clave, segundos):
+    """Token "expiracion.firma" válido por `segundos`."""
+    expira = int(time.time()) + int(segundos)
+    firma = hmac.new(clave.encode(), str(expira).encode(), hashlib.sha256).hexdigest()
+    return f'{expira}.{firma}'
+
+
+def token_valido(token, clave):
+    try:
+        expira, firma = token.split('.', 1)
+        vigente = int(expira) > time.time()
+    except (AttributeError, ValueError):
+        return False
+    esperada = hmac.new(clave.encode(), expira.encode(), hashlib.sha256).hexdigest()
+    return vigente and hmac.compare_digest(firma, esperada)
+
+
+class Muestreador(threading.Thread):
+    """Cuenta las pilas del hilo `objetivo` muestreadas cada `intervalo` segundos."""
+
+    def __init__(self, objetivo, intervalo, ajustar_gil=False):
+        super().__init__(name='perfilado', daemon=True)
+        self.objetivo = objetivo
+        self.intervalo = intervalo
+        self.ajustar_gil = ajustar_gil
+        self.pilas = Counter()
+        self.muestras = 0
+        self._detener = threading.Event()
+        self._nombres = {}
+
+    def _nombre(self, codigo):
+        nombre = self._nombres.get(codigo)
+        if nombre is None:
+            archivo = os.path.basename(codigo.co_filename)
+            nombre = self._nombres[codigo] = f'{codigo.co_name} ({archivo}:{codigo.co_firstlineno})'
+        return nombre
+
+    def start(self):
+        # Con el intervalo de cambio de GIL por defecto (5 ms) el muestreador no
+        # alcanza a correr en callbacks cortos; se acorta mientras haya perfiles.
+        # Afecta a todo el proceso, por eso solo se hace si se pide (PERFILADO=1)
+        global _perfiles_activos, _intervalo_gil_original
+        if not self.ajustar_gil:
+            super().start()
+            return
+        with _bloqueo_gil:
+            if _perfiles_activos == 0:
+                _intervalo_gil_original = sys.getswitchinterval()
+                sys.setswitchinterval(min(_intervalo_gil_original, self.intervalo / 2))
+            _perfiles_activos += 1
+        super().start()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            marco = sys._current_frames().get(self.objetivo)
+            pila = []
+            while marco is not None:
+                codigo = marco.f_code
+                pila.append(self._nombre(codigo))
+                # Lo que está por encima del despacho de Dash es Flask/werkzeug
+                if codigo.co_name == 'dispatch' and codigo.co_filename.endswith(os.path.join('dash', 'dash.py')):
+                    break
+                marco = marco.f_back
+            if pila:
+                self.pilas[';'.join(reversed(pila))] += 1
+                self.muestras += 1
+
+    def detener(self):
+        global _perfiles_activos
+        self._detener.set()
+        self.join()
+        if not self.ajustar_gil:
+            return
+        with _bloqueo_gil:
+            _perfiles_activos -= 1
+            if _perfiles_activos == 0:
+                sys.setswitchinterval(_intervalo_gil_original)
+
+
+def _entradas(cuerpo):
+    return {
+        f"{e.get('id')}.{e.get('property')}": e.get('value')
+        for e in (cuerpo.get('inputs', []) + cuerpo.get('state', []))
+        if isinstance(e, dict)
+    }
+
+
+def escribir_perfil(directorio, callback, cuerpo, muestreador, duracion):
+    """Escribe <momento>_<callback>_<hash>.folded y su .json de metadatos; devuelve la ruta base."""
+    entradas = _entradas(cuerpo)
+    resumen = hashlib.sha1(json.dumps(entradas, sort_keys=True, default=str).encode()).hexdigest()[:8]
+    momento = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    nombre = re.sub(r'[^\w-]', '_', callback)
+    base = os.path.join(directorio, f'{momento}_{nombre}_{resumen}')
+
+    os.makedirs(directorio, exist_ok=True)
+    raiz = f'callback:{callback}'
+    with open(f'{base}.folded', 'w', encoding='utf-8') as archivo:
+        for pila, conteo in muestreador.pilas.most_common():
+            archivo.write(f'{raiz};{pila} {conteo}\n')
+    with open(f'{base}.json', 'w', encoding='utf-8') as archivo:
+        json.dump({
+            'callback': callback,
+            'entradas': entradas,
+            'duracion_s': round(duracion, 6),
+            'muestras': muestreador.muestras,
+            'intervalo_ms': muestreador.intervalo * 1000,
+        }, archivo, ensure_ascii=False, indent=2, default=str)
+    return base
+
+
+def instrumentar(app_dash):
+    """Registra los hooks de perfilado si PERFILADO o PERFILADO_CLAVE están definidas."""
+    siempre = os.environ.get('PERFILADO') == '1'
+    clave = os.environ.get('PERFILADO_CLAVE')
+    if not siempre and not clave:
+        return
+
+    directorio = os.environ.get('PERFILADO_DIR') or os.path.join(tempfile.gettempdir(), 'perfiles_panel')
+    intervalo = float(os.environ.get('PERFILADO_INTERVALO_MS', 1)) / 1000
+    callbacks = {c.strip() for c in os.environ.get('PERFILADO_CALLBACKS', '').split(',') if c.strip()}
+    server = app_dash.server
+    ruta_callbacks = f'{app_dash.config.routes_pathname_prefix}_dash-update-component'
+
+    def solicitado():
+        if siempre:
+            return True
+        return token_valido(request.headers.get(ENCABEZADO) or request.cookies.get(COOKIE), clave)
+
+    @server.before_request
+    def _iniciar_perfil():
+        if request.path != ruta_callbacks or not solicitado():
+            return
+        cuerpo = request.get_json(silent=True) or {}
+        callback = metricas.nombre_callback(app_dash, cuerpo)
+        if callbacks and callback not in callbacks:
+            return
+        muestreador = Muestreador(threading.get_ident(), intervalo, ajustar_gil=siempre)
+        g.perfil = (callback, cuerpo, muestreador, time.perf_counter())
+        muestreador.start()
+
+    @server.teardown_request
+    def _terminar_perfil(error):
+        perfil = g.pop('perfil', None)
+        if perfil is None:
+            return
+        callback, cuerpo, muestreador, inicio = perfil
+        duracion = time.perf_counter() - inicio
+        muestreador.detener()
+        try:
+            base = escribir_perfil(directorio, callback, cuerpo, muestreador, duracion)
+            print(f"Perfil de {callback} ({duracion * 1000:.0f} ms, {muestreador.muestras} muestras): {base}.folded")
+        except OSError as e:
+            print(f"No se pudo escribir el perfil de {callback}: {e}")
+
+    if clave:
+        @server.route('/perfilado')
+        def activar_perfilado():
+            token = request.args.get('token', '')
+            if not token_valido(token, clave):
+                return Response('Token inválido o vencido\n', status=403, mimetype='text/plain')
+            respuesta = Response('Perfilado activado para este navegador\n', mimetype='text/plain')
+            expira = int(token.split('.', 1)[0])
+            respuesta.set_cookie(COOKIE, token, expires=expira, httponly=True, samesite='Lax')
+            return respuesta
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera un token de perfilado firmado con PERFILADO_CLAVE')
+    parser.add_argument('--minutos', type=int, default=15)
+    args = parser.parse_args()
+
+    clave = os.environ.get('PERFILADO_CLAVE')
+    if not clave:
+        raise SystemExit("Defina PERFILADO_CLAVE con el mismo secreto que usa el servidor")
+    print(firmar(clave, args.minutos * 60))
+
+
+if __name__ == '__main__':
+    main()
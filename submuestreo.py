@@ -0,0 +1,77 @@
+"""
+Submuestreo de series para gráficos (Largest-Triangle-Three-Buckets).
+
+LTTB conserva puntos reales de la serie (nunca promedia), así que el valor
+que muestra el hover en cada punto retenido es exacto; solo se descartan
+puntos que no cambian la forma visible de la curva.
+"""
+import numpy as np
+
+
+def lttb(x, y, umbral):
+    """Índices de los `umbral` puntos que conserva LTTB sobre (x, y)."""
+    n = len(x)
+    if umbral >= n or umbral < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # umbral - 2 buckets entre el primer y el último punto; el último bucket es el punto final
+    bordes = np.append(np.floor(np.linspace(1, n - 1, umbral - 1)).astype(np.int64), n)
+    tamaños = np.diff(bordes)
+    promedio_x = np.add.reduceat(x, bordes[:-1]) / tamaños
+    promedio_y = np.add.reduceat(y, bordes[:-1]) / tamaños
+
+    # Los buckets son de pocos puntos: un bucle en Python sobre listas evita el
+    # costo fijo de varias operaciones numpy por bucket (decenas de veces más rápido)
+    xs, ys = x.tolist(), y.tolist()
+    bordes = bordes.tolist()
+    promedio_x, promedio_y = promedio_x.tolist(), promedio_y.tolist()
+    indices = [0] * umbral
+    indices[-1] = n - 1
+    a = 0
+    for i in range(umbral - 2):
+        # Área del triángulo (a, j, promedio del bucket siguiente) como |p*y_j + q*x_j + r|
+        xa, ya = xs[a], ys[a]
+        xc, yc = promedio_x[i + 1], promedio_y[i + 1]
+        p, q, r = xa - xc, yc - ya, xc * ya - xa * yc
+        mejor = -1.0
+        for j in range(bordes[i], bordes[i + 1]):
+            area = abs(p * ys[j] + q * xs[j] + r)
+            if area > mejor:
+                mejor, a = area, j
+        indices[i + 1] = a
+    return np.array(indices, dtype=np.int64)
+
+
+def indices_submuestreo(fechas, valores, presupuesto, ventana=None):
+    """
+    Índices de los puntos a graficar de una serie con fechas.
+
+    Los NaN se descartan. Si hay una `ventana` (fecha_desde, fecha_hasta)
+    visible por zoom, esa zona recibe el presupuesto completo (resolución
+    total si cabe) y el resto de la serie solo un contexto reducido para
+    poder desplazarse.
+    """
+    validos = np.flatnonzero(~np.isnan(valores))
+    if len(validos) <= presupuesto:
+        return validos
+
+    # Días desde el inicio: evita perder precisión con nanosegundos en float64
+    x = (fechas[validos] - fechas[validos[0]]) / np.timedelta64(1, 'D')
+    y = valores[validos]
+
+    if ventana is None:
+        return validos[lttb(x, y, presupuesto)]
+
+    desde, hasta = np.searchsorted(fechas[validos], np.asarray(ventana, dtype='datetime64[ns]'), side='left')
+    hasta = min(hasta + 1, len(validos))
+    desde = max(desde - 1, 0)
+    contexto = max(presupuesto // 4, 3)
+
+    partes = []
+    for inicio, fin, umbral in ((0, desde, contexto), (desde, hasta, presupuesto), (hasta, len(validos), contexto)):
+        if fin - inicio > 0:
+            partes.append(inicio + lttb(x[inicio:fin], y[inicio:fin], umbral))
+    return validos[np.concatenate(partes)]